@@ -0,0 +1,53 @@
+"""Benchmark pure-Python batch evaluation against parsing each row.
+
+Run from the project root:
+
+    python benchmarks/bench_batch.py [--rows N]
+"""
+
+import argparse
+import random
+import time
+from array import array
+
+from calculator.batch import evaluate_columns
+from calculator.parser import compile, parse
+
+EXPRESSION = "price * (1 + tax) - discount / 2"
+
+
+def main():
+    """Run the benchmark and print timings."""
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument('--rows', type=int, default=1_000_000)
+    options = arg_parser.parse_args()
+
+    rng = random.Random(0)
+    price = array('d', (rng.uniform(1, 100) for _ in range(options.rows)))
+    tax = array('d', (rng.uniform(0, 0.3) for _ in range(options.rows)))
+    discount = array('d', (rng.uniform(0, 5) for _ in range(options.rows)))
+
+    start = time.perf_counter()
+    for p, t, d in zip(price, tax, discount):
+        parse(f"{p:.6f} * (1 + {t:.6f}) - {d:.6f} / 2")
+    per_row = time.perf_counter() - start
+
+    compiled = compile(EXPRESSION)
+    start = time.perf_counter()
+    for p, t, d in zip(price, tax, discount):
+        compiled.evaluate(p, t, d)
+    compiled_per_row = time.perf_counter() - start
+
+    start = time.perf_counter()
+    evaluate_columns(compiled, price=price, tax=tax, discount=discount)
+    batch = time.perf_counter() - start
+
+    print(f"rows:               {options.rows}")
+    print(f"parse() per row:    {per_row:.3f}s")
+    print(f"evaluate() per row: {compiled_per_row:.3f}s")
+    print(f"evaluate_columns:   {batch:.3f}s")
+    print(f"speedup vs parse(): {per_row / batch:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
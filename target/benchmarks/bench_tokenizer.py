@@ -0,0 +1,101 @@
+"""Benchmark the single-pass tokenizer against the former regex tokenizer.
+
+The former tokenizer ran ``re.findall``, a pass to fold unary minus and a
+pass to drop empty strings, after which every token was classified with a
+try/except ``float()`` check. It is reproduced here as the baseline.
+
+Run from the project root:
+
+    python benchmarks/bench_tokenizer.py [--terms N] [--repeat N]
+"""
+
+import argparse
+import random
+import re
+import time
+
+from calculator.tokenizer import tokenize
+
+
+def legacy_tokenize(expression):
+    """Tokenize and classify an expression the way the former parser did."""
+    pattern = r'(\d+\.?\d*|[A-Za-z_]\w*|\+|\-|\*|\/|\(|\))'
+    tokens = re.findall(pattern, expression)
+
+    processed_tokens = []
+    for i, token in enumerate(tokens):
+        if token == '-' and (i == 0 or tokens[i-1] in ('(', '+', '-', '*', '/')):
+            if i + 1 < len(tokens) and _is_number(tokens[i + 1]):
+                processed_tokens.append('-' + tokens[i + 1])
+                tokens[i + 1] = ''
+            else:
+                processed_tokens.append('u-')
+        elif token:
+            processed_tokens.append(token)
+
+    return [
+        float(token) if _is_number(token) else token
+        for token in processed_tokens
+        if token
+    ]
+
+
+def _is_number(token):
+    try:
+        float(token)
+        return True
+    except ValueError:
+        return False
+
+
+def generate(terms, rng):
+    """Generate a long expression with numbers, names and parentheses."""
+    parts = []
+    for i in range(terms):
+        if i % 7 == 3:
+            parts.append(f"(x{i % 5} - {rng.uniform(0, 100):.2f})")
+        else:
+            parts.append(f"{rng.uniform(0, 1000):.3f}")
+        parts.append(rng.choice('+-*/'))
+    parts.append('1')
+    return ' '.join(parts)
+
+
+def measure(funcs, expression, repeat):
+    """Return the best tokens per second of each function over expression.
+
+    The functions are timed alternately so that both see the same machine
+    conditions.
+    """
+    counts = [len(func(expression)) for func in funcs]
+    best = [float('inf')] * len(funcs)
+    for _ in range(repeat):
+        for i, func in enumerate(funcs):
+            start = time.perf_counter()
+            func(expression)
+            best[i] = min(best[i], time.perf_counter() - start)
+    return [count / seconds for count, seconds in zip(counts, best)]
+
+
+def main():
+    """Run the benchmark and print tokens per second."""
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument('--terms', type=int, default=1000)
+    arg_parser.add_argument('--repeat', type=int, default=200)
+    options = arg_parser.parse_args()
+
+    expression = generate(options.terms, random.Random(0))
+    before, after = measure(
+        [legacy_tokenize, lambda text: list(tokenize(text))],
+        expression,
+        options.repeat,
+    )
+
+    print(f"expression length: {len(expression)} characters")
+    print(f"before:            {before / 1e6:.2f}M tokens/s")
+    print(f"after:             {after / 1e6:.2f}M tokens/s")
+    print(f"speedup:           {after / before:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
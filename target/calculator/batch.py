@@ -0,0 +1,388 @@
+"""Calculator batch evaluation module.
+
+This module evaluates many expressions, or one expression over many rows,
+without third-party dependencies. Columns are ``array.array('d')`` objects,
+and each instruction of the program runs as one C-level ``map`` over whole
+columns, so no per-row Python loop or intermediate list is involved.
+
+``evaluate_codes`` evaluates many expressions into arrays of results, error
+codes and error positions rather than yielding an exception per failed
+expression, for batches where failures are common and only need counting
+or reporting.
+"""
+
+import os
+from array import array
+from collections import deque
+from itertools import islice, repeat
+
+from calculator.cache import LRUCache
+from calculator.parser import (
+    _BINARY,
+    _CALL,
+    _LOAD,
+    _PUSH,
+    _STORE,
+    _UNARY,
+    _parser,
+    parse,
+)
+from calculator.tokenizer import NAME, ExpressionSyntaxError, tokenize
+
+# Exceptions that mark a single expression as failed rather than the batch.
+EXPRESSION_ERRORS = (SyntaxError, ArithmeticError, ValueError)
+
+# Number of expressions sent to a worker process at a time.
+DEFAULT_CHUNK_SIZE = 1024
+
+# Chunks in flight per worker; bounds memory while keeping workers busy.
+_CHUNKS_PER_WORKER = 2
+
+# Error codes of evaluate_codes(), indexes into ERROR_NAMES.
+OK = 0
+SYNTAX = 1
+MISMATCHED_PARENS = 2
+INVALID_CHARACTER = 3
+UNKNOWN_FUNCTION = 4
+UNDEFINED_VARIABLE = 5
+DIVISION_BY_ZERO = 6
+DOMAIN = 7
+OVERFLOW = 8
+LIMIT_EXCEEDED = 9
+
+ERROR_NAMES = (
+    'ok',
+    'syntax',
+    'mismatched_parens',
+    'invalid_character',
+    'unknown_function',
+    'undefined_variable',
+    'division_by_zero',
+    'domain',
+    'overflow',
+    'limit_exceeded',
+)
+
+# Error codes by the code names of ExpressionSyntaxError.
+_CODES = {name: code for code, name in enumerate(ERROR_NAMES)}
+
+# Errors evaluate_codes() records as a code. A TypeError comes from a result
+# that is not a real number, such as a complex one from a registered
+# function, and is a domain error.
+_CODED_ERRORS = (*EXPRESSION_ERRORS, TypeError)
+
+# Distinct expressions whose outcome evaluate_codes() remembers.
+_OUTCOMES = 4096
+
+
+def evaluate_stream(expressions):
+    """Evaluate expressions lazily, one result per expression, in order.
+
+    Failures do not stop the stream: the exception is yielded in place of
+    the result so the caller can decide what to do with it. Only one
+    expression is held in memory at a time.
+
+    Args:
+        expressions: An iterable of expression strings, such as a file.
+
+    Yields:
+        The float result of each expression, or the exception it raised.
+    """
+    for expression in expressions:
+        try:
+            yield parse(expression)
+        except EXPRESSION_ERRORS as e:
+            yield e
+
+
+def evaluate_many(expressions, workers=1, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Evaluate expressions across worker processes, in input order.
+
+    The input is split into chunks that are evaluated in a process pool.
+    Every worker has its own compiled-expression cache. Results are yielded
+    in input order as soon as the chunks before them are done, and only a
+    few chunks per worker are in flight, so memory use stays bounded.
+
+    Args:
+        expressions: An iterable of expression strings, such as a file.
+        workers: Number of worker processes. 1 evaluates in this process;
+            0 uses one worker per CPU.
+        chunk_size: Number of expressions sent to a worker at a time.
+
+    Yields:
+        The float result of each expression, or the exception it raised.
+    """
+    if workers == 0:
+        workers = os.cpu_count() or 1
+    if workers == 1:
+        yield from evaluate_stream(expressions)
+        return
+
+    # Imported here: multiprocessing is slow to import and only needed for
+    # parallel runs.
+    from concurrent.futures import ProcessPoolExecutor
+
+    expressions = iter(expressions)
+    executor = ProcessPoolExecutor(max_workers=workers)
+    pending = deque()
+    try:
+        while chunk := list(islice(expressions, chunk_size)):
+            pending.append(executor.submit(_evaluate_chunk, chunk))
+            if len(pending) >= workers * _CHUNKS_PER_WORKER:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+    finally:
+        executor.shutdown(cancel_futures=True)
+
+
+def _evaluate_chunk(expressions: list) -> list:
+    """Evaluate a chunk of expressions in a worker process.
+
+    Args:
+        expressions: The expressions to evaluate.
+
+    Returns:
+        The results, with exceptions in place of failed expressions.
+    """
+    return list(evaluate_stream(expressions))
+
+
+def evaluate_codes(expressions, parser=None) -> tuple:
+    """Evaluate expressions into arrays of results and error codes.
+
+    Failed expressions are recorded as an error code and a position rather
+    than an exception object. parse() is bypassed, so its errors are not
+    reworded. An expression with variables fails, so every expression that
+    compiles has one value, and the outcome of each distinct expression is
+    remembered: one that repeats is neither compiled nor evaluated, and
+    does not raise, again.
+
+    Args:
+        expressions: An iterable of expression strings, such as a file.
+        parser: The parser to compile with. Defaults to the one behind
+            parse(), with its cache.
+
+    Returns:
+        A tuple of three arrays with one entry per expression:
+        ``array('d')`` results, NaN for failed expressions;
+        ``array('B')`` error codes, OK or one of the other codes of this
+        module, named in ERROR_NAMES; and ``array('q')`` positions in the
+        expression text of syntax errors, undefined variables and some
+        limit errors, otherwise -1.
+    """
+    compile_expression = (_parser if parser is None else parser).compile
+    outcomes = LRUCache(_OUTCOMES)
+    results = array('d')
+    codes = array('B')
+    positions = array('q')
+    nan = float('nan')
+
+    for expression in expressions:
+        outcome = outcomes.get(expression)
+        if outcome is None:
+            try:
+                compiled = compile_expression(expression)
+                if compiled.variables:
+                    name = compiled.variables[0]
+                    outcome = (
+                        nan,
+                        UNDEFINED_VARIABLE,
+                        _variable_position(expression, name),
+                    )
+                else:
+                    outcome = (float(compiled.evaluate()), OK, -1)
+            except _CODED_ERRORS as e:
+                outcome = (nan, *_error_outcome(e, expression))
+            outcomes.put(expression, outcome)
+
+        value, code, position = outcome
+        results.append(value)
+        codes.append(code)
+        positions.append(position)
+    return results, codes, positions
+
+
+def _error_outcome(error: BaseException, expression: str) -> tuple:
+    """Classify an expression's error.
+
+    Args:
+        error: The exception compiling or evaluating the expression raised.
+        expression: The expression text.
+
+    Returns:
+        The error code and the position of the error in the expression
+        text, or -1 if it has none.
+    """
+    if isinstance(error, ZeroDivisionError):
+        return DIVISION_BY_ZERO, -1
+    if isinstance(error, OverflowError):
+        return OVERFLOW, -1
+    if not isinstance(error, SyntaxError):
+        return DOMAIN, -1
+    if not isinstance(error, ExpressionSyntaxError):
+        # Such as the error for an empty expression.
+        return SYNTAX, -1
+
+    code = _CODES[error.code]
+    if error.position is None:
+        return code, -1
+    return code, _raw_position(expression, error.position)
+
+
+def _variable_position(expression: str, name: str) -> int:
+    """Return the position of a variable's first use in an expression.
+
+    Only called for expressions that compiled, so tokenizing succeeds.
+    """
+    source = ' '.join(expression.split())
+    for token in tokenize(source):
+        if token.kind == NAME and token.value == name:
+            return _raw_position(expression, token.offset)
+    return -1
+
+
+def _raw_position(expression: str, position: int) -> int:
+    """Map a position in the normalized text of an expression to its text.
+
+    Compiling first strips the text and collapses runs of whitespace into
+    one space, so error messages give positions in that normalized text.
+
+    Args:
+        expression: The expression text.
+        position: A position in the normalized text.
+
+    Returns:
+        The corresponding position in the expression text.
+    """
+    end = len(expression)
+    i = 0
+    while i < end and expression[i].isspace():
+        i += 1
+    while position > 0 and i < end:
+        if expression[i].isspace():
+            while i < end and expression[i].isspace():
+                i += 1
+        else:
+            i += 1
+        position -= 1
+    return i
+
+
+def evaluate_columns(compiled, /, **columns) -> array:
+    """Evaluate a compiled expression over columns of values.
+
+    Args:
+        compiled: The compiled expression to evaluate.
+        **columns: Sequences of values by variable name, ideally
+            ``array.array('d')``. All columns must have the same length.
+
+    Returns:
+        An ``array.array('d')`` with one result per row.
+
+    Raises:
+        NameError: If a variable has no column.
+        ValueError: If the columns differ in length.
+        ZeroDivisionError: If division by zero occurs; the message names the
+            first offending row.
+    """
+    lengths = {len(column) for column in columns.values()}
+    if len(lengths) > 1:
+        raise ValueError("columns must all have the same length")
+    rows = lengths.pop() if lengths else 1
+
+    values = []
+    for name in compiled.variables:
+        try:
+            column = columns[name]
+        except KeyError:
+            raise NameError(f"undefined variable: {name}") from None
+        if not (isinstance(column, array) and column.typecode == 'd'):
+            column = array('d', column)
+        values.append(column)
+
+    values.extend([None] * compiled._temps)
+    stack = []
+    push = stack.append
+    pop = stack.pop
+
+    for opcode, argument in compiled._program:
+        if opcode == _PUSH:
+            push(argument)
+        elif opcode == _LOAD:
+            push(values[argument])
+        elif opcode == _UNARY:
+            push(_apply(argument, rows, pop()))
+        elif opcode == _BINARY:
+            b = pop()
+            push(_apply(argument, rows, pop(), b))
+        elif opcode == _STORE:
+            values[argument] = stack[-1]
+        elif opcode == _CALL:
+            func, count = argument
+            args = stack[len(stack) - count:]
+            del stack[len(stack) - count:]
+            push(_apply(func, rows, *args))
+
+    result = stack[0]
+    if not isinstance(result, array):
+        result = array('d', [result]) * rows
+    elif any(result is value for value in values):
+        # A program that only loads a variable, such as "x" or "x * 1",
+        # leaves the caller's column on the stack.
+        result = array('d', result)
+    return result
+
+
+def _apply(func, rows: int, *operands):
+    """Apply a scalar function across columns, broadcasting constants.
+
+    Args:
+        func: The scalar function to apply.
+        rows: The number of rows in the batch.
+        *operands: Columns (``array.array``) or scalar constants.
+
+    Returns:
+        A new column, or a scalar if every operand is a scalar.
+    """
+    if not any(isinstance(operand, array) for operand in operands):
+        return func(*operands)
+
+    iterables = [
+        operand if isinstance(operand, array) else repeat(operand, rows)
+        for operand in operands
+    ]
+    try:
+        return array('d', map(func, *iterables))
+    except (ArithmeticError, ValueError) as e:
+        row = _failing_row(func, rows, operands)
+        if row is None:
+            raise
+        raise type(e)(f"{e} at row {row}") from e
+
+
+def _failing_row(func, rows: int, operands: tuple) -> int | None:
+    """Find the first row for which a function raises.
+
+    Only called after a batch has failed, so the per-row loop stays off the
+    normal path. A row fails if the function raises or its result cannot
+    be stored in an ``array('d')``, such as an int too large for a float.
+
+    Args:
+        func: The scalar function that raised.
+        rows: The number of rows in the batch.
+        operands: Columns or scalar constants.
+
+    Returns:
+        The index of the first failing row, or None if no row fails again.
+    """
+    for row in range(rows):
+        args = [
+            operand[row] if isinstance(operand, array) else operand
+            for operand in operands
+        ]
+        try:
+            float(func(*args))
+        except (ArithmeticError, ValueError):
+            return row
+    return None
@@ -0,0 +1,747 @@
+"""Calculator benchmark module.
+
+This module benchmarks the parser phases, the operations, the disk cache,
+sheet recalculation, the CLI, batch evaluation and a parser shared between
+threads. Run it as::
+
+    python -m calculator.bench [--quick] [--filter PATTERN] [--output FILE]
+                               [--compare BASELINE] [--threshold FRACTION]
+
+Results are written as JSON: operations per second, the median and 99th
+percentile latency of single calls, and peak traced memory for each
+benchmark. With ``--compare``, the results are checked against a previously
+saved run and the exit code is 1 if any benchmark got slower by more than the
+threshold.
+"""
+
+import argparse
+import fnmatch
+import itertools
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from array import array
+from datetime import UTC, datetime
+
+from calculator import operations
+from calculator.batch import (
+    evaluate_codes,
+    evaluate_columns,
+    evaluate_many,
+    evaluate_stream,
+)
+from calculator.cache import ConcurrentCache
+from calculator.diskcache import DiskCache, save
+from calculator.optimizer import GraphBuilder
+from calculator.parser import Limits, Parser
+from calculator.sheet import Sheet
+from calculator.tokenizer import tokenize
+
+# Fraction by which ops/sec may drop before a benchmark counts as regressed.
+DEFAULT_THRESHOLD = 0.10
+
+# Registered benchmarks: name -> (setup function, options).
+BENCHMARKS = {}
+
+
+def benchmark(name: str, items: int = 1, min_time: float = 0.5, samples: int = 50):
+    """Register a benchmark.
+
+    The decorated function does any setup and returns the zero-argument
+    callable to time or, for a benchmark that measures itself, its result
+    dictionary. A callable with a ``close`` method has it called once
+    timing is over, to release what the setup acquired.
+
+    Args:
+        name: Dotted benchmark name, such as ``'parser.tokenize.long'``.
+        items: Number of items, such as rows, processed by one call; used to
+            report items per second for throughput benchmarks.
+        min_time: Minimum total time, in seconds, to spend timing.
+        samples: Number of timing samples to take.
+
+    Returns:
+        The decorator.
+    """
+    def decorator(setup):
+        BENCHMARKS[name] = (
+            setup,
+            {'items': items, 'min_time': min_time, 'samples': samples},
+        )
+        return setup
+    return decorator
+
+
+def short_expression(rng: random.Random) -> str:
+    """Generate a short expression of a few terms."""
+    return (
+        f"{rng.randint(1, 99)} + {rng.randint(1, 99)} * "
+        f"({rng.randint(1, 99)} - {rng.randint(1, 9)})"
+    )
+
+
+def long_expression(rng: random.Random, terms: int = 200) -> str:
+    """Generate a long, flat expression with numbers and variables."""
+    parts = []
+    for i in range(terms):
+        parts.append(f"x{i % 4}" if i % 5 == 0 else f"{rng.uniform(1, 100):.3f}")
+        parts.append(rng.choice('+-*/'))
+    parts.append('1')
+    return ' '.join(parts)
+
+
+def nested_expression(rng: random.Random, depth: int = 100) -> str:
+    """Generate a deeply nested expression."""
+    expression = 'x0'
+    for _ in range(depth):
+        expression = f"({expression} {rng.choice('+-*')} {rng.randint(1, 9)})"
+    return expression
+
+
+_SHAPES = {
+    'short': short_expression,
+    'long': long_expression,
+    'nested': nested_expression,
+}
+
+_VARIABLES = {'x0': 1.5, 'x1': 2.5, 'x2': 3.5, 'x3': 4.5}
+
+# Limits every shape is within, to measure the cost of checking them.
+_LIMITS = Limits(
+    max_length=1 << 20,
+    max_tokens=1 << 16,
+    max_depth=1 << 10,
+    max_stack=1 << 16,
+    max_steps=1 << 16,
+)
+
+
+def _register_parser_benchmarks():
+    """Register benchmarks for every parser phase and expression shape."""
+    for shape, generate in _SHAPES.items():
+        expression = generate(random.Random(0))
+
+        @benchmark(f'parser.tokenize.{shape}')
+        def _tokenize(expression=expression):
+            return lambda: list(tokenize(expression))
+
+        @benchmark(f'parser.shunting_yard.{shape}')
+        def _shunting_yard(expression=expression):
+            parser = Parser()
+            tokens = list(tokenize(expression))
+            return lambda: parser._to_rpn(tokens)
+
+        @benchmark(f'parser.optimize.{shape}')
+        def _optimize(expression=expression):
+            parser = Parser()
+            rpn = parser._to_rpn(tokenize(expression))
+            return lambda: parser._build(rpn, GraphBuilder())
+
+        @benchmark(f'parser.assemble.{shape}')
+        def _assemble(expression=expression):
+            parser = Parser()
+            builder = GraphBuilder()
+            root = parser._build(parser._to_rpn(tokenize(expression)), builder)
+            return lambda: parser._assemble(root, builder)
+
+        @benchmark(f'parser.evaluate.{shape}')
+        def _evaluate(expression=expression):
+            compiled = Parser().compile(expression)
+            return lambda: compiled.evaluate(**_VARIABLES)
+
+        @benchmark(f'codegen.call.{shape}')
+        def _codegen_call(expression=expression):
+            compiled = Parser().compile(expression)
+            function = compiled.to_function()
+            values = {name: _VARIABLES[name] for name in compiled.variables}
+            return lambda: function(**values)
+
+        @benchmark(f'parser.compile.{shape}')
+        def _compile(expression=expression):
+            parser = Parser()
+            return lambda: parser.compile(expression)
+
+        @benchmark(f'parser.compile.limited.{shape}')
+        def _compile_limited(expression=expression):
+            parser = Parser(limits=_LIMITS)
+            return lambda: parser.compile(expression)
+
+
+_register_parser_benchmarks()
+
+
+def _register_numeric_benchmarks():
+    """Register benchmarks comparing the numeric backends on each shape."""
+    for numeric in ('float', 'decimal', 'fraction'):
+        for shape, generate in _SHAPES.items():
+            expression = generate(random.Random(0))
+
+            @benchmark(f'numeric.compile.{numeric}.{shape}')
+            def _compile(expression=expression, numeric=numeric):
+                parser = Parser(numeric=numeric)
+                return lambda: parser.compile(expression)
+
+            @benchmark(f'numeric.evaluate.{numeric}.{shape}')
+            def _evaluate(expression=expression, numeric=numeric):
+                compiled = Parser(numeric=numeric).compile(expression)
+                return lambda: compiled.evaluate(**_VARIABLES)
+
+
+_register_numeric_benchmarks()
+
+
+@benchmark('parser.parse.cached')
+def _parse_cached():
+    from calculator.parser import parse
+
+    expression = short_expression(random.Random(0))
+    return lambda: parse(expression)
+
+
+@benchmark('parser.parse.uncached')
+def _parse_uncached():
+    parser = Parser()
+    expression = short_expression(random.Random(0))
+    return lambda: parser.parse(expression)
+
+
+_THREAD_COUNTS = (1, 2, 4, 8)
+_THREAD_EXPRESSIONS = 1000
+
+
+def _register_thread_benchmarks():
+    """Register benchmarks of threads parsing with one shared parser.
+
+    Each thread parses the same number of expressions, so on a free-threaded
+    build operations per second should grow with the number of threads; with
+    the GIL it stays flat.
+    """
+    for threads in _THREAD_COUNTS:
+
+        @benchmark(
+            f'threads.parse.{threads}',
+            items=threads * _THREAD_EXPRESSIONS,
+            samples=10,
+        )
+        def _parse(threads=threads):
+            rng = random.Random(0)
+            expressions = [short_expression(rng) for _ in range(256)]
+            parser = Parser(cache=ConcurrentCache())
+            # The threads are started once and wait between runs, so thread
+            # creation is not timed.
+            start = threading.Barrier(threads + 1)
+            done = threading.Barrier(threads + 1)
+
+            def work(offset):
+                mine = [
+                    expressions[(offset + i) % len(expressions)]
+                    for i in range(_THREAD_EXPRESSIONS)
+                ]
+                # close() aborts the barriers, which ends the loop.
+                try:
+                    while True:
+                        start.wait()
+                        for expression in mine:
+                            parser.parse(expression)
+                        done.wait()
+                except threading.BrokenBarrierError:
+                    pass
+
+            workers = [
+                threading.Thread(target=work, args=(i * 37,), daemon=True)
+                for i in range(threads)
+            ]
+            for worker in workers:
+                worker.start()
+
+            def run():
+                start.wait()
+                done.wait()
+
+            def close():
+                start.abort()
+                done.abort()
+                for worker in workers:
+                    worker.join()
+
+            run.close = close
+            return run
+
+
+_register_thread_benchmarks()
+
+
+_OPERATION_ARGUMENTS = {
+    'add': (1.5, 2.5),
+    'subtract': (5.5, 2.5),
+    'multiply': (1.5, 2.5),
+    'divide': (7.5, 2.5),
+    'power': (1.5, 2.5),
+    'pow': (1.5, 2.5),
+    'sqrt': (2.5,),
+    'modulo': (7.5, 2.5),
+    'factorial': (20,),
+    'bounded_factorial': (20,),
+    'cos': (0.5,),
+    'sin': (0.5,),
+    'tan': (0.5,),
+    'exp': (0.5,),
+    'ln': (2.5,),
+    'log': (100.0, 10.0),
+}
+
+
+def _register_operation_benchmarks():
+    """Register a benchmark for every function in calculator.operations."""
+    for name, args in _OPERATION_ARGUMENTS.items():
+        @benchmark(f'operations.{name}')
+        def _operation(func=getattr(operations, name), args=args):
+            return lambda: func(*args)
+
+
+_register_operation_benchmarks()
+
+
+# The directory holding the calculator package.
+_PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _cli_environment() -> dict:
+    """Return the environment CLI subprocesses run in.
+
+    The project root is put first on PYTHONPATH, so that they import this
+    calculator package wherever the benchmarks are run from. Bytecode
+    writing is allowed, so only the first run measures compiling.
+    """
+    env = dict(os.environ)
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    path = env.get('PYTHONPATH')
+    env['PYTHONPATH'] = _PROJECT_ROOT if not path else _PROJECT_ROOT + os.pathsep + path
+    return env
+
+
+@benchmark('cli.startup', min_time=1.0, samples=10)
+def _cli_startup():
+    command = [sys.executable, '-m', 'calculator', '1 + 1']
+    env = _cli_environment()
+    return lambda: subprocess.run(
+        command, check=True, capture_output=True, cwd=_PROJECT_ROOT, env=env
+    )
+
+
+# Budget for the import time of a one-shot CLI invocation, in microseconds.
+# It is several times the time measured on a developer machine, so only real
+# regressions, such as a heavy module imported eagerly, exceed it.
+IMPORT_BUDGET_US = 15_000
+
+
+def import_time(runs: int = 5) -> dict:
+    """Measure the import time of a one-shot CLI invocation.
+
+    Runs ``python -X importtime -m calculator "1 + 1"`` several times and
+    keeps the best times, since noise only adds time.
+
+    Args:
+        runs: Number of invocations.
+
+    Returns:
+        A dictionary with ``import_time_us``, the total import time of the
+        calculator package, and ``modules``, the cumulative import time of
+        each calculator module, in microseconds.
+    """
+    command = [sys.executable, '-X', 'importtime', '-m', 'calculator', '1 + 1']
+    env = _cli_environment()
+    best_total = None
+    modules = {}
+    for _ in range(runs):
+        result = subprocess.run(
+            command,
+            check=True,
+            capture_output=True,
+            text=True,
+            cwd=_PROJECT_ROOT,
+            env=env,
+        )
+        total = 0
+        for line in result.stderr.splitlines():
+            # Lines read "import time: <self> | <cumulative> | <module>", with
+            # the module indented by nesting level.
+            _, cumulative, module = line.split('|')
+            name = module.strip()
+            if name != 'calculator' and not name.startswith('calculator.'):
+                continue
+            modules[name] = min(int(cumulative), modules.get(name, 1 << 62))
+            if not module[1:].startswith(' '):
+                total += int(cumulative)
+        best_total = total if best_total is None else min(best_total, total)
+    return {'import_time_us': best_total, 'modules': modules}
+
+
+@benchmark('cli.importtime')
+def _cli_importtime():
+    return dict(import_time(), budget_us=IMPORT_BUDGET_US)
+
+
+_CATALOG_SIZE = 10_000
+_catalog_directory = None
+
+
+def _catalog():
+    """Write a disk cache of short expressions once; return its path and sources."""
+    global _catalog_directory
+    rng = random.Random(0)
+    expressions = [short_expression(rng) for _ in range(_CATALOG_SIZE)]
+    if _catalog_directory is None:
+        _catalog_directory = tempfile.TemporaryDirectory()
+        save(os.path.join(_catalog_directory.name, 'catalog.calc'), expressions)
+    path = os.path.join(_catalog_directory.name, 'catalog.calc')
+    return path, [' '.join(expression.split()) for expression in expressions]
+
+
+@benchmark('diskcache.open')
+def _diskcache_open():
+    path, sources = _catalog()
+
+    def open_and_load():
+        with DiskCache(path) as cache:
+            cache.get(sources[0])
+
+    return open_and_load
+
+
+@benchmark('diskcache.load')
+def _diskcache_load():
+    path, sources = _catalog()
+    cache = DiskCache(path)
+    source = sources[-1]
+
+    def load():
+        cache.clear()
+        return cache.get(source)
+
+    return load
+
+
+_SHEET_ROWS = 1000
+
+
+def _sheet() -> Sheet:
+    """Build a sheet of rows of inputs and formulas, with running totals."""
+    rng = random.Random(0)
+    cells = {'tax': 0.2}
+    for i in range(_SHEET_ROWS):
+        cells[f'revenue{i}'] = rng.uniform(100, 1000)
+        cells[f'cost{i}'] = rng.uniform(10, 100)
+        cells[f'margin{i}'] = f"revenue{i} - cost{i}"
+        cells[f'pct{i}'] = f"margin{i} / revenue{i}"
+        cells[f'net{i}'] = f"margin{i} * (1 - tax)"
+        cells[f'total{i}'] = f"total{i - 1} + net{i}" if i else "net0"
+    sheet = Sheet()
+    sheet.update(cells)
+    return sheet
+
+
+@benchmark('sheet.load', samples=10)
+def _sheet_load():
+    return _sheet
+
+
+@benchmark('sheet.update.one')
+def _sheet_update_one():
+    # Changes one row near the end: its formulas and the last totals.
+    sheet = _sheet()
+    name = f'cost{_SHEET_ROWS - 10}'
+    values = itertools.cycle([sheet[name] + 1, sheet[name]])
+    return lambda: sheet.set(name, next(values))
+
+
+@benchmark('sheet.update.all', items=_SHEET_ROWS * 2, samples=10)
+def _sheet_update_all():
+    # Changes an input that every net and total formula depends on.
+    sheet = _sheet()
+    values = itertools.cycle([0.25, 0.2])
+    return lambda: sheet.set('tax', next(values))
+
+
+_BATCH_ROWS = 100_000
+_BATCH_LINES = 10_000
+
+
+@benchmark('batch.evaluate_columns', items=_BATCH_ROWS, samples=10)
+def _batch_columns():
+    rng = random.Random(0)
+    compiled = Parser().compile("price * (1 + tax) - discount / 2")
+    columns = {
+        name: array('d', (rng.uniform(1, 100) for _ in range(_BATCH_ROWS)))
+        for name in ('price', 'tax', 'discount')
+    }
+    return lambda: evaluate_columns(compiled, **columns)
+
+
+@benchmark('batch.evaluate_stream', items=_BATCH_LINES, samples=10)
+def _batch_stream():
+    rng = random.Random(0)
+    lines = [short_expression(rng) for _ in range(_BATCH_LINES)]
+    return lambda: sum(1 for _ in evaluate_stream(lines))
+
+
+def _junk_lines(distinct: int = 1000) -> list:
+    """Return batch lines of which a fifth fail, in one of five ways.
+
+    Lines are drawn from a pool of distinct expressions, as batches repeat
+    expressions, good and bad.
+    """
+    rng = random.Random(0)
+    pool = [short_expression(rng) for _ in range(distinct)]
+    for i in range(0, distinct, 5):
+        pool[i] = (
+            pool[i] + ' )',
+            pool[i] + ' *',
+            pool[i] + ' / 0',
+            'sqrt(-1) + ' + pool[i],
+            pool[i] + ' @',
+        )[i // 5 % 5]
+    return [rng.choice(pool) for _ in range(_BATCH_LINES)]
+
+
+@benchmark('batch.evaluate_stream.junk', items=_BATCH_LINES, samples=10)
+def _batch_stream_junk():
+    lines = _junk_lines()
+    return lambda: sum(1 for _ in evaluate_stream(lines))
+
+
+@benchmark('batch.evaluate_codes.junk', items=_BATCH_LINES, samples=10)
+def _batch_codes_junk():
+    lines = _junk_lines()
+    return lambda: evaluate_codes(lines)
+
+
+@benchmark('batch.evaluate_many', items=_BATCH_LINES, min_time=2.0, samples=5)
+def _batch_many():
+    rng = random.Random(0)
+    lines = [short_expression(rng) for _ in range(_BATCH_LINES)]
+    return lambda: sum(1 for _ in evaluate_many(lines, workers=2))
+
+
+# Most calls timed one by one for the latency percentiles.
+_LATENCY_CALLS = 1000
+
+
+def _percentile(values: list, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def measure(func, items=1, min_time=0.5, samples=50) -> dict:
+    """Time a callable.
+
+    The callable is run in samples of several calls, sized so that each
+    sample lasts long enough to time accurately, to measure its rate. The
+    latency percentiles come from a separate run of up to a thousand calls
+    timed one by one, so they include the clock's overhead of a few tens of
+    nanoseconds.
+
+    Args:
+        func: The zero-argument callable to time.
+        items: Number of items processed by one call.
+        min_time: Minimum total time, in seconds, to spend timing.
+        samples: Number of timing samples to take.
+
+    Returns:
+        A dictionary with ``ops_per_sec``, ``p50_us`` and ``p99_us``,
+        ``peak_memory_bytes`` and, for throughput benchmarks,
+        ``items_per_sec``.
+    """
+    start = time.perf_counter()
+    func()
+    single = time.perf_counter() - start
+    number = max(1, int(min_time / samples / max(single, 1e-9)))
+
+    total_time = 0.0
+    for _ in range(samples):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        total_time += time.perf_counter() - start
+
+    latencies = []
+    for _ in range(min(_LATENCY_CALLS, samples * number)):
+        start_ns = time.perf_counter_ns()
+        func()
+        latencies.append(time.perf_counter_ns() - start_ns)
+
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    ops_per_sec = samples * number / total_time
+    result = {
+        'ops_per_sec': ops_per_sec,
+        'p50_us': _percentile(latencies, 0.50) / 1000,
+        'p99_us': _percentile(latencies, 0.99) / 1000,
+        'peak_memory_bytes': peak,
+    }
+    if items > 1:
+        result['items_per_sec'] = ops_per_sec * items
+    return result
+
+
+def run(patterns=('*',), quick=False) -> dict:
+    """Run the benchmarks whose names match any of the patterns.
+
+    Args:
+        patterns: Shell-style patterns matched against benchmark names.
+        quick: Spend a tenth of the usual time on each benchmark.
+
+    Returns:
+        A JSON-serializable report with run metadata and results by name.
+    """
+    results = {}
+    for name, (setup, options) in BENCHMARKS.items():
+        if not any(fnmatch.fnmatchcase(name, pattern) for pattern in patterns):
+            continue
+        if quick:
+            options = dict(
+                options,
+                min_time=options['min_time'] / 10,
+                samples=max(3, options['samples'] // 10),
+            )
+        print(f"running {name}", file=sys.stderr)
+        timed = setup()
+        if isinstance(timed, dict):
+            results[name] = timed
+            continue
+        try:
+            results[name] = measure(timed, **options)
+        finally:
+            close = getattr(timed, 'close', None)
+            if close is not None:
+                close()
+
+    return {
+        'meta': {
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'platform': platform.platform(),
+            'gil': getattr(sys, '_is_gil_enabled', lambda: True)(),
+            'timestamp': datetime.now(UTC).isoformat(),
+        },
+        'results': results,
+    }
+
+
+def compare(report: dict, baseline: dict, threshold=DEFAULT_THRESHOLD) -> list:
+    """Find benchmarks that got slower than a baseline.
+
+    Import times count as regressed when they grow by more than the
+    threshold or exceed their budget, whether or not the baseline has them.
+
+    Args:
+        report: The current report, as returned by run().
+        baseline: A previous report.
+        threshold: Fraction by which ops/sec may drop before it counts.
+
+    Returns:
+        A list of ``(name, baseline ops/sec, current ops/sec)`` tuples for
+        the regressed benchmarks present in both reports, and of
+        ``(name, baseline or budget us, current us)`` tuples for regressed
+        import times.
+    """
+    regressions = []
+    for name, result in report['results'].items():
+        previous = baseline['results'].get(name)
+        if 'import_time_us' in result:
+            current = result['import_time_us']
+            if current > result['budget_us']:
+                regressions.append((name, result['budget_us'], current))
+            elif previous and current > previous['import_time_us'] * (1 + threshold):
+                regressions.append((name, previous['import_time_us'], current))
+            continue
+        if previous is None:
+            continue
+        if result['ops_per_sec'] < previous['ops_per_sec'] * (1 - threshold):
+            regressions.append(
+                (name, previous['ops_per_sec'], result['ops_per_sec'])
+            )
+    return regressions
+
+
+def main(args=None):
+    """Run benchmarks from the command line.
+
+    Args:
+        args: Command-line arguments. If None, uses sys.argv.
+
+    Returns:
+        Exit code (0 for success, 1 if a regression was found).
+    """
+    arg_parser = argparse.ArgumentParser(
+        prog='python -m calculator.bench', description="Calculator benchmarks"
+    )
+    arg_parser.add_argument(
+        '--filter',
+        action='append',
+        metavar='PATTERN',
+        help="only run benchmarks matching this shell-style pattern",
+    )
+    arg_parser.add_argument(
+        '--quick', action='store_true', help="take fewer, shorter samples"
+    )
+    arg_parser.add_argument(
+        '--output', metavar='FILE', help="write the JSON report to FILE"
+    )
+    arg_parser.add_argument(
+        '--compare', metavar='BASELINE', help="compare against a saved report"
+    )
+    arg_parser.add_argument(
+        '--threshold',
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        metavar='FRACTION',
+        help="allowed ops/sec drop before flagging a regression",
+    )
+    arg_parser.add_argument(
+        '--list', action='store_true', help="list benchmark names and exit"
+    )
+    options = arg_parser.parse_args(args)
+
+    if options.list:
+        for name in BENCHMARKS:
+            print(name)
+        return 0
+
+    report = run(options.filter or ['*'], quick=options.quick)
+    text = json.dumps(report, indent=2)
+    if options.output:
+        with open(options.output, 'w', encoding='utf-8') as output:
+            output.write(text + '\n')
+    else:
+        print(text)
+
+    if options.compare:
+        with open(options.compare, encoding='utf-8') as baseline_file:
+            baseline = json.load(baseline_file)
+        regressions = compare(report, baseline, options.threshold)
+        for name, before, after in regressions:
+            unit = 'us' if 'import_time_us' in report['results'][name] else 'ops/sec'
+            print(
+                f"REGRESSION {name}: {before:,.0f} -> {after:,.0f} {unit} "
+                f"({after / before - 1:+.1%})",
+                file=sys.stderr,
+            )
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
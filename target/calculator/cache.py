@@ -0,0 +1,335 @@
+"""Calculator cache module.
+
+This module provides size-bounded caches: a least-recently-used cache for
+use by one thread, and a cache that many threads can share, which the
+registries use for compiled expressions.
+"""
+
+import _thread
+from collections import OrderedDict
+
+_MISSING = object()
+
+# Default number of stripes of a ConcurrentCache.
+DEFAULT_STRIPES = 16
+
+
+class LRUCache:
+    """A size-bounded least-recently-used cache.
+
+    The cache counts hits, misses and evictions so callers can check how
+    effective it is for their workload.
+
+    Attributes:
+        hits: Number of lookups that found an entry.
+        misses: Number of lookups that found nothing.
+        evictions: Number of entries dropped to respect the capacity.
+        registry: The registry whose compiled expressions the cache holds,
+            or None if parsers with any registry may share it.
+    """
+
+    def __init__(self, capacity: int = 1024):
+        """Initialize the cache.
+
+        Args:
+            capacity: The maximum number of entries to keep.
+
+        Raises:
+            ValueError: If capacity is less than 1.
+        """
+        self._data = OrderedDict()
+        self._capacity = self._check_capacity(capacity)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.registry = None
+
+    @staticmethod
+    def _check_capacity(capacity: int) -> int:
+        if capacity < 1:
+            raise ValueError("cache capacity must be at least 1")
+        return capacity
+
+    @property
+    def capacity(self) -> int:
+        """The maximum number of entries; shrinking it evicts the oldest."""
+        return self._capacity
+
+    @capacity.setter
+    def capacity(self, capacity: int):
+        self._capacity = self._check_capacity(capacity)
+        self._evict()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key, default=None):
+        """Look up a key and mark it as recently used.
+
+        Args:
+            key: The key to look up.
+            default: The value to return if the key is missing.
+
+        Returns:
+            The cached value, or default if the key is missing.
+        """
+        value = self._data.get(key, _MISSING)
+        if value is _MISSING:
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        """Store a value, evicting the least recently used entry if full.
+
+        Args:
+            key: The key to store.
+            value: The value to store.
+        """
+        self._data[key] = value
+        self._data.move_to_end(key)
+        self._evict()
+
+    def clear(self):
+        """Remove all entries and reset the counters."""
+        self._data.clear()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def stats(self) -> dict:
+        """Return the cache counters.
+
+        Returns:
+            A dictionary with the size, capacity, hits, misses and evictions.
+        """
+        return {
+            'size': len(self._data),
+            'capacity': self._capacity,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+    def _evict(self):
+        while len(self._data) > self._capacity:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+
+class _Entry:
+    """A cached value and its CLOCK reference bit."""
+
+    __slots__ = ('value', 'referenced')
+
+    def __init__(self, value):
+        self.value = value
+        self.referenced = False
+
+
+class _Stripe:
+    """One lock-protected part of a ConcurrentCache.
+
+    Keys are kept in ``ring`` in slot order for the CLOCK hand, and map to
+    their entries in ``entries``.
+    """
+
+    __slots__ = (
+        'entries',
+        'ring',
+        'hand',
+        'capacity',
+        'lock',
+        'hits',
+        'misses',
+        'evictions',
+    )
+
+    def __init__(self, capacity: int):
+        self.entries = {}
+        self.ring = []
+        self.hand = 0
+        self.capacity = capacity
+        # The low-level lock, since importing threading would slow down
+        # every process that imports the parser.
+        self.lock = _thread.allocate_lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def evict(self) -> int:
+        """Evict one entry by CLOCK; return the ring slot it occupied.
+
+        The hand skips, and clears, entries used since it last passed, so
+        frequently used entries stay while others age out. Must be called
+        with the lock held and the stripe not empty.
+        """
+        ring = self.ring
+        entries = self.entries
+        while True:
+            if self.hand >= len(ring):
+                self.hand = 0
+            slot = self.hand
+            self.hand += 1
+            entry = entries[ring[slot]]
+            if entry.referenced:
+                entry.referenced = False
+            else:
+                del entries[ring[slot]]
+                self.evictions += 1
+                return slot
+
+
+class ConcurrentCache:
+    """A size-bounded cache that many threads can use at once.
+
+    Lookups take no lock and allocate nothing: they read a dictionary and
+    set the entry's reference bit if it is not set already. Keys are spread
+    by hash over stripes, each with its own lock, which is held only to
+    insert or evict, so threads storing different keys rarely wait for
+    each other. Each stripe evicts by CLOCK, an approximation of
+    least-recently-used that needs no bookkeeping on lookups.
+
+    Counters are kept per stripe and updated without locking, so under
+    heavy concurrency they may undercount slightly.
+
+    Attributes:
+        registry: The registry whose compiled expressions the cache holds,
+            or None if parsers with any registry may share it.
+    """
+
+    def __init__(self, capacity: int = 1024, stripes: int = DEFAULT_STRIPES):
+        """Initialize the cache.
+
+        Args:
+            capacity: The maximum number of entries to keep.
+            stripes: The number of independently locked parts, rounded down
+                to a power of two and to at most capacity.
+
+        Raises:
+            ValueError: If capacity or stripes is less than 1.
+        """
+        capacity = LRUCache._check_capacity(capacity)
+        if stripes < 1:
+            raise ValueError("cache stripes must be at least 1")
+        count = 1 << (min(stripes, capacity).bit_length() - 1)
+        self._mask = count - 1
+        self._stripes = tuple(_Stripe(0) for _ in range(count))
+        self._capacity = capacity
+        self.registry = None
+        self._resize()
+
+    @property
+    def capacity(self) -> int:
+        """The maximum number of entries; shrinking it evicts entries."""
+        return self._capacity
+
+    @capacity.setter
+    def capacity(self, capacity: int):
+        self._capacity = LRUCache._check_capacity(capacity)
+        self._resize()
+
+    @property
+    def hits(self) -> int:
+        """Number of lookups that found an entry."""
+        return sum(stripe.hits for stripe in self._stripes)
+
+    @property
+    def misses(self) -> int:
+        """Number of lookups that found nothing."""
+        return sum(stripe.misses for stripe in self._stripes)
+
+    @property
+    def evictions(self) -> int:
+        """Number of entries dropped to respect the capacity."""
+        return sum(stripe.evictions for stripe in self._stripes)
+
+    def __len__(self):
+        return sum(len(stripe.entries) for stripe in self._stripes)
+
+    def __contains__(self, key):
+        return key in self._stripes[hash(key) & self._mask].entries
+
+    def get(self, key, default=None):
+        """Look up a key and mark it as recently used.
+
+        Args:
+            key: The key to look up.
+            default: The value to return if the key is missing.
+
+        Returns:
+            The cached value, or default if the key is missing.
+        """
+        stripe = self._stripes[hash(key) & self._mask]
+        entry = stripe.entries.get(key)
+        if entry is None:
+            stripe.misses += 1
+            return default
+        if not entry.referenced:
+            # Only written when clear, so hot entries read by many threads
+            # are not written on every lookup.
+            entry.referenced = True
+        stripe.hits += 1
+        return entry.value
+
+    def put(self, key, value):
+        """Store a value, evicting an entry of its stripe if it is full.
+
+        Args:
+            key: The key to store.
+            value: The value to store.
+        """
+        stripe = self._stripes[hash(key) & self._mask]
+        with stripe.lock:
+            entry = stripe.entries.get(key)
+            if entry is not None:
+                entry.value = value
+                entry.referenced = True
+            elif stripe.capacity:
+                if len(stripe.entries) < stripe.capacity:
+                    stripe.ring.append(key)
+                else:
+                    stripe.ring[stripe.evict()] = key
+                stripe.entries[key] = _Entry(value)
+
+    def clear(self):
+        """Remove all entries and reset the counters."""
+        for stripe in self._stripes:
+            with stripe.lock:
+                stripe.entries.clear()
+                stripe.ring.clear()
+                stripe.hand = 0
+                stripe.hits = 0
+                stripe.misses = 0
+                stripe.evictions = 0
+
+    def stats(self) -> dict:
+        """Return the cache counters.
+
+        Returns:
+            A dictionary with the size, capacity, hits, misses and evictions.
+        """
+        return {
+            'size': len(self),
+            'capacity': self._capacity,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+    def _resize(self):
+        """Share the capacity out between the stripes, evicting as needed."""
+        count = len(self._stripes)
+        for i, stripe in enumerate(self._stripes):
+            with stripe.lock:
+                stripe.capacity = self._capacity // count + (
+                    i < self._capacity % count
+                )
+                while len(stripe.entries) > stripe.capacity:
+                    stripe.hand = stripe.evict()
+                    stripe.ring.pop(stripe.hand)
@@ -1,11 +1,28 @@
 """Calculator CLI module.
 
 This module provides the command-line interface for the calculator.
+
+Shell scripts start the calculator once per expression, so this module
+imports nothing but ``sys`` up front: the parser is imported when the first
+expression is evaluated, and option parsing, batch evaluation, metrics and
+profiling only when their options are used.
 """
 
 import sys
 
-from calculator.parser import parse
+# How batch mode reacts to an expression that fails to evaluate.
+ERROR_POLICIES = ('skip', 'emit', 'abort')
+
+# Number of result lines collected before each write in batch mode.
+DEFAULT_CHUNK_SIZE = 1024
+
+# Read buffer size for batch input files.
+BUFFER_SIZE = 1 << 20
+
+# calculator.profiling's PROFILE_FORMATS and DEFAULT_TOP, repeated here so
+# that parsing options does not import the profiling module.
+PROFILE_FORMATS = ('pstats', 'collapsed')
+DEFAULT_PROFILE_TOP = 10
 
 HELP_TEXT = """Calculator CLI - Help
 
@@ -19,9 +36,25 @@ Usage:
   Non-interactive mode:
     python -m calculator "expression"
 
+  Batch mode (one expression per line, one result per line):
+    python -m calculator --batch [FILE|-] [--on-error skip|emit|abort]
+                         [--jobs N]
+
+  Timing summary of the parser phases, printed to stderr at exit:
+    python -m calculator --stats [--batch ...] ["expression"]
+
+  Costliest expressions of a batch, printed to stderr at exit:
+    python -m calculator --batch [FILE|-] --profile [--profile-top N]
+                         [--profile-output FILE]
+                         [--profile-format pstats|collapsed]
+
 Supported operations:
   + (addition), - (subtraction), * (multiplication), / (division)
+  % (modulo), ^ or ** (exponent), ! (factorial)
   Parentheses for grouping: ( )
+  Functions: sqrt, exp, ln, log(x[, base]), sin, cos, tan, pow(x, y),
+             power(x, y), mod(x, y), factorial
+  Constants: pi, e
 
 Examples:
   > 2 + 3
@@ -30,6 +63,8 @@ Examples:
   32.0
   > 15 / 3
   5.0
+  > sqrt(16) + 2^3
+  12.0
 """
 
 
@@ -47,15 +82,256 @@ def main(args=None):
 
     if len(args) == 0:
         return repl()
+    elif args[0].startswith('--'):
+        return _main_with_options(args)
     else:
-        expression = ' '.join(args)
+        return evaluate(' '.join(args))
+
+
+def evaluate(expression):
+    """Evaluate a single expression and print the result.
+
+    Args:
+        expression: The expression to evaluate.
+
+    Returns:
+        Exit code (0 for success, 1 for error).
+    """
+    from calculator.parser import parse
+
+    try:
+        result = parse(expression)
+        print(result)
+        return 0
+    except (SyntaxError, ZeroDivisionError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+
+def run_batch(
+    path='-', on_error='emit', chunk_size=DEFAULT_CHUNK_SIZE, jobs=1, profiler=None
+):
+    """Evaluate newline-delimited expressions from a file or stdin.
+
+    Input is streamed line by line and results are written in chunks, so
+    memory use does not grow with the size of the input. With several jobs,
+    expressions are evaluated in worker processes and results are still
+    written in input order.
+
+    Args:
+        path: The file to read, or '-' for stdin.
+        on_error: What to do when an expression fails: 'skip' drops it,
+            'emit' writes an "Error: ..." line in its place and 'abort'
+            stops at the first failure.
+        chunk_size: Number of result lines to collect before each write.
+        jobs: Number of worker processes; 0 uses one per CPU.
+        profiler: Optional Profiler to evaluate through, in this process,
+            recording what each expression costs. jobs is then ignored.
+
+    Returns:
+        Exit code (0 for success, 1 if the input could not be read or the
+        batch was aborted).
+    """
+    try:
+        if path == '-':
+            return _write_results(sys.stdin, on_error, chunk_size, jobs, profiler)
+        with open(path, encoding='utf-8', buffering=BUFFER_SIZE) as stream:
+            return _write_results(stream, on_error, chunk_size, jobs, profiler)
+    except OSError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+
+def _write_results(lines, on_error, chunk_size, jobs, profiler=None):
+    """Evaluate lines and write their results to stdout in chunks.
+
+    Args:
+        lines: An iterable of expression lines.
+        on_error: The error policy, one of ERROR_POLICIES.
+        chunk_size: Number of result lines to collect before each write.
+        jobs: Number of worker processes; 0 uses one per CPU.
+        profiler: Optional Profiler to evaluate through instead.
+
+    Returns:
+        Exit code (0 for success, 1 if the batch was aborted).
+    """
+    from calculator.batch import EXPRESSION_ERRORS, evaluate_many
+
+    out = sys.stdout
+    chunk = []
+
+    if profiler is not None:
+        results = profiler.evaluate(lines)
+    else:
+        results = evaluate_many(lines, workers=jobs)
+    try:
+        for line_number, result in enumerate(results, start=1):
+            if isinstance(result, EXPRESSION_ERRORS):
+                if on_error == 'skip':
+                    continue
+                if on_error == 'abort':
+                    out.write(''.join(chunk))
+                    print(f"Error: line {line_number}: {result}", file=sys.stderr)
+                    return 1
+                chunk.append(f"Error: {result}\n")
+            else:
+                chunk.append(f"{result}\n")
+
+            if len(chunk) >= chunk_size:
+                out.write(''.join(chunk))
+                chunk.clear()
+    finally:
+        results.close()
+
+    out.write(''.join(chunk))
+    return 0
+
+
+def _build_arg_parser():
+    """Build the parser for command-line options.
+
+    Returns:
+        The argument parser.
+    """
+    import argparse
+
+    arg_parser = argparse.ArgumentParser(
+        prog='python -m calculator', description="Calculator CLI"
+    )
+    arg_parser.add_argument('expression', nargs='*', help="expression to evaluate")
+    arg_parser.add_argument(
+        '--batch',
+        nargs='?',
+        const='-',
+        metavar='FILE',
+        help="evaluate one expression per line from FILE, or stdin if '-'",
+    )
+    arg_parser.add_argument(
+        '--on-error',
+        choices=ERROR_POLICIES,
+        default='emit',
+        help="what batch mode does with failing expressions",
+    )
+    arg_parser.add_argument(
+        '--chunk-size',
+        type=int,
+        default=DEFAULT_CHUNK_SIZE,
+        metavar='LINES',
+        help="number of result lines written at a time in batch mode",
+    )
+    arg_parser.add_argument(
+        '--jobs',
+        type=int,
+        default=1,
+        metavar='N',
+        help="worker processes for batch mode; 0 uses one per CPU",
+    )
+    arg_parser.add_argument(
+        '--stats',
+        action='store_true',
+        help="print parser phase timings and error counts to stderr at exit; "
+        "work done in --jobs worker processes is not included",
+    )
+    arg_parser.add_argument(
+        '--profile',
+        action='store_true',
+        help="report the costliest expressions of a batch to stderr at exit; "
+        "evaluates in this process, ignoring --jobs",
+    )
+    arg_parser.add_argument(
+        '--profile-top',
+        type=int,
+        default=DEFAULT_PROFILE_TOP,
+        metavar='N',
+        help="number of expressions listed in each ranking of the profile",
+    )
+    arg_parser.add_argument(
+        '--profile-output',
+        metavar='FILE',
+        help="also write a function-level profile of the batch to FILE",
+    )
+    arg_parser.add_argument(
+        '--profile-format',
+        choices=PROFILE_FORMATS,
+        default='pstats',
+        help="format of --profile-output: a pstats file, or collapsed stacks "
+        "for flamegraph tools",
+    )
+    return arg_parser
+
+
+def _main_with_options(args):
+    """Run the CLI for arguments that start with an option.
+
+    Args:
+        args: Command-line arguments.
+
+    Returns:
+        Exit code (0 for success, 1 for error).
+    """
+    arg_parser = _build_arg_parser()
+    options = arg_parser.parse_args(args)
+    if options.profile and options.batch is None:
+        arg_parser.error("--profile requires --batch")
+    if options.jobs < 0:
+        arg_parser.error("--jobs must be at least 0")
+
+    if options.stats:
+        from calculator import metrics
+
+        metrics.enable()
         try:
-            result = parse(expression)
-            print(result)
-            return 0
-        except (SyntaxError, ZeroDivisionError) as e:
-            print(f"Error: {e}", file=sys.stderr)
-            return 1
+            return _run(options)
+        finally:
+            metrics.disable()
+            print(metrics.summary(), file=sys.stderr)
+    return _run(options)
+
+
+def _run(options):
+    """Run the mode selected by parsed command-line options.
+
+    Args:
+        options: The parsed options.
+
+    Returns:
+        Exit code (0 for success, 1 for error).
+    """
+    if options.profile:
+        return _profile_batch(options)
+    if options.batch is not None:
+        return run_batch(
+            options.batch, options.on_error, options.chunk_size, options.jobs
+        )
+    if options.expression:
+        return evaluate(' '.join(options.expression))
+    return repl()
+
+
+def _profile_batch(options):
+    """Run batch mode through a Profiler and print its summary to stderr.
+
+    Args:
+        options: The parsed options.
+
+    Returns:
+        Exit code (0 for success, 1 for error).
+    """
+    from calculator.profiling import Profiler, write_profile
+
+    profiler = Profiler(top=options.profile_top)
+
+    def run():
+        return run_batch(
+            options.batch, options.on_error, options.chunk_size, profiler=profiler
+        )
+
+    if options.profile_output:
+        result = write_profile(run, options.profile_output, options.profile_format)
+    else:
+        result = run()
+    print(profiler.summary(), file=sys.stderr)
+    return result
 
 
 def repl():
@@ -64,6 +340,8 @@ def repl():
     Returns:
         Exit code (always 0).
     """
+    from calculator.parser import parse
+
     while True:
         try:
             expression = input("> ")
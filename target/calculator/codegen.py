@@ -0,0 +1,161 @@
+"""Calculator code generation module.
+
+This module turns compiled expressions into plain Python functions, so that
+evaluating them runs as native bytecode instead of through the RPN
+interpreter. The source of the function is generated from the validated
+program, never from the expression text: it consists only of generated
+names, parameters named after the variables, numeric literals, negation
+and the operators ``+ - * /``. Every other callable and constant is passed in
+through the function's globals.
+"""
+
+import builtins
+import keyword
+import math
+import operator
+import re
+
+from calculator.parser import _BINARY, _LOAD, _PUSH, _STORE, _UNARY
+from calculator.parser import compile as _compile
+
+# Operators emitted as native Python operators. They behave exactly like the
+# callables, including raising ZeroDivisionError for division by zero.
+_BINARY_SYMBOLS = {
+    operator.add: '+',
+    operator.sub: '-',
+    operator.mul: '*',
+    operator.truediv: '/',
+}
+
+# Nesting depth beyond which a subexpression is assigned to a temporary, so
+# deeply nested expressions stay within the limits of Python's compiler.
+_MAX_NESTING = 50
+
+# Names that generated code uses for itself, its constants, functions and
+# temporaries. Variables with such names, or named after Python keywords,
+# get a generated parameter name and can only be passed positionally.
+_RESERVED = re.compile(r'_[cfpst]\d+|_float|_expression')
+
+
+def compile_fn(expression: str):
+    """Compile an expression into a Python function.
+
+    Args:
+        expression: The mathematical expression to compile.
+
+    Returns:
+        A function taking the expression's variables, in the order of first
+        use, positionally or by name, and returning the result as a float.
+
+    Raises:
+        SyntaxError: If the expression is malformed.
+    """
+    return to_function(_compile(expression))
+
+
+def to_function(compiled):
+    """Turn a compiled expression into a Python function.
+
+    The function computes shared subexpressions once, like the compiled
+    program, and raises the same exceptions as ``compiled.evaluate``.
+    Unlike evaluate(), it rejects keyword arguments that are not variables.
+
+    Args:
+        compiled: The compiled expression.
+
+    Returns:
+        A function taking the variables positionally or by name and
+        returning the result as a float.
+    """
+    source, namespace = generate(compiled)
+    code = builtins.compile(source, f"<expression {compiled.source!r}>", 'exec')
+    exec(code, namespace)
+    function = namespace['_expression']
+    function.__doc__ = compiled.source
+    return function
+
+
+def generate(compiled) -> tuple:
+    """Generate the source of a Python function for a compiled expression.
+
+    Args:
+        compiled: The compiled expression.
+
+    Returns:
+        A tuple of the source defining the function ``_expression`` and the
+        globals it must be executed with.
+    """
+    namespace = {'__builtins__': {}, '_float': float}
+    names = {}
+
+    def global_name(prefix: str, value) -> str:
+        key = (prefix, id(value))
+        if key not in names:
+            names[key] = f"{prefix}{len(names)}"
+            namespace[names[key]] = value
+        return names[key]
+
+    count = len(compiled.variables)
+    parameters = [
+        name
+        if name.isidentifier()
+        and not keyword.iskeyword(name)
+        and not _RESERVED.fullmatch(name)
+        else f"_p{slot}"
+        for slot, name in enumerate(compiled.variables)
+    ]
+    lines = []
+    temps = 0
+    # Symbolic stack of (source, nesting depth) pairs.
+    stack = []
+
+    def spill(text: str) -> str:
+        nonlocal temps
+        name = f"_t{temps}"
+        temps += 1
+        lines.append(f"    {name} = {text}")
+        return name
+
+    for opcode, argument in compiled._program:
+        if opcode == _PUSH:
+            if type(argument) in (int, float) and math.isfinite(argument):
+                stack.append((f"({argument!r})", 0))
+            else:
+                stack.append((global_name('_c', argument), 0))
+        elif opcode == _LOAD:
+            if argument < count:
+                stack.append((parameters[argument], 0))
+            else:
+                stack.append((f"_s{argument - count}", 0))
+        elif opcode == _STORE:
+            text, _ = stack.pop()
+            lines.append(f"    _s{argument - count} = {text}")
+            stack.append((f"_s{argument - count}", 0))
+        else:
+            if opcode == _UNARY:
+                func, arity = argument, 1
+            elif opcode == _BINARY:
+                func, arity = argument, 2
+            else:
+                func, arity = argument
+            operands = stack[len(stack) - arity:]
+            del stack[len(stack) - arity:]
+            depth = 1 + max((depth for _, depth in operands), default=0)
+            texts = [text for text, _ in operands]
+            if func is operator.neg:
+                text = f"(-{texts[0]})"
+            elif opcode == _BINARY and func in _BINARY_SYMBOLS:
+                text = f"({texts[0]} {_BINARY_SYMBOLS[func]} {texts[1]})"
+            else:
+                text = f"{global_name('_f', func)}({', '.join(texts)})"
+            if depth > _MAX_NESTING:
+                text, depth = spill(text), 0
+            stack.append((text, depth))
+
+    result = stack[0][0]
+    source = '\n'.join(
+        [f"def _expression({', '.join(parameters)}):"]
+        + lines
+        + [f"    return _float({result})"]
+    )
+    return source + '\n', namespace
@@ -0,0 +1,465 @@
+"""Calculator disk cache module.
+
+This module stores compiled expressions in a binary file that fresh
+processes can map into memory instead of compiling the expressions again.
+The file holds a versioned header, the compiled programs, a table of the
+operators and functions they call, and an index of the programs sorted by a
+hash of their source. Opening a file reads only the header and the name
+table; lookups binary-search the mapped index and decode just the program
+they find.
+
+Callables are stored by their name in the registry, so a file can only be
+opened with a registry that defines the same operators, functions and
+constants as the one it was written with.
+"""
+
+import hashlib
+import mmap
+import os
+import struct
+import sys
+import tempfile
+
+from calculator.cache import LRUCache
+from calculator.parser import (
+    _BINARY,
+    _CALL,
+    _LOAD,
+    _PUSH,
+    _STORE,
+    _UNARY,
+    CompiledExpression,
+    ExactExpression,
+    Parser,
+)
+from calculator.registry import DEFAULT_CACHE_SIZE, Registry, default_registry
+
+MAGIC = b'CALCEXP\0'
+VERSION = 1
+
+# Header: magic, version, flags, registry fingerprint, number of expressions,
+# offset of the name table and offset of the index.
+_HEADER = struct.Struct('<8sHH16sIQQ')
+# Index entry: source hash and record offset, sorted by hash.
+_ENTRY = struct.Struct('<QQ')
+_U16 = struct.Struct('<H')
+_U32 = struct.Struct('<I')
+_PROGRAM = struct.Struct('<HI')
+
+# Instruction tags on disk, each followed by its operand.
+_TAG_FLOAT = 0
+_TAG_INT = 1
+_TAG_LOAD = 2
+_TAG_STORE = 3
+_TAG_UNARY = 4
+_TAG_BINARY = 5
+_TAG_CALL = 6
+# An int outside the 64-bit range, such as a folded factorial, stored as its
+# length and its signed little-endian bytes.
+_TAG_BIG_INT = 7
+_TAGGED_FLOAT = struct.Struct('<Bd')
+_TAGGED_INT = struct.Struct('<Bq')
+_TAGGED_SLOT = struct.Struct('<BI')
+_TAGGED_NAME = struct.Struct('<BH')
+_TAGGED_CALL = struct.Struct('<BHH')
+_TAGGED_BIG_INT = struct.Struct('<BI')
+
+# Registry tables callables are looked up in, by the prefix of their name.
+_TABLES = (
+    ('f', 'functions'),
+    ('o', 'operators'),
+    ('p', 'prefix_operators'),
+    ('s', 'postfix_operators'),
+)
+
+
+def save(path, expressions, parser: Parser | None = None) -> int:
+    """Compile expressions and write them to a disk cache file.
+
+    The file is written to a temporary file first and then moved into
+    place, so processes opening it never see a partial file.
+
+    Args:
+        path: The file to write.
+        expressions: Expression strings, or expressions already compiled
+            with the parser's registry.
+        parser: The parser to compile with. Defaults to a parser using the
+            default registry.
+
+    Returns:
+        The number of distinct expressions written.
+
+    Raises:
+        SyntaxError: If an expression is malformed.
+        ValueError: If a program calls something that is not in the
+            registry, pushes a constant that is not a float or an int, or
+            computes with an exact numeric backend.
+    """
+    if parser is None:
+        parser = Parser()
+    registry = parser.registry
+
+    compiled = {}
+    for expression in expressions:
+        if not isinstance(expression, CompiledExpression):
+            expression = parser.compile(expression)
+        if isinstance(expression, ExactExpression):
+            raise ValueError(
+                f"cannot store {expression.source!r}: "
+                f"only float expressions can be stored"
+            )
+        compiled.setdefault(expression.source, expression)
+
+    references = {}
+    for prefix, table in reversed(_TABLES):
+        for name, entry in getattr(registry, table).items():
+            references[id(entry.func)] = prefix + name
+    names = {}
+
+    data = bytearray(_HEADER.size)
+    entries = []
+    for source, expression in compiled.items():
+        entries.append((_hash(source), len(data)))
+        _write_text(data, source, _U32)
+        data += _U16.pack(len(expression.variables))
+        for variable in expression.variables:
+            _write_text(data, variable, _U16)
+        data += _PROGRAM.pack(expression._temps, len(expression._program))
+        for opcode, argument in expression._program:
+            data += _encode(opcode, argument, references, names)
+
+    names_offset = len(data)
+    data += _U16.pack(len(names))
+    for name in names:
+        _write_text(data, name, _U16)
+
+    index_offset = len(data)
+    for entry in sorted(entries):
+        data += _ENTRY.pack(*entry)
+
+    data[:_HEADER.size] = _HEADER.pack(
+        MAGIC,
+        VERSION,
+        0,
+        _fingerprint(registry),
+        len(entries),
+        names_offset,
+        index_offset,
+    )
+
+    directory = os.path.dirname(os.path.abspath(path))
+    with tempfile.NamedTemporaryFile(dir=directory, delete=False) as file:
+        try:
+            file.write(data)
+        except BaseException:
+            file.close()
+            os.unlink(file.name)
+            raise
+    os.replace(file.name, path)
+    return len(entries)
+
+
+class DiskCache:
+    """A read-only cache of compiled expressions backed by a mapped file.
+
+    It can be passed to a Parser as its cache. Expressions found in the
+    file are decoded on first use and kept in a bounded in-memory cache,
+    along with the expressions the parser compiles because the file lacks
+    them; those are not written back. Use save() to write a new file.
+
+    Attributes:
+        path: The file being read.
+        registry: The registry callables are resolved in.
+        hits: Number of lookups answered from memory.
+        loads: Number of lookups answered by decoding from the file.
+        misses: Number of lookups that found nothing.
+    """
+
+    def __init__(
+        self,
+        path,
+        registry: Registry | None = None,
+        capacity: int = DEFAULT_CACHE_SIZE,
+    ):
+        """Map a disk cache file.
+
+        Args:
+            path: The file written by save().
+            registry: The registry to resolve callables in. It must define
+                the same operators, functions and constants as the registry
+                the file was written with. Defaults to the default registry.
+            capacity: The number of decoded expressions kept in memory.
+
+        Raises:
+            OSError: If the file cannot be opened.
+            ValueError: If the file is not a disk cache file, has an
+                unsupported version, or was written for another registry.
+        """
+        self.path = path
+        self.registry = default_registry if registry is None else registry
+        self.hits = 0
+        self.loads = 0
+        self.misses = 0
+        self._memory = LRUCache(capacity)
+
+        with open(path, 'rb') as file:
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self._open()
+        except BaseException:
+            self._map.close()
+            raise
+
+    def _open(self):
+        try:
+            magic, version, _, fingerprint, count, names_offset, index_offset = (
+                _HEADER.unpack_from(self._map)
+            )
+        except struct.error:
+            magic = None
+        if magic != MAGIC:
+            raise ValueError(f"{self.path!s} is not a compiled-expression file")
+        if version != VERSION:
+            raise ValueError(
+                f"{self.path!s} has version {version}, expected {VERSION}"
+            )
+        if fingerprint != _fingerprint(self.registry):
+            raise ValueError(f"{self.path!s} was written for a different registry")
+        if index_offset + count * _ENTRY.size > len(self._map):
+            raise ValueError(f"{self.path!s} is truncated")
+
+        self._count = count
+        self._index_offset = index_offset
+        self._functions = []
+        (length,) = _U16.unpack_from(self._map, names_offset)
+        offset = names_offset + _U16.size
+        for _ in range(length):
+            name, offset = _read_text(self._map, offset, _U16)
+            table = dict(_TABLES)[name[0]]
+            self._functions.append(getattr(self.registry, table)[name[1:]].func)
+
+    def __repr__(self):
+        return f"<DiskCache {self.path!s}: {self._count} expressions>"
+
+    def __len__(self):
+        return self._count
+
+    def __contains__(self, source):
+        return source in self._memory or self._find(source) is not None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Unmap the file. Expressions already decoded remain valid."""
+        self._map.close()
+
+    def get(self, source: str, default=None):
+        """Look up a compiled expression by its normalized source.
+
+        Args:
+            source: The normalized source, as ``Parser.compile`` uses it.
+            default: The value to return if the expression is missing.
+
+        Returns:
+            The compiled expression, or default if it is missing.
+
+        Raises:
+            ValueError: If the file is corrupt.
+        """
+        compiled = self._memory.get(source)
+        if compiled is not None:
+            self.hits += 1
+            return compiled
+        offset = self._find(source)
+        if offset is None:
+            self.misses += 1
+            return default
+        try:
+            compiled = self._decode(offset)
+        except (struct.error, IndexError, UnicodeDecodeError) as e:
+            raise ValueError(f"{self.path!s} is corrupt: {e}") from None
+        self._memory.put(source, compiled)
+        self.loads += 1
+        return compiled
+
+    def put(self, source: str, compiled: CompiledExpression):
+        """Keep an expression compiled elsewhere in the in-memory cache.
+
+        Args:
+            source: The normalized source.
+            compiled: The compiled expression.
+        """
+        self._memory.put(source, compiled)
+
+    def clear(self):
+        """Drop the decoded expressions and reset the counters."""
+        self._memory.clear()
+        self.hits = 0
+        self.loads = 0
+        self.misses = 0
+
+    def stats(self) -> dict:
+        """Return the cache counters.
+
+        Returns:
+            A dictionary with the number of expressions in the file, the
+            number held in memory, hits, loads and misses.
+        """
+        return {
+            'size': self._count,
+            'memory': len(self._memory),
+            'hits': self.hits,
+            'loads': self.loads,
+            'misses': self.misses,
+        }
+
+    def _find(self, source: str) -> int | None:
+        """Return the offset of the record for source, or None."""
+        key = _hash(source)
+        data = self._map
+        unpack = _ENTRY.unpack_from
+        base = self._index_offset
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            if unpack(data, base + middle * _ENTRY.size)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        # Sources whose hashes collide sit next to each other.
+        encoded = source.encode()
+        while low < self._count:
+            entry_key, offset = unpack(data, base + low * _ENTRY.size)
+            if entry_key != key:
+                break
+            (length,) = _U32.unpack_from(data, offset)
+            start = offset + _U32.size
+            if data[start:start + length] == encoded:
+                return offset
+            low += 1
+        return None
+
+    def _decode(self, offset: int) -> CompiledExpression:
+        """Decode the record at offset into a compiled expression."""
+        data = self._map
+        functions = self._functions
+        source, offset = _read_text(data, offset, _U32)
+        (count,) = _U16.unpack_from(data, offset)
+        offset += _U16.size
+        variables = []
+        for _ in range(count):
+            variable, offset = _read_text(data, offset, _U16)
+            variables.append(sys.intern(variable))
+        temps, length = _PROGRAM.unpack_from(data, offset)
+        offset += _PROGRAM.size
+
+        program = []
+        for _ in range(length):
+            tag = data[offset]
+            if tag == _TAG_FLOAT:
+                _, value = _TAGGED_FLOAT.unpack_from(data, offset)
+                program.append((_PUSH, value))
+                offset += _TAGGED_FLOAT.size
+            elif tag == _TAG_LOAD or tag == _TAG_STORE:
+                _, slot = _TAGGED_SLOT.unpack_from(data, offset)
+                program.append((_LOAD if tag == _TAG_LOAD else _STORE, slot))
+                offset += _TAGGED_SLOT.size
+            elif tag == _TAG_UNARY or tag == _TAG_BINARY:
+                _, name = _TAGGED_NAME.unpack_from(data, offset)
+                opcode = _UNARY if tag == _TAG_UNARY else _BINARY
+                program.append((opcode, functions[name]))
+                offset += _TAGGED_NAME.size
+            elif tag == _TAG_CALL:
+                _, name, arguments = _TAGGED_CALL.unpack_from(data, offset)
+                program.append((_CALL, (functions[name], arguments)))
+                offset += _TAGGED_CALL.size
+            elif tag == _TAG_INT:
+                _, value = _TAGGED_INT.unpack_from(data, offset)
+                program.append((_PUSH, value))
+                offset += _TAGGED_INT.size
+            elif tag == _TAG_BIG_INT:
+                _, size = _TAGGED_BIG_INT.unpack_from(data, offset)
+                offset += _TAGGED_BIG_INT.size
+                end = offset + size
+                value = int.from_bytes(data[offset:end], 'little', signed=True)
+                program.append((_PUSH, value))
+                offset = end
+            else:
+                raise ValueError(f"{self.path!s} is corrupt: unknown tag {tag}")
+        return CompiledExpression(source, tuple(program), tuple(variables), temps)
+
+
+def _hash(source: str) -> int:
+    """Return the 64-bit index key of a normalized source."""
+    digest = hashlib.blake2b(source.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, 'little')
+
+
+def _fingerprint(registry: Registry) -> bytes:
+    """Return a digest of everything a registry defines.
+
+    Callables are identified by their qualified names, so the digest stays
+    the same across processes.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for prefix, table in _TABLES:
+        entries = getattr(registry, table)
+        for name in sorted(entries):
+            entry = entries[name]
+            func = entry.func
+            described = entry._replace(
+                func=f"{func.__module__}.{getattr(func, '__qualname__', func)!s}"
+            )
+            digest.update(repr((prefix, name, tuple(described))).encode())
+    for name in sorted(registry.constants):
+        digest.update(repr(('c', name, registry.constants[name])).encode())
+    return digest.digest()
+
+
+def _encode(opcode: int, argument, references: dict, names: dict) -> bytes:
+    """Encode one instruction, adding the callables it uses to names."""
+    if opcode == _PUSH:
+        if type(argument) is float:
+            return _TAGGED_FLOAT.pack(_TAG_FLOAT, argument)
+        if type(argument) is int:
+            if -(1 << 63) <= argument < 1 << 63:
+                return _TAGGED_INT.pack(_TAG_INT, argument)
+            size = argument.bit_length() // 8 + 1
+            value = argument.to_bytes(size, 'little', signed=True)
+            return _TAGGED_BIG_INT.pack(_TAG_BIG_INT, size) + value
+        raise ValueError(f"cannot store constant {argument!r}")
+    if opcode == _LOAD:
+        return _TAGGED_SLOT.pack(_TAG_LOAD, argument)
+    if opcode == _STORE:
+        return _TAGGED_SLOT.pack(_TAG_STORE, argument)
+    if opcode == _CALL:
+        func, arguments = argument
+        return _TAGGED_CALL.pack(_TAG_CALL, _name(func, references, names), arguments)
+    tag = _TAG_UNARY if opcode == _UNARY else _TAG_BINARY
+    return _TAGGED_NAME.pack(tag, _name(argument, references, names))
+
+
+def _name(func, references: dict, names: dict) -> int:
+    """Return the index of a callable in the name table."""
+    reference = references.get(id(func))
+    if reference is None:
+        raise ValueError(f"{func!r} is not in the registry")
+    return names.setdefault(reference, len(names))
+
+
+def _write_text(data: bytearray, text: str, length: struct.Struct):
+    """Append text as UTF-8, prefixed with its length."""
+    encoded = text.encode()
+    data += length.pack(len(encoded))
+    data += encoded
+
+
+def _read_text(data, offset: int, length: struct.Struct) -> tuple:
+    """Read text written by _write_text; return it and the next offset."""
+    (size,) = length.unpack_from(data, offset)
+    start = offset + length.size
+    return data[start:start + size].decode(), start + size
@@ -0,0 +1,173 @@
+"""Calculator metrics module.
+
+This module records where the parser spends its time: a count and a latency
+histogram for each phase of ``Parser.compile`` and ``Parser.parse``, and the
+number of errors by exception type. Recording is off by default. The parser
+checks the module-level ``enabled`` flag once per call and takes its usual
+path when it is false, so leaving instrumentation in production costs one
+attribute lookup.
+
+Phases:
+
+- ``cache``: looking the expression up in the parser's cache.
+- ``tokenize``: splitting the source into tokens.
+- ``shunting_yard``: converting tokens to Reverse Polish Notation.
+- ``optimize``: building the expression graph, folding constants and
+  sharing subexpressions.
+- ``assemble``: emitting the program.
+- ``evaluate``: running the program, in ``Parser.parse``.
+
+Latencies are bucketed by powers of two nanoseconds, so percentiles are
+accurate to within a factor of two.
+"""
+
+import _thread
+import time
+
+PHASES = ('cache', 'tokenize', 'shunting_yard', 'optimize', 'assemble', 'evaluate')
+
+# Histogram buckets: bucket i counts latencies below 2**i nanoseconds.
+_BUCKETS = 64
+
+# Whether the parser records metrics. Use enable() and disable() to change it.
+enabled = False
+
+# The low-level lock, since importing threading would slow down every
+# process that imports the parser.
+_lock = _thread.allocate_lock()
+_phases = {}
+_errors = {}
+
+clock = time.perf_counter_ns
+
+
+def enable():
+    """Start recording metrics."""
+    global enabled
+    enabled = True
+
+
+def disable():
+    """Stop recording metrics. Recorded metrics are kept."""
+    global enabled
+    enabled = False
+
+
+def reset():
+    """Discard all recorded metrics."""
+    with _lock:
+        _phases.clear()
+        _errors.clear()
+
+
+def record(phase: str, nanoseconds: int):
+    """Record the latency of one run of a phase.
+
+    Args:
+        phase: The phase name, usually one of PHASES.
+        nanoseconds: How long the phase took.
+    """
+    bucket = min(nanoseconds.bit_length(), _BUCKETS - 1)
+    with _lock:
+        stats = _phases.get(phase)
+        if stats is None:
+            stats = _phases[phase] = [0, 0, nanoseconds, nanoseconds, [0] * _BUCKETS]
+        stats[0] += 1
+        stats[1] += nanoseconds
+        if nanoseconds < stats[2]:
+            stats[2] = nanoseconds
+        if nanoseconds > stats[3]:
+            stats[3] = nanoseconds
+        stats[4][bucket] += 1
+
+
+def record_error(error: BaseException):
+    """Count an error by its exception type.
+
+    Args:
+        error: The exception raised.
+    """
+    name = type(error).__name__
+    with _lock:
+        _errors[name] = _errors.get(name, 0) + 1
+
+
+def snapshot() -> dict:
+    """Return a copy of the recorded metrics.
+
+    Returns:
+        A dictionary with ``phases``, mapping each phase recorded so far to
+        its ``count``, ``total_us``, ``mean_us``, ``min_us``, ``max_us``,
+        ``p50_us`` and ``p99_us`` and its ``histogram``, a dictionary from
+        bucket upper bounds in microseconds to counts; and ``errors``,
+        mapping exception type names to counts.
+    """
+    with _lock:
+        phases = {
+            phase: (count, total, low, high, list(buckets))
+            for phase, (count, total, low, high, buckets) in _phases.items()
+        }
+        errors = dict(_errors)
+
+    report = {}
+    for phase in sorted(phases, key=_phase_order):
+        count, total, low, high, buckets = phases[phase]
+        report[phase] = {
+            'count': count,
+            'total_us': total / 1000,
+            'mean_us': total / count / 1000,
+            'min_us': low / 1000,
+            'max_us': high / 1000,
+            'p50_us': _percentile(buckets, count, 0.50, high) / 1000,
+            'p99_us': _percentile(buckets, count, 0.99, high) / 1000,
+            'histogram': {
+                (1 << bucket) / 1000: n for bucket, n in enumerate(buckets) if n
+            },
+        }
+    return {'phases': report, 'errors': errors}
+
+
+def summary(metrics: dict | None = None) -> str:
+    """Format metrics as a table.
+
+    Args:
+        metrics: A snapshot() result. Defaults to the current metrics.
+
+    Returns:
+        The table, one line per phase, followed by the error counts.
+    """
+    if metrics is None:
+        metrics = snapshot()
+    lines = [
+        f"{'phase':<14}{'count':>10}{'total ms':>12}{'mean us':>10}"
+        f"{'p50 us':>10}{'p99 us':>10}{'max us':>10}"
+    ]
+    for phase, stats in metrics['phases'].items():
+        lines.append(
+            f"{phase:<14}{stats['count']:>10}{stats['total_us'] / 1000:>12.3f}"
+            f"{stats['mean_us']:>10.2f}{stats['p50_us']:>10.2f}"
+            f"{stats['p99_us']:>10.2f}{stats['max_us']:>10.2f}"
+        )
+    if metrics['errors']:
+        lines.append("errors:")
+        for name, count in sorted(metrics['errors'].items()):
+            lines.append(f"  {name:<22}{count:>10}")
+    return '\n'.join(lines)
+
+
+def _phase_order(phase: str) -> tuple:
+    """Sort known phases in pipeline order, then others by name."""
+    if phase in PHASES:
+        return (PHASES.index(phase), '')
+    return (len(PHASES), phase)
+
+
+def _percentile(buckets: list, count: int, fraction: float, high: int) -> int:
+    """Estimate a percentile as the upper bound of its histogram bucket."""
+    rank = fraction * count
+    seen = 0
+    for bucket, n in enumerate(buckets):
+        seen += n
+        if seen >= rank:
+            return min(1 << bucket, high)
+    return high
@@ -0,0 +1,317 @@
+"""Calculator numeric module.
+
+Expressions compute with floats by default. This module provides the exact
+alternatives a parser can compile expressions for instead, chosen with
+``Parser(numeric=...)``:
+
+- ``'decimal'``: ``decimal.Decimal`` values, with arithmetic rounded to a
+  ``decimal.Context`` of 28 significant digits unless another context is
+  given, as in ``Parser(numeric=decimal.Context(prec=50))``.
+- ``'fraction'``: ``fractions.Fraction`` values, which never round.
+
+Values are converted once rather than on every operation: number literals
+and constants when an expression is compiled, variable values when it is
+evaluated. Constants such as ``pi`` are converted from their float values,
+so they have 16 significant digits. The operators and functions an
+expression uses are resolved at compile time to versions that take and
+return the exact type, so the program then runs on exact values throughout
+and the float path is left untouched.
+
+Exact results are limited to ``MAX_BITS`` bits: factorials and powers that
+would be larger raise OverflowError before they are computed, since their
+cost grows without bound.
+
+Functions with no exact version, such as ``sin`` or ``sqrt`` with
+fractions, are computed with floats and their results converted back as if
+they had been written as literals, so ``sin(1)`` is ``0.8414709848078965``
+in either exact mode. With decimals, ``sqrt``, ``exp``, ``ln`` and ``log``
+are computed to the context's precision.
+"""
+
+import decimal
+import functools
+import math
+import operator
+from fractions import Fraction
+
+from calculator import operations
+
+# Names Parser accepts for the numeric backends.
+NUMERIC_BACKENDS = ('float', 'decimal', 'fraction')
+
+# Bits of the largest exact factorial or power computed, about 40000 digits.
+MAX_BITS = 1 << 17
+
+
+class NumericBackend:
+    """An exact number type expressions can be compiled for.
+
+    Attributes:
+        name: ``'decimal'`` or ``'fraction'``.
+        type: The number type, ``Decimal`` or ``Fraction``.
+        context: The ``decimal.Context`` decimal arithmetic rounds to, or
+            None for fractions.
+        key: The prefix of the keys compiled expressions are cached under,
+            so that parsers for different backends can share a cache.
+    """
+
+    def __init__(self, number_type, context: decimal.Context | None = None):
+        """Initialize the backend.
+
+        Args:
+            number_type: ``decimal.Decimal`` or ``fractions.Fraction``.
+            context: For decimals, the context arithmetic rounds to.
+                Defaults to a context of 28 significant digits. It is
+                copied, so later changes to it have no effect.
+
+        Raises:
+            TypeError: If the type is not Decimal or Fraction.
+        """
+        if number_type is decimal.Decimal:
+            context = decimal.Context() if context is None else context.copy()
+            context.clear_flags()
+            self.name = 'decimal'
+            self.key = f"decimal {context!r}:"
+            self._resolved = _decimal_functions(context)
+        elif number_type is Fraction:
+            context = None
+            self.name = 'fraction'
+            self.key = 'fraction:'
+            self._resolved = dict(_FRACTION_FUNCTIONS)
+            self._resolved[operations.power] = _converting(
+                _fraction_power, self.coerce
+            )
+            self._resolved[operations.pow] = _converting(_fraction_pow, self.coerce)
+        else:
+            raise TypeError(f"no exact numeric backend for {number_type!r}")
+        self.type = number_type
+        self.context = context
+        factorial = _converting(_factorial, self.coerce)
+        self._resolved[operations.factorial] = factorial
+        self._resolved[operations.bounded_factorial] = factorial
+
+    def __repr__(self):
+        return f"<NumericBackend {self.name}>"
+
+    def number(self, text: str):
+        """Convert a number literal, exactly.
+
+        Args:
+            text: The literal, such as ``'0.1'`` or ``'-2.5e3'``.
+
+        Returns:
+            The value.
+
+        Raises:
+            ValueError: If the literal is malformed.
+        """
+        value = self.type(text)
+        if self.context is not None and value.is_nan():
+            # Only returned when the current context does not trap errors.
+            raise ValueError(f"invalid literal for Decimal: {text!r}")
+        return value
+
+    def coerce(self, value):
+        """Convert a value to the backend's type.
+
+        Floats are converted from their shortest representation, so ``0.1``
+        becomes exactly one tenth rather than the nearest binary fraction.
+
+        Args:
+            value: A number, or a string the type accepts.
+
+        Returns:
+            The value as the backend's type.
+        """
+        if type(value) is self.type:
+            return value
+        if isinstance(value, float):
+            return self.type(repr(value))
+        return self.type(value)
+
+    def resolve(self, func):
+        """Return the version of an operator or function to compile in.
+
+        Args:
+            func: The callable from the registry.
+
+        Returns:
+            A callable taking and returning the backend's type. Callables
+            without an exact version have their results converted.
+        """
+        resolved = self._resolved.get(func)
+        if resolved is None:
+            # setdefault, so that threads compiling at once agree.
+            resolved = self._resolved.setdefault(func, _converting(func, self.coerce))
+        return resolved
+
+
+def backend(numeric) -> NumericBackend | None:
+    """Look up a numeric backend.
+
+    Args:
+        numeric: One of NUMERIC_BACKENDS, a ``decimal.Context`` for decimals
+            rounded to it, a NumericBackend, or None for floats.
+
+    Returns:
+        The backend, or None for floats.
+
+    Raises:
+        ValueError: If the name is unknown.
+    """
+    if numeric is None or isinstance(numeric, NumericBackend):
+        return numeric
+    if isinstance(numeric, decimal.Context):
+        return NumericBackend(decimal.Decimal, numeric)
+    if numeric == 'float':
+        return None
+    if numeric == 'decimal':
+        return DECIMAL
+    if numeric == 'fraction':
+        return FRACTION
+    raise ValueError(
+        f"unknown numeric backend {numeric!r}; "
+        f"expected one of {', '.join(NUMERIC_BACKENDS)}"
+    )
+
+
+def _converting(func, coerce):
+    """Wrap a callable so that its result is converted with coerce."""
+
+    @functools.wraps(func)
+    def converting(*args):
+        return coerce(func(*args))
+
+    return converting
+
+
+def _factorial(n):
+    """Calculate the factorial of an exact number with an integral value."""
+    integral = int(n)
+    if integral != n:
+        raise ValueError("factorial requires an integer input")
+    if integral < 0:
+        raise ValueError("factorial is not defined for negative numbers")
+    if integral > 1 and math.lgamma(integral + 1) / math.log(2) > MAX_BITS:
+        raise OverflowError("factorial result too large")
+    return math.factorial(integral)
+
+
+def _fraction_power(base, exponent):
+    """Run operations.power, refusing exact results over MAX_BITS."""
+    _check_power(base, exponent)
+    return operations.power(base, exponent)
+
+
+def _fraction_pow(base, exponent):
+    """Run operations.pow, refusing exact results over MAX_BITS."""
+    _check_power(base, exponent)
+    return operations.pow(base, exponent)
+
+
+def _check_power(base, exponent):
+    """Check that an integral power of a fraction is not too large.
+
+    Raises:
+        OverflowError: If the exact result would have more than MAX_BITS
+            bits in its numerator or denominator.
+    """
+    if exponent.denominator != 1:
+        # Fractional powers are computed with floats.
+        return
+    bits = max(base.numerator.bit_length(), base.denominator.bit_length()) - 1
+    if bits * abs(exponent.numerator) > MAX_BITS:
+        raise OverflowError("power result too large")
+
+
+# Fractions are closed under these, so they need no conversion.
+_FRACTION_FUNCTIONS = {
+    operator.add: operator.add,
+    operator.sub: operator.sub,
+    operator.mul: operator.mul,
+    operator.neg: operator.neg,
+    operator.truediv: operations.divide,
+    operations.divide: operations.divide,
+    operations.modulo: operations.modulo,
+}
+
+
+def _decimal_functions(context: decimal.Context) -> dict:
+    """Return the decimal versions of the built-in operators and functions.
+
+    They round to the given context rather than the current thread's, so
+    expressions give the same results wherever they are evaluated.
+
+    Args:
+        context: The context to round to.
+
+    Returns:
+        A dictionary from registry callables to their decimal versions.
+    """
+    ten = decimal.Decimal(10)
+    # Logarithms in other bases are a quotient of two rounded logarithms,
+    # so they are computed with guard digits and then rounded.
+    wide = context.copy()
+    wide.prec += 5
+
+    def divide(a, b):
+        if b == 0:
+            raise ZeroDivisionError("division by zero")
+        return context.divide(a, b)
+
+    def modulo(a, b):
+        if b == 0:
+            raise ZeroDivisionError("modulo by zero")
+        # Decimal remainders take the sign of the dividend; floats and
+        # fractions take the sign of the divisor.
+        remainder = context.remainder(a, b)
+        if remainder and (remainder < 0) != (b < 0):
+            remainder = context.add(remainder, b)
+        return remainder
+
+    def power(base, exponent):
+        if base < 0 and exponent != exponent.to_integral_value():
+            raise ValueError("cannot raise negative number to a fractional power")
+        return context.power(base, exponent)
+
+    def sqrt(n):
+        if n < 0:
+            raise ValueError("cannot calculate square root of negative number")
+        return context.sqrt(n)
+
+    def ln(x):
+        if x <= 0:
+            raise ValueError("logarithm is not defined for non-positive numbers")
+        return context.ln(x)
+
+    def log(x, base=ten):
+        if x <= 0:
+            raise ValueError("logarithm is not defined for non-positive numbers")
+        if base <= 0 or base == 1:
+            raise ValueError("logarithm base must be positive and not equal to 1")
+        if base == ten:
+            return context.log10(x)
+        return context.plus(wide.divide(wide.ln(x), wide.ln(base)))
+
+    return {
+        operator.add: context.add,
+        operator.sub: context.subtract,
+        operator.mul: context.multiply,
+        operator.neg: context.minus,
+        operator.truediv: divide,
+        operations.add: context.add,
+        operations.subtract: context.subtract,
+        operations.multiply: context.multiply,
+        operations.divide: divide,
+        operations.modulo: modulo,
+        operations.power: power,
+        operations.pow: power,
+        operations.sqrt: sqrt,
+        operations.exp: context.exp,
+        operations.ln: ln,
+        operations.log: log,
+    }
+
+
+DECIMAL = NumericBackend(decimal.Decimal)
+FRACTION = NumericBackend(Fraction)
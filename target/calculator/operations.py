@@ -5,6 +5,11 @@ This module provides basic arithmetic and scientific operations.
 
 import math
 
+# Largest n whose factorial is a finite float. bounded_factorial() rejects
+# larger ones before computing them, since their cost grows without bound
+# and the result could only overflow once converted to a float.
+MAX_FACTORIAL = 170
+
 
 def add(a: float, b: float) -> float:
     """Add two numbers.
@@ -72,7 +77,12 @@ def power(base: float, exponent: float) -> float:
 
     Returns:
         The result of base raised to the power of exponent.
+
+    Raises:
+        ValueError: If base is negative and exponent is not an integer.
     """
+    if base < 0 and not float(exponent).is_integer():
+        raise ValueError("cannot raise negative number to a fractional power")
     return base ** exponent
 
 
@@ -115,7 +125,8 @@ def factorial(n: int) -> int:
     """Calculate the factorial of n.
 
     Args:
-        n: The non-negative integer to calculate the factorial of.
+        n: The non-negative integer to calculate the factorial of. Floats
+            with an integral value, such as 5.0, are accepted.
 
     Returns:
         The factorial of n.
@@ -124,6 +135,8 @@ def factorial(n: int) -> int:
         ValueError: If n is negative.
         ValueError: If n is not an integer.
     """
+    if isinstance(n, float) and n.is_integer():
+        n = int(n)
     if not isinstance(n, int):
         raise ValueError("factorial requires an integer input")
     if n < 0:
@@ -131,6 +144,27 @@ def factorial(n: int) -> int:
     return math.factorial(n)
 
 
+def bounded_factorial(n: int) -> int:
+    """Calculate the factorial of n for an expression evaluated with floats.
+
+    The factorial the default registry provides: like factorial(), but
+    refusing results too large for a float before computing them.
+
+    Args:
+        n: The non-negative integer to calculate the factorial of.
+
+    Returns:
+        The factorial of n.
+
+    Raises:
+        ValueError: If n is negative or not an integer.
+        OverflowError: If n is greater than MAX_FACTORIAL.
+    """
+    if n > MAX_FACTORIAL:
+        raise OverflowError("factorial result too large for a float")
+    return factorial(n)
+
+
 def cos(x: float) -> float:
     """Calculate the cosine of x (in radians).
 
@@ -188,8 +222,11 @@ def pow(base: float, exponent: float) -> float:
 
     Returns:
         The result of base raised to the power of exponent.
+
+    Raises:
+        ValueError: If base is negative and exponent is not an integer.
     """
-    return base ** exponent
+    return power(base, exponent)
 
 
 def ln(x: float) -> float:
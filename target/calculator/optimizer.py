@@ -0,0 +1,290 @@
+"""Calculator optimizer module.
+
+This module builds the intermediate form of an expression, a graph of
+operation nodes, and simplifies it while it is being built:
+
+- Operations whose operands are all constants are folded into a constant,
+  unless folding raises, in which case the error is left to evaluation time.
+  Impure functions are never folded.
+- Identities that cannot change a result are removed: ``x * 1``, ``1 * x``,
+  ``x / 1``, ``x - 0``, ``x + 0``, ``0 + x`` and ``- -x``. The only visible
+  difference is that ``-0.0 + 0`` keeps the sign of the zero.
+- Identical subexpressions are shared (hash-consing), and the number of uses
+  of every node is counted so that the assembler can compute a shared
+  subexpression once and reuse its value. Calls of impure functions are
+  never shared, so each call happens.
+"""
+
+import operator
+
+# Exceptions that make constant folding give up and leave the operation for
+# evaluation time, so that it raises there as it would without folding.
+# TypeError comes from operands that are not real numbers, such as the
+# complex result of a registered function.
+_FOLDING_ERRORS = (ArithmeticError, ValueError, TypeError)
+
+
+class Constant:
+    """A constant value."""
+
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+
+class Variable:
+    """A named variable."""
+
+    __slots__ = ('name',)
+
+    def __init__(self, name: str):
+        self.name = name
+
+
+class UnaryOp:
+    """An operation on one operand."""
+
+    __slots__ = ('func', 'operand')
+
+    def __init__(self, func, operand):
+        self.func = func
+        self.operand = operand
+
+
+class BinaryOp:
+    """An operation on two operands."""
+
+    __slots__ = ('func', 'left', 'right')
+
+    def __init__(self, func, left, right):
+        self.func = func
+        self.left = left
+        self.right = right
+
+
+class Call:
+    """A function call with any number of operands other than one or two."""
+
+    __slots__ = ('func', 'operands')
+
+    def __init__(self, func, operands: tuple):
+        self.func = func
+        self.operands = operands
+
+
+def _is_constant(node, value) -> bool:
+    return type(node) is Constant and node.value == value
+
+
+class GraphBuilder:
+    """Builds an optimized expression graph bottom-up.
+
+    Nodes are created through the builder methods, children first, as when
+    reading an RPN program. Each method returns the node to use in place of
+    the requested operation, which may be a folded constant, one of the
+    operands, or an existing identical node.
+
+    Attributes:
+        uses: The number of times each node is used as an operand, by node id.
+        variables: Slot numbers by variable name, in order of first use.
+    """
+
+    def __init__(self, optimize: bool = True):
+        """Initialize the builder.
+
+        Args:
+            optimize: Whether to fold constants, remove identities and share
+                identical subexpressions. Without it the graph is a plain
+                tree that mirrors the expression.
+        """
+        self.optimize = optimize
+        self.uses = {}
+        self.variables = {}
+        self._nodes = {}
+
+    def constant(self, value) -> Constant:
+        """Return a constant node.
+
+        Args:
+            value: The constant value.
+
+        Returns:
+            The node.
+        """
+        return self._intern(
+            ('constant', type(value), repr(value)), lambda: Constant(value), ()
+        )
+
+    def variable(self, name: str) -> Variable:
+        """Return a variable node.
+
+        Args:
+            name: The variable name.
+
+        Returns:
+            The node.
+        """
+        self.variables.setdefault(name, len(self.variables))
+        return self._intern(('variable', name), lambda: Variable(name), ())
+
+    def unary(self, func, operand, pure: bool = True):
+        """Return the node for a unary operation.
+
+        Args:
+            func: The operation.
+            operand: The operand node.
+            pure: Whether the operation may be folded and shared.
+
+        Returns:
+            The node.
+        """
+        if not pure:
+            return self._intern(None, lambda: UnaryOp(func, operand), (operand,))
+        if self.optimize:
+            if type(operand) is Constant:
+                folded = self._fold(func, operand.value)
+                if folded is not None:
+                    return folded
+            if (
+                func is operator.neg
+                and type(operand) is UnaryOp
+                and operand.func is operator.neg
+            ):
+                return operand.operand
+        return self._intern(
+            ('unary', func, id(operand)), lambda: UnaryOp(func, operand), (operand,)
+        )
+
+    def binary(self, func, left, right, pure: bool = True):
+        """Return the node for a binary operation.
+
+        Args:
+            func: The operation.
+            left: The left operand node.
+            right: The right operand node.
+            pure: Whether the operation may be folded and shared.
+
+        Returns:
+            The node.
+        """
+        if not pure:
+            return self._intern(
+                None, lambda: BinaryOp(func, left, right), (left, right)
+            )
+        if self.optimize:
+            if type(left) is Constant and type(right) is Constant:
+                folded = self._fold(func, left.value, right.value)
+                if folded is not None:
+                    return folded
+            identity = self._identity(func, left, right)
+            if identity is not None:
+                return identity
+        return self._intern(
+            ('binary', func, id(left), id(right)),
+            lambda: BinaryOp(func, left, right),
+            (left, right),
+        )
+
+    def call(self, func, operands: tuple, pure: bool = True):
+        """Return the node for a function call.
+
+        Calls with one or two operands become unary and binary operation
+        nodes, so they are optimized the same way.
+
+        Args:
+            func: The function.
+            operands: The argument nodes.
+            pure: Whether the call may be folded and shared.
+
+        Returns:
+            The node.
+        """
+        if len(operands) == 1:
+            return self.unary(func, operands[0], pure)
+        if len(operands) == 2:
+            return self.binary(func, operands[0], operands[1], pure)
+        if not pure:
+            return self._intern(None, lambda: Call(func, operands), operands)
+        if self.optimize and all(type(node) is Constant for node in operands):
+            folded = self._fold(func, *(node.value for node in operands))
+            if folded is not None:
+                return folded
+        return self._intern(
+            ('call', func, *map(id, operands)),
+            lambda: Call(func, operands),
+            operands,
+        )
+
+    def _fold(self, func, *values):
+        """Compute an operation on constants at compile time.
+
+        Args:
+            func: The operation.
+            *values: The constant operands.
+
+        Returns:
+            The constant node, or None if the operation raised.
+        """
+        try:
+            return self.constant(func(*values))
+        except _FOLDING_ERRORS:
+            return None
+
+    @staticmethod
+    def _identity(func, left, right):
+        """Return the operand an identity operation reduces to, if any.
+
+        Args:
+            func: The operation.
+            left: The left operand node.
+            right: The right operand node.
+
+        Returns:
+            The operand node the operation reduces to, or None.
+        """
+        if func is operator.mul:
+            if _is_constant(right, 1):
+                return left
+            if _is_constant(left, 1):
+                return right
+        elif func is operator.truediv:
+            if _is_constant(right, 1):
+                return left
+        elif func is operator.add:
+            if _is_constant(right, 0):
+                return left
+            if _is_constant(left, 0):
+                return right
+        elif func is operator.sub:
+            if _is_constant(right, 0):
+                return left
+        return None
+
+    def _intern(self, key: tuple, factory, children: tuple):
+        """Return the node for key, creating it if needed.
+
+        Children are only counted as used when a new node is created, so a
+        shared subexpression's own operands are counted once.
+
+        Args:
+            key: The structural key of the node; children appear by id,
+                which is structural because they are interned too. None
+                creates a node that is never shared.
+            factory: Creates the node.
+            children: The operand nodes.
+
+        Returns:
+            The node.
+        """
+        share = self.optimize and key is not None
+        if share:
+            node = self._nodes.get(key)
+            if node is not None:
+                return node
+        node = factory()
+        if share:
+            self._nodes[key] = node
+        for child in children:
+            self.uses[id(child)] = self.uses.get(id(child), 0) + 1
+        return node
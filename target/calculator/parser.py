@@ -3,21 +3,721 @@
 This module handles parsing of calculator expressions.
 """
 
-import operator
-import re
+import sys
+
+from calculator import metrics as _metrics
+from calculator.cache import ConcurrentCache, LRUCache
+from calculator.optimizer import BinaryOp, Call, Constant, GraphBuilder, Variable
+from calculator.registry import Registry, default_registry
+from calculator.tokenizer import (
+    COMMA,
+    FUNCTION,
+    LPAREN,
+    NAME,
+    NEGATE,
+    NUMBER,
+    OPERATOR,
+    POSTFIX,
+    RPAREN,
+    ExpressionSyntaxError,
+    Token,
+    tokenize,
+)
+
+# Instruction opcodes of a compiled RPN program.
+_PUSH = 0
+_LOAD = 1
+_UNARY = 2
+_BINARY = 3
+_STORE = 4
+_CALL = 5
+
+# Instructions and variable tuples shared by all compiled expressions, so
+# that a large cache stores each distinct one once. The table is bounded;
+# once it is full, new values are simply not shared.
+_MAX_SHARED = 1 << 16
+_shared = {}
+
+# Kind of the RPN entries for function calls, whose value is the registered
+# function and the number of arguments.
+_CALL_KIND = 'call'
+
+_OPCODE_NAMES = {
+    _PUSH: 'PUSH',
+    _LOAD: 'LOAD',
+    _UNARY: 'UNARY',
+    _BINARY: 'BINARY',
+    _STORE: 'STORE',
+    _CALL: 'CALL',
+}
+
+# Names of the bounds a Limits instance holds.
+_LIMITS = ('max_length', 'max_tokens', 'max_depth', 'max_stack', 'max_steps')
+
+# The ASCII whitespace str.split() splits on, other than the space.
+_ASCII_WHITESPACE = ('\t', '\n', '\v', '\f', '\r', '\x1c', '\x1d', '\x1e', '\x1f')
+
+
+class LimitExceededError(ExpressionSyntaxError):
+    """An expression exceeds one of a parser's limits.
+
+    Its code is ``'limit_exceeded'``, and its position that of the first
+    token over the token or depth limit.
+
+    Attributes:
+        limit: The name of the limit exceeded, one of the attributes of
+            Limits, such as ``'max_depth'``.
+        maximum: The value of that limit.
+    """
+
+    # limit and maximum default to None so that the error can be unpickled,
+    # which calls the class with the message alone, in worker processes.
+    def __init__(self, message: str, limit=None, maximum=None, position=None):
+        super().__init__(message, 'limit_exceeded', position)
+        self.limit = limit
+        self.maximum = maximum
+
+
+class CompiledExpression:
+    """A parsed expression that can be evaluated repeatedly.
+
+    The expression is stored as a flat RPN program of ``(opcode, argument)``
+    pairs whose operators are already resolved to callables and whose
+    variables are already resolved to slot indices, so evaluating it does no
+    tokenizing, precedence handling or name lookups. Shared subexpressions
+    are computed once, stored in a temporary slot after the variables and
+    loaded from there when used again. The program is checked once, when
+    the instance is created, and its maximum stack depth recorded, so the
+    evaluation loop runs on a preallocated stack without bounds checks.
+
+    Instances are immutable and may be shared freely. To keep large caches
+    small, identical instructions and variable tuples are shared between
+    instances and variable names are interned; sizeof() reports the memory
+    an instance uses.
+
+    Attributes:
+        source: The normalized expression text the program was compiled from.
+        variables: The variable names, in slot order.
+    """
+
+    __slots__ = ('source', 'variables', '_program', '_temps', '_stack_size')
+
+    # Converts the value left on the stack to the result.
+    _result = float
+
+    def __init__(
+        self, source: str, program: tuple, variables: tuple = (), temps: int = 0
+    ):
+        """Initialize the compiled expression.
+
+        Args:
+            source: The expression text the program was compiled from.
+            program: The RPN program.
+            variables: The variable names referenced by the program's load
+                instructions, in slot order.
+            temps: The number of temporary slots the program stores shared
+                subexpressions in.
+
+        Raises:
+            ValueError: If the program would underflow the stack, leave
+                other than one result, or use a slot out of range.
+        """
+        stack_size = _stack_size(program, len(variables) + temps)
+        object.__setattr__(self, 'source', source)
+        object.__setattr__(self, 'variables', _share(variables, variables))
+        object.__setattr__(
+            self,
+            '_program',
+            tuple([_share(instruction, _key(instruction)) for instruction in program]),
+        )
+        object.__setattr__(self, '_temps', temps)
+        object.__setattr__(self, '_stack_size', stack_size)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("CompiledExpression is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("CompiledExpression is immutable")
+
+    def __repr__(self):
+        return f"CompiledExpression({self.source!r})"
+
+    def evaluate(self, *args, **kwargs) -> float:
+        """Evaluate the compiled expression.
+
+        Variables can be given positionally, in the order of ``variables``,
+        or by name. Keyword arguments that the expression does not use are
+        ignored, so a whole record can be passed with ``**row``.
+
+        Args:
+            *args: Variable values in slot order.
+            **kwargs: Variable values by name.
+
+        Returns:
+            The result of the expression.
+
+        Raises:
+            NameError: If a variable has no value.
+            TypeError: If too many positional values are given.
+            ZeroDivisionError: If division by zero occurs.
+        """
+        values = self._bind_values(args, kwargs)
+        if self._temps:
+            values = list(values) + [None] * self._temps
+        stack = [None] * self._stack_size
+        top = -1
+
+        for opcode, argument in self._program:
+            if opcode == _PUSH:
+                top += 1
+                stack[top] = argument
+            elif opcode == _LOAD:
+                top += 1
+                stack[top] = values[argument]
+            elif opcode == _BINARY:
+                top -= 1
+                stack[top] = argument(stack[top], stack[top + 1])
+            elif opcode == _UNARY:
+                stack[top] = argument(stack[top])
+            elif opcode == _STORE:
+                values[argument] = stack[top]
+            else:
+                func, count = argument
+                top -= count - 1
+                stack[top] = func(*stack[top:top + count])
+
+        return self._result(stack[0])
+
+    def evaluate_batch(self, **columns):
+        """Evaluate the expression over whole columns of values with NumPy.
+
+        Each instruction runs once over entire arrays rather than once per
+        row. Requires the optional NumPy dependency.
+
+        Args:
+            **columns: Arrays, or buffer-protocol sequences, of values by
+                variable name. All columns must have the same length.
+
+        Returns:
+            A float64 NumPy array with one result per row.
+
+        Raises:
+            ImportError: If NumPy is not installed.
+            NameError: If a variable has no column.
+            ZeroDivisionError: If division by zero occurs in any row; the
+                exception's ``rows`` attribute lists the offending rows.
+        """
+        from calculator import vectorized
+
+        return vectorized.evaluate(self, columns)
+
+    def to_function(self):
+        """Generate a Python function that evaluates the expression.
+
+        The function runs as native Python bytecode, which is several times
+        faster per call than evaluate(). See ``calculator.codegen``.
+
+        Returns:
+            A function taking the variables positionally or by name and
+            returning the result as a float.
+        """
+        from calculator import codegen
+
+        return codegen.to_function(self)
+
+    def bind(self, **values) -> 'CompiledExpression':
+        """Fix some variables to constant values.
+
+        Args:
+            **values: Values for some or all of the variables. Names the
+                expression does not use are ignored.
+
+        Returns:
+            A compiled expression over the remaining variables.
+        """
+        count = len(self.variables)
+        variables = tuple(name for name in self.variables if name not in values)
+        slots = {name: slot for slot, name in enumerate(variables)}
+        shift = count - len(variables)
+
+        program = []
+        for opcode, argument in self._program:
+            if opcode == _LOAD and argument < count:
+                name = self.variables[argument]
+                if name in values:
+                    program.append((_PUSH, values[name]))
+                else:
+                    program.append((_LOAD, slots[name]))
+            elif opcode == _LOAD or opcode == _STORE:
+                program.append((opcode, argument - shift))
+            else:
+                program.append((opcode, argument))
+
+        return CompiledExpression(
+            self.source, tuple(program), variables, self._temps
+        )
+
+    def sizeof(self) -> dict:
+        """Report the memory used by the compiled expression.
+
+        Objects shared with other compiled expressions, such as common
+        instructions and interned variable names, are reported separately
+        from those owned by this one. Callables are not counted; they belong
+        to the registry.
+
+        Returns:
+            A dictionary of sizes in bytes: ``object``, ``source``,
+            ``variables``, ``program`` and ``constants`` for the objects this
+            expression owns, their ``total``, and ``shared`` for the objects
+            it references but shares.
+        """
+        owned = ('object', 'source', 'variables', 'program', 'constants')
+        report = dict.fromkeys(owned + ('shared',), 0)
+        report['object'] = sys.getsizeof(self)
+        report['source'] = sys.getsizeof(self.source)
+
+        # Variable names are always interned by the tokenizer.
+        report['shared'] += sum(sys.getsizeof(name) for name in self.variables)
+        if _is_shared(self.variables, self.variables):
+            report['shared'] += sys.getsizeof(self.variables)
+        else:
+            report['variables'] = sys.getsizeof(self.variables)
+
+        report['program'] = sys.getsizeof(self._program)
+        for instruction in self._program:
+            opcode, argument = instruction
+            size = sys.getsizeof(instruction)
+            if opcode in (_PUSH, _CALL):
+                size += sys.getsizeof(argument)
+            if _is_shared(instruction, _key(instruction)):
+                report['shared'] += size
+            elif opcode == _PUSH:
+                report['program'] += size - sys.getsizeof(argument)
+                report['constants'] += sys.getsizeof(argument)
+            else:
+                report['program'] += size
+
+        report['total'] = sum(report[key] for key in owned)
+        return report
+
+    def disassemble(self) -> list:
+        """Describe the program, one instruction per line.
+
+        Returns:
+            A list of strings such as ``'PUSH 2.0'``, ``'LOAD x'``,
+            ``'BINARY mul'`` or ``'CALL clamp/3'``. Temporary slots are
+            shown as ``$0``, ``$1``...
+        """
+        count = len(self.variables)
+        lines = []
+        for opcode, argument in self._program:
+            if opcode == _PUSH:
+                operand = repr(argument)
+            elif opcode == _LOAD and argument < count:
+                operand = self.variables[argument]
+            elif opcode == _LOAD or opcode == _STORE:
+                operand = f"${argument - count}"
+            elif opcode == _CALL:
+                operand = f"{argument[0].__name__}/{argument[1]}"
+            else:
+                operand = argument.__name__
+            lines.append(f"{_OPCODE_NAMES[opcode]} {operand}")
+        return lines
+
+    def _bind_values(self, args: tuple, kwargs: dict):
+        """Arrange evaluation arguments in slot order.
+
+        Args:
+            args: Positional values in slot order.
+            kwargs: Values by name.
+
+        Returns:
+            A sequence of values indexed by slot.
+
+        Raises:
+            NameError: If a variable has no value.
+            TypeError: If too many positional values are given.
+        """
+        variables = self.variables
+        if len(args) > len(variables):
+            raise TypeError(
+                f"expected at most {len(variables)} values, got {len(args)}"
+            )
+        if not kwargs and len(args) == len(variables):
+            return args
+
+        values = list(args)
+        for name in variables[len(args):]:
+            try:
+                values.append(kwargs[name])
+            except KeyError:
+                raise NameError(f"undefined variable: {name}") from None
+        return values
+
+
+class ExactExpression(CompiledExpression):
+    """A compiled expression that computes with exact numbers.
+
+    Parsers with an exact numeric backend compile expressions to these.
+    Variable values are converted to the backend's number type when the
+    expression is evaluated, and the result is of that type.
+
+    Attributes:
+        numeric: The ``calculator.numeric.NumericBackend`` the expression
+            was compiled for.
+    """
+
+    __slots__ = ('numeric',)
+
+    def __init__(
+        self,
+        numeric,
+        source: str,
+        program: tuple,
+        variables: tuple = (),
+        temps: int = 0,
+    ):
+        """Initialize the compiled expression.
+
+        Args:
+            numeric: The numeric backend the program was compiled for.
+            source: The expression text the program was compiled from.
+            program: The RPN program.
+            variables: The variable names, in slot order.
+            temps: The number of temporary slots.
+
+        Raises:
+            ValueError: If the program is invalid.
+        """
+        super().__init__(source, program, variables, temps)
+        object.__setattr__(self, 'numeric', numeric)
+
+    def __repr__(self):
+        return f"ExactExpression({self.source!r}, numeric={self.numeric.name!r})"
+
+    def evaluate(self, *args, **kwargs):
+        """Evaluate the compiled expression.
+
+        Args:
+            *args: Variable values in slot order.
+            **kwargs: Variable values by name.
+
+        Returns:
+            The result, of the backend's number type.
+
+        Raises:
+            NameError: If a variable has no value.
+            TypeError: If too many positional values are given, or a value
+                cannot be converted to the backend's number type.
+            ZeroDivisionError: If division by zero occurs.
+        """
+        coerce = self.numeric.coerce
+        return super().evaluate(
+            *[coerce(value) for value in self._bind_values(args, kwargs)]
+        )
+
+    def evaluate_batch(self, **columns):
+        """Not supported: NumPy columns hold floats.
+
+        Raises:
+            TypeError: Always.
+        """
+        raise TypeError(
+            f"{self.numeric.name} expressions cannot be evaluated over columns"
+        )
+
+    def to_function(self):
+        """Not supported: generated functions compute with floats.
+
+        Raises:
+            TypeError: Always.
+        """
+        raise TypeError(
+            f"{self.numeric.name} expressions cannot be turned into functions"
+        )
+
+    def bind(self, **values) -> 'ExactExpression':
+        """Fix some variables to constant values.
+
+        Args:
+            **values: Values for some or all of the variables.
+
+        Returns:
+            A compiled expression over the remaining variables.
+        """
+        coerce = self.numeric.coerce
+        bound = super().bind(
+            **{name: coerce(value) for name, value in values.items()}
+        )
+        return ExactExpression(
+            self.numeric, bound.source, bound._program, bound.variables, bound._temps
+        )
+
+    def _result(self, value):
+        return self.numeric.coerce(value)
+
+
+class Limits:
+    """Bounds on the expressions a parser accepts.
+
+    Each bound is None for no limit. The length is checked before anything
+    else is done with the text, so an oversized expression is rejected
+    without being copied. Tokens and nesting depth are counted as the
+    tokenizer produces tokens, so parsing stops at the first token over a
+    limit rather than after tokenizing the whole expression. The stack
+    depth and the number of steps are properties of the compiled program,
+    which has no loops: evaluating it takes one step per instruction. They
+    are checked when an expression is compiled or found in the cache, so
+    no evaluation is ever started that would exceed them.
+
+    Attributes:
+        max_length: The most characters an expression may have.
+        max_tokens: The most tokens an expression may have.
+        max_depth: The deepest parentheses may nest, counting function
+            call parentheses.
+        max_stack: The most values evaluation may keep on its stack.
+        max_steps: The most instructions evaluation may run.
+    """
+
+    __slots__ = _LIMITS
+
+    def __init__(
+        self,
+        max_length: int | None = None,
+        max_tokens: int | None = None,
+        max_depth: int | None = None,
+        max_stack: int | None = None,
+        max_steps: int | None = None,
+    ):
+        """Initialize the limits.
+
+        Args:
+            max_length: The most characters an expression may have.
+            max_tokens: The most tokens an expression may have.
+            max_depth: The deepest parentheses may nest.
+            max_stack: The most values evaluation may keep on its stack.
+            max_steps: The most instructions evaluation may run.
+
+        Raises:
+            ValueError: If a limit is less than 1.
+        """
+        for name, value in zip(
+            _LIMITS, (max_length, max_tokens, max_depth, max_stack, max_steps)
+        ):
+            if value is not None and value < 1:
+                raise ValueError(f"{name} must be at least 1")
+            setattr(self, name, value)
+
+    def __repr__(self):
+        bounds = ', '.join(
+            f"{name}={getattr(self, name)}"
+            for name in _LIMITS
+            if getattr(self, name) is not None
+        )
+        return f"Limits({bounds})"
+
+    def check_length(self, expression: str):
+        """Check the length of an expression's text.
+
+        Raises:
+            LimitExceededError: If the expression is too long.
+        """
+        if self.max_length is not None and len(expression) > self.max_length:
+            raise LimitExceededError(
+                f"expression too long: {len(expression)} characters, "
+                f"limit {self.max_length}",
+                'max_length',
+                self.max_length,
+            )
+
+    def normalize(self, expression: str) -> str:
+        """Return the normalized text of an expression.
+
+        Normalizing splits the text at whitespace, which for a long text of
+        short pieces takes many times its memory. Text that is already
+        normalized is returned as it is, and its tokens are checked as it
+        is compiled; other text is checked for the token and depth limits
+        first, by tokenizing it keeping no tokens. Only the part of the
+        text before an error is normalized, to report its position in the
+        normalized text.
+
+        Returns:
+            The text with runs of whitespace collapsed into one space and
+            no whitespace at either end.
+
+        Raises:
+            LimitExceededError: If the expression has too many tokens or
+                is nested too deep.
+            ExpressionSyntaxError: If the expression is malformed before
+                reaching a limit.
+        """
+        if _is_normalized(expression):
+            return expression
+        if self.max_tokens is None and self.max_depth is None:
+            return ' '.join(expression.split())
+        try:
+            # Numbers are kept as text: only the tokens matter here.
+            for _ in self._checked(tokenize(expression, str)):
+                pass
+        except ExpressionSyntaxError as e:
+            position = e.position
+            head = ' '.join(expression[:position].split())
+            if head and expression[position - 1].isspace():
+                head += ' '
+            for _ in self._checked(tokenize(head + expression[position:], str)):
+                pass
+            raise
+        return ' '.join(expression.split())
+
+    def tokens(self, tokens):
+        """Check tokens for the token and depth limits as they are consumed.
+
+        Args:
+            tokens: An iterable of tokens, usually a tokenize() generator.
+
+        Returns:
+            An iterator over the same tokens that raises LimitExceededError
+            at the first token over a limit.
+        """
+        if self.max_tokens is None and self.max_depth is None:
+            return tokens
+        return self._checked(tokens)
+
+    def _checked(self, tokens):
+        """Yield tokens, raising at the first one over a limit."""
+        max_tokens = self.max_tokens
+        max_depth = self.max_depth
+        count = depth = 0
+        for token in tokens:
+            count += 1
+            if max_tokens is not None and count > max_tokens:
+                raise LimitExceededError(
+                    f"too many tokens: limit {max_tokens} "
+                    f"reached at position {token.offset}",
+                    'max_tokens',
+                    max_tokens,
+                    token.offset,
+                )
+            kind = token.kind
+            if kind == LPAREN:
+                depth += 1
+                if max_depth is not None and depth > max_depth:
+                    raise LimitExceededError(
+                        f"nesting too deep: limit {max_depth} "
+                        f"reached at position {token.offset}",
+                        'max_depth',
+                        max_depth,
+                        token.offset,
+                    )
+            elif kind == RPAREN:
+                depth -= 1
+            yield token
+
+    def check_program(self, compiled: CompiledExpression):
+        """Check the stack depth and step count of a compiled expression.
+
+        Raises:
+            LimitExceededError: If evaluating the expression would need a
+                deeper stack or more steps than allowed.
+        """
+        if self.max_stack is not None and compiled._stack_size > self.max_stack:
+            raise LimitExceededError(
+                f"expression needs a stack of {compiled._stack_size} values, "
+                f"limit {self.max_stack}",
+                'max_stack',
+                self.max_stack,
+            )
+        steps = len(compiled._program)
+        if self.max_steps is not None and steps > self.max_steps:
+            raise LimitExceededError(
+                f"expression takes {steps} steps to evaluate, "
+                f"limit {self.max_steps}",
+                'max_steps',
+                self.max_steps,
+            )
 
 
 class Parser:
-    """Expression parser for calculator."""
+    """Expression parser for calculator.
+
+    The operators, functions and constants an expression may use come from
+    a registry. With the default registry, expressions may use ``+ - * /``,
+    ``%`` (modulo), ``^`` or ``**`` (exponent, right-associative and binding
+    tighter than negation), postfix ``!`` (factorial), the constants ``pi``
+    and ``e``, and the functions of ``calculator.operations``, such as
+    ``sqrt(x)`` or ``log(x, 2)``. Function names are resolved to callables
+    at compile time, so evaluation does no name lookups.
+
+    A parser keeps no state between calls, so one instance may be shared
+    by any number of threads, provided its cache is thread-safe, as the
+    registries' caches are, and its registry is not changed meanwhile.
 
-    def __init__(self):
-        """Initialize the parser."""
-        self.operators = {
-            '+': (1, operator.add),
-            '-': (1, operator.sub),
-            '*': (2, operator.mul),
-            '/': (2, operator.truediv),
-        }
+    Expressions compute with floats unless the parser is given an exact
+    numeric backend; see ``calculator.numeric``.
+
+    Parsers accept expressions of any size unless given Limits, which
+    processes taking expressions from untrusted sources should set so that
+    one pathological expression cannot exhaust their memory. Expressions
+    over a limit raise LimitExceededError.
+    """
+
+    def __init__(
+        self,
+        cache: LRUCache | ConcurrentCache | None = None,
+        optimize: bool = True,
+        registry: Registry | None = None,
+        numeric=None,
+        limits: Limits | None = None,
+    ):
+        """Initialize the parser.
+
+        Args:
+            cache: Optional cache of compiled expressions keyed by their
+                normalized text. Without one, every call compiles afresh.
+                Parsers sharing a registry should use its ``cache``, which
+                the registry clears whenever it changes. A cache no
+                registry owns may be shared by parsers with any registries;
+                its keys then name the registry and its version. An
+                LRUCache must not be shared between threads; a
+                ConcurrentCache may.
+            optimize: Whether compiled programs fold constants, drop identity
+                operations and compute shared subexpressions once.
+            registry: The operators, functions and constants expressions may
+                use. Defaults to the frozen registry of built-ins.
+            numeric: The numbers expressions compute with: ``'float'``,
+                ``'decimal'``, ``'fraction'``, a ``decimal.Context`` for
+                decimals rounded to it, or a NumericBackend. Defaults to
+                floats. Parsers for different backends may share a cache.
+            limits: Bounds on the expressions accepted. Defaults to none.
+                The token and depth limits bound the work of parsing.
+                They are checked as the text is tokenized, before it is
+                normalized, so an expression over them costs no more
+                memory than one at them. Expressions found in the cache,
+                which another parser sharing it may have compiled, may
+                skip them.
+
+        Raises:
+            ValueError: If the numeric backend is unknown, or the cache
+                belongs to another registry.
+        """
+        self.cache = cache
+        self.optimize = optimize
+        self.registry = default_registry if registry is None else registry
+        self.limits = limits
+        owner = getattr(cache, 'registry', None)
+        if owner is not None and owner is not self.registry:
+            raise ValueError("the cache belongs to another registry")
+        # Whether the cache may hold expressions of other registries, or of
+        # this one before it changed, so that keys must name the registry.
+        self._foreign_cache = cache is not None and owner is None
+        if numeric is None or numeric == 'float':
+            self.numeric = None
+        else:
+            # Imported here: decimal and fractions are slow to import, and
+            # most parsers use floats.
+            from calculator import numeric as _numeric
+
+            self.numeric = _numeric.backend(numeric)
 
     def parse(self, expression: str) -> float:
         """Parse and evaluate a mathematical expression.
@@ -26,141 +726,678 @@ class Parser:
             expression: The mathematical expression to evaluate.
 
         Returns:
-            The result of the expression.
+            The result of the expression: a float, or a number of the
+            parser's exact numeric type.
 
         Raises:
-            SyntaxError: If the expression is malformed.
+            SyntaxError: If the expression is malformed, or a function's
+                domain is violated, as in ``sqrt(-1)``.
+            LimitExceededError: If the expression exceeds the parser's
+                limits.
             ZeroDivisionError: If division by zero occurs.
         """
-        if not expression or not expression.strip():
-            raise SyntaxError("empty expression")
+        if _metrics.enabled:
+            return self._parse_instrumented(expression)
 
-        expression = expression.strip()
+        # isspace() rather than strip(), which would copy the text before
+        # its length is checked.
+        if not expression or expression.isspace():
+            raise SyntaxError("empty expression")
 
         try:
-            result = self._evaluate(expression)
-            return float(result)
-        except ZeroDivisionError:
+            return self.compile(expression).evaluate()
+        except (ZeroDivisionError, LimitExceededError):
             raise
         except Exception as e:
             raise SyntaxError(f"invalid expression: {e}")
 
-    def _evaluate(self, expression: str) -> float:
-        """Evaluate an expression using the shunting yard algorithm.
+    def compile(self, expression: str) -> CompiledExpression:
+        """Compile an expression into a reusable RPN program.
+
+        Tokenizing, the shunting yard algorithm and optimization run once
+        here; the returned object can then be evaluated any number of times.
+        If the parser has a cache, expressions that differ only in whitespace
+        share one compiled program.
+
+        Args:
+            expression: The mathematical expression to compile.
+
+        Returns:
+            The compiled expression.
+
+        Raises:
+            SyntaxError: If the expression is empty.
+            ExpressionSyntaxError: If the expression is malformed.
+            LimitExceededError: If the expression exceeds the parser's
+                limits.
+        """
+        if _metrics.enabled:
+            try:
+                return self._compile_instrumented(expression)
+            except Exception as e:
+                _metrics.record_error(e)
+                raise
+
+        limits = self.limits
+        if limits is not None:
+            limits.check_length(expression)
+        if not expression or expression.isspace():
+            raise SyntaxError("empty expression")
+
+        if limits is not None:
+            source = limits.normalize(expression)
+        else:
+            source = ' '.join(expression.split())
+        if self.numeric is not None:
+            return self._compile_exact(source)
+
+        cache = self.cache
+        if cache is not None:
+            key = self.registry.key + source if self._foreign_cache else source
+            compiled = cache.get(key)
+            if compiled is not None:
+                if limits is not None:
+                    limits.check_program(compiled)
+                return compiled
+
+        tokens = tokenize(source)
+        if limits is not None:
+            tokens = limits.tokens(tokens)
+        builder = GraphBuilder(self.optimize)
+        root = self._build(self._to_rpn(tokens), builder)
+        compiled = CompiledExpression(source, *self._assemble(root, builder))
+        if limits is not None:
+            limits.check_program(compiled)
+
+        if cache is not None:
+            cache.put(key, compiled)
+        return compiled
+
+    def _compile_exact(self, source: str) -> 'ExactExpression':
+        """Run compile() for the parser's exact numeric backend."""
+        numeric = self.numeric
+        limits = self.limits
+        key = numeric.key + self._key_prefix() + source
+        if self.cache is not None:
+            compiled = self.cache.get(key)
+            if compiled is not None:
+                if limits is not None:
+                    limits.check_program(compiled)
+                return compiled
+
+        tokens = tokenize(source, numeric.number)
+        if limits is not None:
+            tokens = limits.tokens(tokens)
+        builder = GraphBuilder(self.optimize)
+        root = self._build(self._to_rpn(tokens), builder)
+        compiled = ExactExpression(numeric, source, *self._assemble(root, builder))
+        if limits is not None:
+            limits.check_program(compiled)
+
+        if self.cache is not None:
+            self.cache.put(key, compiled)
+        return compiled
+
+    def _key_prefix(self) -> str:
+        """Return the prefix of this parser's keys in its cache."""
+        return self.registry.key if self._foreign_cache else ''
+
+    def _parse_instrumented(self, expression: str) -> float:
+        """Run parse(), recording phase latencies and errors in metrics."""
+        try:
+            compiled = self._compile_instrumented(expression)
+            start = _metrics.clock()
+            try:
+                return compiled.evaluate()
+            finally:
+                _metrics.record('evaluate', _metrics.clock() - start)
+        except Exception as e:
+            _metrics.record_error(e)
+            error = _parse_error(e, expression)
+            if error is e:
+                raise
+            raise error
+
+    def _compile_instrumented(self, expression: str) -> CompiledExpression:
+        """Run compile(), recording phase latencies in metrics.
+
+        Tokens are collected into a list before the shunting yard runs, so
+        the two phases are timed separately.
+        """
+        limits = self.limits
+        if limits is not None:
+            limits.check_length(expression)
+        if not expression or expression.isspace():
+            raise SyntaxError("empty expression")
+
+        clock = _metrics.clock
+        record = _metrics.record
+        if limits is not None:
+            source = limits.normalize(expression)
+        else:
+            source = ' '.join(expression.split())
+        numeric = self.numeric
+        key = self._key_prefix() + source
+        if numeric is not None:
+            key = numeric.key + key
+
+        if self.cache is not None:
+            start = clock()
+            compiled = self.cache.get(key)
+            record('cache', clock() - start)
+            if compiled is not None:
+                if limits is not None:
+                    limits.check_program(compiled)
+                return compiled
+
+        start = clock()
+        try:
+            number = float if numeric is None else numeric.number
+            tokens = tokenize(source, number)
+            if limits is not None:
+                tokens = limits.tokens(tokens)
+            tokens = list(tokens)
+        finally:
+            record('tokenize', clock() - start)
+        start = clock()
+        try:
+            rpn = self._to_rpn(tokens)
+        finally:
+            record('shunting_yard', clock() - start)
+        start = clock()
+        try:
+            builder = GraphBuilder(self.optimize)
+            root = self._build(rpn, builder)
+        finally:
+            record('optimize', clock() - start)
+        start = clock()
+        try:
+            assembled = self._assemble(root, builder)
+            if numeric is None:
+                compiled = CompiledExpression(source, *assembled)
+            else:
+                compiled = ExactExpression(numeric, source, *assembled)
+        finally:
+            record('assemble', clock() - start)
+        if limits is not None:
+            limits.check_program(compiled)
+
+        if self.cache is not None:
+            self.cache.put(key, compiled)
+        return compiled
+
+    def _to_rpn(self, tokens) -> list:
+        """Convert tokens to Reverse Polish Notation (shunting yard algorithm).
+
+        Operands and operators must alternate, which is checked as tokens
+        arrive so that errors point at the offending token. Function names
+        and argument counts are checked here too, and each call becomes a
+        single RPN entry holding the resolved function.
 
         Args:
-            expression: The expression to evaluate.
+            tokens: An iterable of tokens to convert.
 
         Returns:
-            The result of the evaluation.
+            The number, name, operator and call entries in RPN order.
+
+        Raises:
+            SyntaxError: If a token is out of place, parentheses are
+                mismatched, or a function is unknown or given the wrong
+                number of arguments.
         """
+        registry = self.registry
+        operators = registry.operators
         output_queue = []
         operator_stack = []
-
-        tokens = self._tokenize(expression)
+        # Argument counts of the open parentheses, innermost last.
+        arg_counts = []
+        expect_operand = True
+        previous_kind = None
 
         for token in tokens:
-            if self._is_number(token):
-                output_queue.append(float(token))
-            elif token in self.operators:
-                while (
-                    operator_stack
-                    and operator_stack[-1] != '('
-                    and operator_stack[-1] in self.operators
-                    and self.operators[operator_stack[-1]][0]
-                    >= self.operators[token][0]
-                ):
+            kind = token.kind
+            if kind == NUMBER or kind == NAME:
+                if not expect_operand:
+                    raise _unexpected(token)
+                output_queue.append(token)
+                expect_operand = False
+            elif kind == OPERATOR:
+                if expect_operand:
+                    raise _unexpected(token)
+                op = operators.get(token.value)
+                if op is None:
+                    raise _unsupported(token)
+                precedence = op.precedence
+                right = op.right_associative
+                while operator_stack and operator_stack[-1].kind != LPAREN:
+                    top = self._precedence(operator_stack[-1])
+                    if top < precedence or (top == precedence and right):
+                        break
                     output_queue.append(operator_stack.pop())
                 operator_stack.append(token)
-            elif token == '(':
+                expect_operand = True
+            elif kind == POSTFIX:
+                # Postfix operators bind tightest, so they apply directly to
+                # the operand that was just completed.
+                if expect_operand:
+                    raise _unexpected(token)
+                if token.value not in registry.postfix_operators:
+                    raise _unsupported(token)
+                output_queue.append(token)
+            elif kind == NEGATE or kind == LPAREN or kind == FUNCTION:
+                if not expect_operand:
+                    raise _unexpected(token)
+                if kind == NEGATE and token.value not in registry.prefix_operators:
+                    raise _unsupported(token)
+                if kind == FUNCTION and token.value not in registry.functions:
+                    raise ExpressionSyntaxError(
+                        f"unknown function {token.value!r} "
+                        f"at position {token.offset}",
+                        'unknown_function',
+                        token.offset,
+                    )
+                if kind == LPAREN:
+                    arg_counts.append(1)
                 operator_stack.append(token)
-            elif token == ')':
-                while operator_stack and operator_stack[-1] != '(':
+            elif kind == COMMA:
+                if expect_operand:
+                    raise _unexpected(token)
+                while operator_stack and operator_stack[-1].kind != LPAREN:
+                    output_queue.append(operator_stack.pop())
+                if not _in_call(operator_stack):
+                    raise _unexpected(token)
+                arg_counts[-1] += 1
+                expect_operand = True
+            else:
+                if expect_operand:
+                    if previous_kind == LPAREN and _in_call(operator_stack):
+                        # An empty argument list.
+                        arg_counts[-1] = 0
+                    else:
+                        raise _unexpected(token)
+                while operator_stack and operator_stack[-1].kind != LPAREN:
                     output_queue.append(operator_stack.pop())
                 if not operator_stack:
-                    raise SyntaxError("mismatched parentheses")
+                    raise _mismatched(token)
                 operator_stack.pop()
-            else:
-                raise SyntaxError(f"invalid token: {token}")
+                count = arg_counts.pop()
+                if operator_stack and operator_stack[-1].kind == FUNCTION:
+                    output_queue.append(self._call(operator_stack.pop(), count))
+                expect_operand = False
+            previous_kind = kind
+
+        if expect_operand:
+            # The last token is an operator, a comma or a parenthesis, whose
+            # value is its text, so the expression ends right after it.
+            end = token.offset + len(token.value)
+            raise ExpressionSyntaxError("unexpected end of expression", 'syntax', end)
 
         while operator_stack:
-            op = operator_stack.pop()
-            if op in ('(', ')'):
-                raise SyntaxError("mismatched parentheses")
-            output_queue.append(op)
+            token = operator_stack.pop()
+            if token.kind == LPAREN:
+                raise _mismatched(token)
+            output_queue.append(token)
 
-        return self._evaluate_rpn(output_queue)
+        return output_queue
 
-    def _tokenize(self, expression: str) -> list:
-        """Tokenize an expression.
+    def _precedence(self, token: Token) -> int:
+        """Return the precedence of a unary or binary operator token.
 
         Args:
-            expression: The expression to tokenize.
+            token: The operator token.
 
         Returns:
-            A list of tokens.
+            The operator's precedence.
         """
-        pattern = r'(\d+\.?\d*|\+|\-|\*|\/|\(|\))'
-        tokens = re.findall(pattern, expression)
+        if token.kind == NEGATE:
+            return self.registry.prefix_operators[token.value].precedence
+        return self.registry.operators[token.value].precedence
+
+    def _call(self, token: Token, count: int) -> Token:
+        """Resolve a function call to its RPN entry.
+
+        Args:
+            token: The FUNCTION token naming the function.
+            count: The number of arguments passed.
+
+        Returns:
+            A call entry whose value is the registered function and the
+            argument count.
 
-        processed_tokens = []
-        for i, token in enumerate(tokens):
-            if token == '-' and (i == 0 or tokens[i-1] in ('(', '+', '-', '*', '/')):
-                if i + 1 < len(tokens) and self._is_number(tokens[i + 1]):
-                    processed_tokens.append('-' + tokens[i + 1])
-                    tokens[i + 1] = ''
-            elif token:
-                processed_tokens.append(token)
+        Raises:
+            SyntaxError: If the function does not take count arguments.
+        """
+        function = self.registry.functions[token.value]
+        minimum, maximum = function.min_args, function.max_args
+        if count < minimum or (maximum is not None and count > maximum):
+            plural = '' if minimum == 1 else 's'
+            if minimum == maximum:
+                expected = f"{minimum} argument{plural}"
+            elif maximum is None:
+                expected = f"at least {minimum} argument{plural}"
+            else:
+                expected = f"{minimum} to {maximum} arguments"
+            raise ExpressionSyntaxError(
+                f"{token.value}() takes {expected}, got {count} "
+                f"at position {token.offset}",
+                'syntax',
+                token.offset,
+            )
+        return Token(_CALL_KIND, (function, count), token.offset)
 
-        return [t for t in processed_tokens if t]
+    def _build(self, rpn: list, builder: GraphBuilder):
+        """Build the expression graph from a validated RPN token list.
 
-    def _is_number(self, token: str) -> bool:
-        """Check if a token is a number.
+        With an exact numeric backend, constants are converted to its type
+        and operators and functions resolved to its versions of them.
 
         Args:
-            token: The token to check.
+            rpn: The tokens in RPN order, as produced by _to_rpn.
+            builder: The builder that creates and optimizes the nodes.
 
         Returns:
-            True if the token is a number, False otherwise.
+            The root node.
         """
-        try:
-            float(token)
-            return True
-        except ValueError:
-            return False
+        registry = self.registry
+        constants = registry.constants
+        numeric = self.numeric
+        operands = []
+        push = operands.append
+        pop = operands.pop
+
+        for token in rpn:
+            kind = token.kind
+            if kind == NUMBER:
+                push(builder.constant(token.value))
+            elif kind == NAME:
+                if token.value in constants:
+                    value = constants[token.value]
+                    if numeric is not None:
+                        value = numeric.coerce(value)
+                    push(builder.constant(value))
+                else:
+                    push(builder.variable(token.value))
+            elif kind == NEGATE:
+                op_func = registry.prefix_operators[token.value].func
+                if numeric is not None:
+                    op_func = numeric.resolve(op_func)
+                push(builder.unary(op_func, pop()))
+            elif kind == POSTFIX:
+                op_func = registry.postfix_operators[token.value].func
+                if numeric is not None:
+                    op_func = numeric.resolve(op_func)
+                push(builder.unary(op_func, pop()))
+            elif kind == _CALL_KIND:
+                function, count = token.value
+                args = tuple(operands[len(operands) - count:])
+                del operands[len(operands) - count:]
+                func = function.func
+                if numeric is not None:
+                    func = numeric.resolve(func)
+                push(builder.call(func, args, function.pure))
+            else:
+                op_func = registry.operators[token.value].func
+                if numeric is not None:
+                    op_func = numeric.resolve(op_func)
+                right = pop()
+                push(builder.binary(op_func, pop(), right))
+
+        return operands[0]
+
+    def _assemble(self, root, builder: GraphBuilder) -> tuple:
+        """Turn an expression graph into a program.
 
-    def _evaluate_rpn(self, tokens: list) -> float:
-        """Evaluate tokens in Reverse Polish Notation.
+        Nodes are emitted in post-order. A node used more than once is
+        stored in a temporary slot the first time it is computed and loaded
+        from there afterwards. The walk uses an explicit stack, so deeply
+        nested expressions do not hit the recursion limit.
 
         Args:
-            tokens: The tokens to evaluate.
+            root: The root node of the graph.
+            builder: The builder that created the graph.
 
         Returns:
-            The result of the evaluation.
+            A tuple of the program, a tuple of ``(opcode, argument)``
+            instructions, the variable names in slot order and the number of
+            temporary slots.
         """
-        stack = []
+        program = []
+        slots = builder.variables
+        uses = builder.uses
+        temps = {}
+        pending = [(root, False)]
 
-        for token in tokens:
-            if isinstance(token, (int, float)):
-                stack.append(token)
-            elif token in self.operators:
-                if len(stack) < 2:
-                    raise SyntaxError("invalid expression")
-                b = stack.pop()
-                a = stack.pop()
-                _, op_func = self.operators[token]
-                result = op_func(a, b)
-                stack.append(result)
+        while pending:
+            node, ready = pending.pop()
+            node_type = type(node)
+            if node_type is Constant:
+                program.append((_PUSH, node.value))
+            elif node_type is Variable:
+                program.append((_LOAD, slots[node.name]))
+            elif id(node) in temps:
+                program.append((_LOAD, temps[id(node)]))
+            elif not ready:
+                pending.append((node, True))
+                if node_type is BinaryOp:
+                    pending.append((node.right, False))
+                    pending.append((node.left, False))
+                elif node_type is Call:
+                    for operand in reversed(node.operands):
+                        pending.append((operand, False))
+                else:
+                    pending.append((node.operand, False))
+            else:
+                if node_type is BinaryOp:
+                    program.append((_BINARY, node.func))
+                elif node_type is Call:
+                    program.append((_CALL, (node.func, len(node.operands))))
+                else:
+                    program.append((_UNARY, node.func))
+                if uses.get(id(node), 0) > 1:
+                    temps[id(node)] = len(slots) + len(temps)
+                    program.append((_STORE, temps[id(node)]))
 
-        if len(stack) != 1:
-            raise SyntaxError("invalid expression")
+        return tuple(program), tuple(slots), len(temps)
 
-        return stack[0]
+
+def _key(instruction: tuple) -> tuple:
+    """Return the key an instruction is shared under.
+
+    Constants are keyed by type and representation, so that equal but
+    distinguishable values such as ``0.0`` and ``-0.0`` are kept apart.
+
+    Args:
+        instruction: An ``(opcode, argument)`` instruction.
+
+    Returns:
+        The key.
+    """
+    opcode, argument = instruction
+    if opcode == _PUSH:
+        return (opcode, type(argument), repr(argument))
+    return instruction
+
+
+def _share(value, key):
+    """Return the shared object equal to value, sharing value if there is none.
+
+    Args:
+        value: The value to share.
+        key: The key identifying equal values.
+
+    Returns:
+        The shared object, or value itself.
+    """
+    try:
+        shared = _shared.get(key)
+    except TypeError:
+        # Unhashable constants or callables are not shared.
+        return value
+    if shared is None:
+        if len(_shared) >= _MAX_SHARED:
+            return value
+        # setdefault, so that threads sharing equal values at once agree.
+        shared = _shared.setdefault(key, value)
+    return shared
+
+
+def _is_shared(value, key) -> bool:
+    """Return whether value is the shared object for key."""
+    try:
+        return _shared.get(key) is value
+    except TypeError:
+        return False
+
+
+def _stack_size(program: tuple, slots: int) -> int:
+    """Check a program and compute the stack depth it needs.
+
+    Args:
+        program: The ``(opcode, argument)`` instructions.
+        slots: The number of variable and temporary slots.
+
+    Returns:
+        The maximum number of values on the stack during evaluation.
+
+    Raises:
+        ValueError: If an instruction would underflow the stack or use a slot
+            out of range, or the program does not leave exactly one result.
+    """
+    depth = size = 0
+    for index, (opcode, argument) in enumerate(program):
+        if opcode == _PUSH or opcode == _LOAD:
+            needed, produced = 0, 1
+        elif opcode == _UNARY or opcode == _STORE:
+            needed, produced = 1, 1
+        elif opcode == _BINARY:
+            needed, produced = 2, 1
+        elif opcode == _CALL:
+            needed, produced = argument[1], 1
+        else:
+            raise ValueError(f"invalid program: unknown opcode {opcode!r}")
+        if (opcode == _LOAD or opcode == _STORE) and not 0 <= argument < slots:
+            raise ValueError(
+                f"invalid program: slot {argument} out of range at instruction "
+                f"{index}"
+            )
+        if depth < needed:
+            raise ValueError(
+                f"invalid program: stack underflow at instruction {index}"
+            )
+        depth += produced - needed
+        size = max(size, depth)
+    if depth != 1:
+        raise ValueError(
+            f"invalid program: leaves {depth} values on the stack instead of 1"
+        )
+    return size
+
+
+def _unexpected(token: Token) -> SyntaxError:
+    """Build the error for a token that is out of place.
+
+    Args:
+        token: The offending token.
+
+    Returns:
+        The ExpressionSyntaxError to raise.
+    """
+    return ExpressionSyntaxError(
+        f"unexpected {token.value!r} at position {token.offset}", 'syntax', token.offset
+    )
+
+
+def _unsupported(token: Token) -> SyntaxError:
+    """Build the error for an operator the registry does not define.
+
+    Args:
+        token: The operator token.
+
+    Returns:
+        The ExpressionSyntaxError to raise.
+    """
+    return ExpressionSyntaxError(
+        f"unsupported operator {token.value!r} at position {token.offset}",
+        'syntax',
+        token.offset,
+    )
+
+
+def _mismatched(token: Token) -> SyntaxError:
+    """Build the error for a parenthesis without a partner.
+
+    Args:
+        token: The parenthesis token.
+
+    Returns:
+        The ExpressionSyntaxError to raise.
+    """
+    return ExpressionSyntaxError(
+        f"mismatched parentheses at position {token.offset}",
+        'mismatched_parens',
+        token.offset,
+    )
+
+
+def _parse_error(error: Exception, expression: str) -> Exception:
+    """Return the error parse() raises for one compiling or evaluating raised.
+
+    Args:
+        error: The exception raised.
+        expression: The expression text.
+
+    Returns:
+        The error itself for an empty expression, a division by zero or an
+        exceeded limit, otherwise a SyntaxError wording it.
+    """
+    empty = not expression or expression.isspace()
+    if empty or isinstance(error, (ZeroDivisionError, LimitExceededError)):
+        return error
+    return SyntaxError(f"invalid expression: {error}")
+
+
+def _is_normalized(text: str) -> bool:
+    """Return whether a text is its own normalized form.
+
+    Equivalent to ``' '.join(text.split()) == text``, but a few scans of
+    the text rather than a copy of it in pieces.
+    """
+    return (
+        text.isascii()
+        and text[:1] != ' '
+        and text[-1:] != ' '
+        and '  ' not in text
+        and not any(space in text for space in _ASCII_WHITESPACE)
+    )
+
+
+def _in_call(operator_stack: list) -> bool:
+    """Return whether the innermost open parenthesis belongs to a call.
+
+    Args:
+        operator_stack: The shunting yard operator stack, whose top is an
+            opening parenthesis.
+
+    Returns:
+        True if the parenthesis follows a function name.
+    """
+    return len(operator_stack) >= 2 and operator_stack[-2].kind == FUNCTION
+
+
+# Process-wide cache used by parse() and compile(). Its capacity can be
+# changed at runtime and clear() empties it and resets its counters.
+# It belongs to the default registry.
+expression_cache = default_registry.cache
+
+_parser = Parser(cache=expression_cache)
 
 
 def parse(expression: str) -> float:
     """Parse and evaluate a mathematical expression.
 
+    Compiled expressions are kept in ``expression_cache``, so repeated
+    expressions are only parsed once.
+
     Args:
         expression: The mathematical expression to evaluate.
 
@@ -171,8 +1408,24 @@ def parse(expression: str) -> float:
         SyntaxError: If the expression is malformed.
         ZeroDivisionError: If division by zero occurs.
     """
-    parser = Parser()
-    return parser.parse(expression)
+    return _parser.parse(expression)
+
+
+def compile(expression: str) -> CompiledExpression:
+    """Compile a mathematical expression for repeated evaluation.
+
+    The result is shared through ``expression_cache`` with parse().
+
+    Args:
+        expression: The mathematical expression to compile.
+
+    Returns:
+        The compiled expression.
+
+    Raises:
+        SyntaxError: If the expression is malformed.
+    """
+    return _parser.compile(expression)
 
 
 def parse_and_evaluate(expression: str) -> float:
@@ -0,0 +1,310 @@
+"""Calculator profiling module.
+
+This module finds the expressions that are expensive to handle in a batch:
+it times compiling and evaluating each expression, counts its tokens and
+measures how deeply its parentheses nest, and reports the worst offenders
+along with how the total time splits between parsing and evaluation. It
+can also record a function-level profile of the run, as a pstats file or as
+collapsed stacks for flamegraph tools.
+"""
+
+import cProfile
+import heapq
+import itertools
+import os
+import sys
+import time
+from collections import Counter, namedtuple
+
+from calculator.cache import LRUCache
+from calculator.parser import Parser, _parse_error
+from calculator.tokenizer import LPAREN, RPAREN, tokenize
+
+# Formats write_profile() can produce.
+PROFILE_FORMATS = ('pstats', 'collapsed')
+
+# Number of expressions listed in each ranking by default.
+DEFAULT_TOP = 10
+
+# Longest expression text shown in a summary.
+_MAX_SHOWN = 60
+
+
+class ExpressionCost(
+    namedtuple(
+        'ExpressionCost',
+        ('line', 'source', 'tokens', 'depth', 'parse_ns', 'evaluate_ns', 'error'),
+    )
+):
+    """What one expression of a batch cost.
+
+    Attributes:
+        line: The 1-based line number of the expression.
+        source: The expression, without surrounding whitespace.
+        tokens: The number of tokens.
+        depth: The deepest nesting of parentheses.
+        parse_ns: Nanoseconds spent compiling, or finding the compiled
+            expression in the cache.
+        evaluate_ns: Nanoseconds spent evaluating.
+        error: The exception the expression raised, or None.
+    """
+
+    __slots__ = ()
+
+    @property
+    def total_ns(self) -> int:
+        """Nanoseconds spent parsing and evaluating."""
+        return self.parse_ns + self.evaluate_ns
+
+
+class Profiler:
+    """Collects the cost of each expression evaluated through it.
+
+    Only the most expensive expressions of each ranking are kept, so memory
+    use does not grow with the size of the batch.
+
+    Attributes:
+        top: Number of expressions kept in each ranking.
+        count: Number of expressions evaluated.
+        errors: Number of expressions that failed.
+        parse_ns: Total nanoseconds spent parsing.
+        evaluate_ns: Total nanoseconds spent evaluating.
+    """
+
+    def __init__(self, parser: Parser | None = None, top: int = DEFAULT_TOP):
+        """Initialize the profiler.
+
+        Args:
+            parser: The parser to evaluate with. Defaults to a parser with a
+                cache of its own, so repeated expressions are compiled once,
+                as in a batch run.
+            top: Number of expressions kept in each ranking.
+        """
+        self.parser = Parser(cache=LRUCache()) if parser is None else parser
+        self.top = top
+        self.count = 0
+        self.errors = 0
+        self.parse_ns = 0
+        self.evaluate_ns = 0
+        self._order = itertools.count()
+        self._slowest = []
+        self._longest = []
+        self._deepest = []
+
+    def evaluate(self, expressions):
+        """Evaluate expressions, recording what each one costs.
+
+        Args:
+            expressions: An iterable of expression strings, such as a file.
+
+        Yields:
+            The float result of each expression, or the exception it raised,
+            like ``calculator.batch.evaluate_stream``.
+        """
+        parser = self.parser
+        clock = time.perf_counter_ns
+        for line, expression in enumerate(expressions, start=1):
+            start = clock()
+            try:
+                compiled = parser.compile(expression)
+            except Exception as e:
+                compiled = None
+                result = _parse_error(e, expression)
+            middle = end = clock()
+            # Only the evaluation itself is timed: the compiled expression
+            # is kept rather than looked up again through parse(). Errors
+            # are worded as parse() words them, as in batch mode.
+            if compiled is not None:
+                try:
+                    result = compiled.evaluate()
+                except Exception as e:
+                    result = _parse_error(e, expression)
+                end = clock()
+
+            tokens, depth = _shape(expression)
+            self._add(
+                ExpressionCost(
+                    line,
+                    expression.strip(),
+                    tokens,
+                    depth,
+                    middle - start,
+                    end - middle,
+                    result if isinstance(result, BaseException) else None,
+                )
+            )
+            yield result
+
+    def _add(self, cost: ExpressionCost):
+        """Account for one expression and rank it."""
+        self.count += 1
+        self.errors += cost.error is not None
+        self.parse_ns += cost.parse_ns
+        self.evaluate_ns += cost.evaluate_ns
+        order = next(self._order)
+        for ranking, key in (
+            (self._slowest, cost.total_ns),
+            (self._longest, cost.tokens),
+            (self._deepest, cost.depth),
+        ):
+            # Ties keep the earliest line.
+            entry = (key, -order, cost)
+            if len(ranking) < self.top:
+                heapq.heappush(ranking, entry)
+            else:
+                heapq.heappushpop(ranking, entry)
+
+    def report(self) -> dict:
+        """Return the collected costs.
+
+        Returns:
+            A dictionary with the ``count`` of expressions, the number of
+            ``errors``, the total ``parse_ns`` and ``evaluate_ns``, and the
+            ``slowest``, ``most_tokens`` and ``deepest`` expressions as
+            lists of ExpressionCost, worst first.
+        """
+        return {
+            'count': self.count,
+            'errors': self.errors,
+            'parse_ns': self.parse_ns,
+            'evaluate_ns': self.evaluate_ns,
+            'slowest': _ranked(self._slowest),
+            'most_tokens': _ranked(self._longest),
+            'deepest': _ranked(self._deepest),
+        }
+
+    def summary(self) -> str:
+        """Format the collected costs for people.
+
+        Returns:
+            The time split between parsing and evaluation, followed by the
+            slowest expressions, those with the most tokens and the most
+            deeply nested ones.
+        """
+        total = self.parse_ns + self.evaluate_ns
+        share = (lambda ns: ns / total) if total else (lambda ns: 0.0)
+        lines = [
+            f"Profiled {self.count} expressions in {total / 1e6:.3f} ms: "
+            f"parsing {self.parse_ns / 1e6:.3f} ms ({share(self.parse_ns):.0%}), "
+            f"evaluation {self.evaluate_ns / 1e6:.3f} ms "
+            f"({share(self.evaluate_ns):.0%}), {self.errors} errors",
+            "",
+            "Slowest expressions:",
+            f"{'line':>8}{'total us':>12}{'parse us':>12}{'eval us':>12}  expression",
+        ]
+        for cost in _ranked(self._slowest):
+            lines.append(
+                f"{cost.line:>8}{cost.total_ns / 1000:>12.1f}"
+                f"{cost.parse_ns / 1000:>12.1f}{cost.evaluate_ns / 1000:>12.1f}"
+                f"  {_shown(cost)}"
+            )
+        for title, column, ranking, field in (
+            ("Most tokens:", 'tokens', self._longest, 'tokens'),
+            ("Deepest nesting:", 'depth', self._deepest, 'depth'),
+        ):
+            lines += ["", title, f"{'line':>8}{column:>12}  expression"]
+            for cost in _ranked(ranking):
+                lines.append(
+                    f"{cost.line:>8}{getattr(cost, field):>12}  {_shown(cost)}"
+                )
+        return '\n'.join(lines)
+
+
+def write_profile(run, path, format: str = 'pstats'):
+    """Call a function while recording a function-level profile of it.
+
+    Args:
+        run: The function to call, without arguments.
+        path: The file to write the profile to.
+        format: ``'pstats'`` for a file ``pstats.Stats`` can load, or
+            ``'collapsed'`` for one line per call stack with the
+            nanoseconds spent in it, as flamegraph tools expect.
+
+    Returns:
+        What run returned.
+
+    Raises:
+        ValueError: If the format is unknown.
+    """
+    if format == 'pstats':
+        profile = cProfile.Profile()
+        try:
+            return profile.runcall(run)
+        finally:
+            profile.dump_stats(path)
+    if format == 'collapsed':
+        tracer = _StackTracer()
+        sys.setprofile(tracer)
+        try:
+            return run()
+        finally:
+            sys.setprofile(None)
+            with open(path, 'w', encoding='utf-8') as file:
+                for stack, nanoseconds in sorted(tracer.stacks.items()):
+                    file.write(f"{stack} {nanoseconds}\n")
+    raise ValueError(
+        f"unknown profile format {format!r}; "
+        f"expected one of {', '.join(PROFILE_FORMATS)}"
+    )
+
+
+class _StackTracer:
+    """A sys.setprofile() hook totalling the time spent in each call stack.
+
+    Time is attributed to the innermost function, so each stack's total
+    excludes its callees, as collapsed-stack flamegraphs expect.
+    """
+
+    def __init__(self):
+        self.stacks = Counter()
+        # Entries of [name, start, nanoseconds spent in callees].
+        self._frames = []
+
+    def __call__(self, frame, event, arg):
+        now = time.perf_counter_ns()
+        if event == 'call':
+            code = frame.f_code
+            module = frame.f_globals.get('__name__', os.path.basename(code.co_filename))
+            self._frames.append([f"{module}.{code.co_qualname}", now, 0])
+        elif event == 'c_call':
+            module = getattr(arg, '__module__', None) or 'builtins'
+            name = getattr(arg, '__qualname__', repr(arg))
+            self._frames.append([f"{module}.{name}", now, 0])
+        elif self._frames:
+            # Returns from frames entered before tracing started are ignored.
+            elapsed = now - self._frames[-1][1]
+            stack = ';'.join(name.replace(';', ':') for name, _, _ in self._frames)
+            self.stacks[stack] += elapsed - self._frames.pop()[2]
+            if self._frames:
+                self._frames[-1][2] += elapsed
+
+
+def _shape(expression: str) -> tuple:
+    """Return the number of tokens of an expression and its nesting depth.
+
+    Tokens are counted up to the first one that fails to tokenize.
+    """
+    tokens = depth = deepest = 0
+    try:
+        for token in tokenize(expression):
+            tokens += 1
+            if token.kind == LPAREN:
+                depth += 1
+                deepest = max(deepest, depth)
+            elif token.kind == RPAREN:
+                depth -= 1
+    except SyntaxError:
+        pass
+    return tokens, deepest
+
+
+def _ranked(ranking: list) -> list:
+    """Return the expressions of a ranking, worst first."""
+    return [cost for _, _, cost in sorted(ranking, reverse=True)]
+
+
+def _shown(cost: ExpressionCost) -> str:
+    """Return the expression text of a cost, shortened for display."""
+    if len(cost.source) <= _MAX_SHOWN:
+        return cost.source
+    return cost.source[:_MAX_SHOWN - 3] + '...'
@@ -0,0 +1,322 @@
+"""Calculator registry module.
+
+This module provides the tables of operators, functions and constants that
+expressions can use. A registry is shared by any number of parsers and owns
+the cache of the expressions compiled against it, so changing one registry
+never invalidates the compiled expressions of another.
+"""
+
+import itertools
+import operator
+from collections import namedtuple
+
+from calculator import operations
+from calculator.cache import ConcurrentCache
+from calculator.tokenizer import OPERATOR_SYMBOLS, POSTFIX_SYMBOLS, PREFIX_SYMBOLS
+
+# Number of compiled expressions kept in a registry's cache.
+DEFAULT_CACHE_SIZE = 1024
+
+# Numbers the versions of every registry, so that their keys are unique.
+_versions = itertools.count()
+
+
+class Operator(
+    namedtuple(
+        'Operator', ('precedence', 'func', 'right_associative'), defaults=(False,)
+    )
+):
+    """An operator.
+
+    Attributes:
+        precedence: Binding strength; higher binds tighter.
+        func: The callable computing the operation.
+        right_associative: Whether ``a op b op c`` is ``a op (b op c)``.
+    """
+
+    __slots__ = ()
+
+
+class Function(
+    namedtuple('Function', ('func', 'min_args', 'max_args', 'pure'), defaults=(True,))
+):
+    """A function callable from expressions.
+
+    Attributes:
+        func: The callable.
+        min_args: The minimum number of arguments.
+        max_args: The maximum number of arguments, or None for no limit.
+        pure: Whether the result depends only on the arguments, without side
+            effects. Calls of pure functions on constants are folded at
+            compile time and identical calls are computed once.
+    """
+
+    __slots__ = ()
+
+
+class Registry:
+    """Operators, functions and constants available to expressions.
+
+    Registering anything clears the registry's cache, since it may change
+    the meaning of expressions compiled before. A frozen registry can no
+    longer be changed; use copy() to extend it.
+
+    Attributes:
+        operators: Binary operators by symbol.
+        prefix_operators: Prefix operators by symbol.
+        postfix_operators: Postfix operators by symbol. They bind tighter
+            than every other operator, so their precedence is not used.
+        functions: Functions by name.
+        constants: Constant values by name.
+        cache: The cache of expressions compiled with this registry, a
+            ConcurrentCache that any number of threads may share.
+        key: The prefix of the keys expressions compiled with this registry
+            are stored under in caches that no registry owns. It changes
+            whenever the registry does, so such caches never return
+            expressions compiled before a change.
+    """
+
+    def __init__(self, cache_size: int = DEFAULT_CACHE_SIZE):
+        """Initialize an empty registry.
+
+        Args:
+            cache_size: The capacity of the registry's compiled-expression
+                cache.
+        """
+        self.operators = {}
+        self.prefix_operators = {}
+        self.postfix_operators = {}
+        self.functions = {}
+        self.constants = {}
+        self.cache = ConcurrentCache(cache_size)
+        self.cache.registry = self
+        self.key = f"registry {next(_versions)}:"
+        self._frozen = False
+
+    def __repr__(self):
+        state = 'frozen ' if self._frozen else ''
+        return (
+            f"<{state}Registry: {len(self.operators)} operators, "
+            f"{len(self.functions)} functions, {len(self.constants)} constants>"
+        )
+
+    @property
+    def frozen(self) -> bool:
+        """Whether the registry can no longer be changed."""
+        return self._frozen
+
+    def freeze(self) -> 'Registry':
+        """Prevent further changes.
+
+        Returns:
+            The registry itself.
+        """
+        self._frozen = True
+        return self
+
+    def copy(self, cache_size: int | None = None) -> 'Registry':
+        """Return an unfrozen copy with an empty cache of its own.
+
+        Args:
+            cache_size: The capacity of the copy's cache. Defaults to the
+                capacity of this registry's cache.
+
+        Returns:
+            The new registry.
+        """
+        registry = Registry(cache_size or self.cache.capacity)
+        registry.operators.update(self.operators)
+        registry.prefix_operators.update(self.prefix_operators)
+        registry.postfix_operators.update(self.postfix_operators)
+        registry.functions.update(self.functions)
+        registry.constants.update(self.constants)
+        return registry
+
+    def add_operator(
+        self, symbol: str, func, precedence: int, right_associative: bool = False
+    ):
+        """Define or redefine a binary operator.
+
+        Args:
+            symbol: One of the operator symbols the tokenizer recognizes:
+                ``+ - * / % ^ **``.
+            func: The callable taking the left and right operands.
+            precedence: Binding strength; higher binds tighter. Negation has
+                precedence 3 in the default registry.
+            right_associative: Whether ``a op b op c`` is ``a op (b op c)``.
+
+        Raises:
+            RuntimeError: If the registry is frozen.
+            ValueError: If the symbol is not an operator symbol.
+        """
+        self._check_symbol(symbol, OPERATOR_SYMBOLS)
+        self._changed()
+        self.operators[symbol] = Operator(precedence, func, right_associative)
+
+    def add_prefix_operator(self, symbol: str, func, precedence: int):
+        """Define or redefine a prefix operator.
+
+        Args:
+            symbol: The prefix operator symbol, ``-``.
+            func: The callable taking the operand.
+            precedence: Binding strength; higher binds tighter.
+
+        Raises:
+            RuntimeError: If the registry is frozen.
+            ValueError: If the symbol is not a prefix operator symbol.
+        """
+        self._check_symbol(symbol, PREFIX_SYMBOLS)
+        self._changed()
+        self.prefix_operators[symbol] = Operator(precedence, func)
+
+    def add_postfix_operator(self, symbol: str, func):
+        """Define or redefine a postfix operator.
+
+        Args:
+            symbol: The postfix operator symbol, ``!``.
+            func: The callable taking the operand.
+
+        Raises:
+            RuntimeError: If the registry is frozen.
+            ValueError: If the symbol is not a postfix operator symbol.
+        """
+        self._check_symbol(symbol, POSTFIX_SYMBOLS)
+        self._changed()
+        self.postfix_operators[symbol] = Operator(0, func)
+
+    def add_function(self, name: str, func, arity=None, pure: bool = True):
+        """Define or redefine a function.
+
+        Args:
+            name: The name expressions call the function by.
+            func: The callable.
+            arity: The number of arguments, as an int or a ``(min, max)``
+                tuple whose max may be None for no limit. Defaults to the
+                positional parameters of func's signature.
+            pure: Whether the result depends only on the arguments. Impure
+                functions, such as random number generators, are never
+                folded or shared between identical calls.
+
+        Raises:
+            RuntimeError: If the registry is frozen.
+            ValueError: If the name is not a valid identifier, or the arity
+                cannot be determined.
+        """
+        self._check_name(name)
+        if arity is None:
+            min_args, max_args = _signature_arity(func)
+        elif isinstance(arity, int):
+            min_args = max_args = arity
+        else:
+            min_args, max_args = arity
+        self._changed()
+        self.functions[name] = Function(func, min_args, max_args, pure)
+
+    def add_constant(self, name: str, value):
+        """Define or redefine a named constant.
+
+        Args:
+            name: The name expressions refer to the constant by.
+            value: The constant value.
+
+        Raises:
+            RuntimeError: If the registry is frozen.
+            ValueError: If the name is not a valid identifier.
+        """
+        self._check_name(name)
+        self._changed()
+        self.constants[name] = value
+
+    def _changed(self):
+        """Prepare for a change of the tables.
+
+        Raises:
+            RuntimeError: If the registry is frozen.
+        """
+        if self._frozen:
+            raise RuntimeError("registry is frozen")
+        self.cache.clear()
+        self.key = f"registry {next(_versions)}:"
+
+    @staticmethod
+    def _check_symbol(symbol: str, symbols: frozenset):
+        if symbol not in symbols:
+            raise ValueError(
+                f"unsupported operator symbol {symbol!r}; "
+                f"expected one of {' '.join(sorted(symbols))}"
+            )
+
+    @staticmethod
+    def _check_name(name: str):
+        if not (name.isascii() and name.isidentifier()):
+            raise ValueError(f"invalid name {name!r}")
+
+
+def _signature_arity(func) -> tuple:
+    """Determine the number of arguments a callable takes.
+
+    Args:
+        func: The callable.
+
+    Returns:
+        The minimum and maximum number of positional arguments; the maximum
+        is None if the callable takes ``*args``.
+
+    Raises:
+        ValueError: If the callable has no inspectable signature.
+    """
+    # Imported here: inspect is slow to import, and the built-in functions
+    # are registered with explicit arities.
+    import inspect
+
+    try:
+        parameters = inspect.signature(func).parameters.values()
+    except (TypeError, ValueError):
+        raise ValueError(
+            f"cannot determine the arity of {func!r}; pass arity explicitly"
+        ) from None
+
+    min_args = max_args = 0
+    for parameter in parameters:
+        if parameter.kind == parameter.VAR_POSITIONAL:
+            max_args = None
+        elif parameter.kind in (
+            parameter.POSITIONAL_ONLY,
+            parameter.POSITIONAL_OR_KEYWORD,
+        ):
+            if max_args is not None:
+                max_args += 1
+            if parameter.default is parameter.empty:
+                min_args += 1
+    return min_args, max_args
+
+
+def _default_registry() -> Registry:
+    """Build the registry of the built-in operators, functions and constants."""
+    registry = Registry()
+    registry.add_operator('+', operator.add, 1)
+    registry.add_operator('-', operator.sub, 1)
+    registry.add_operator('*', operator.mul, 2)
+    registry.add_operator('/', operator.truediv, 2)
+    registry.add_operator('%', operations.modulo, 2)
+    registry.add_operator('^', operations.power, 4, right_associative=True)
+    registry.add_operator('**', operations.power, 4, right_associative=True)
+    registry.add_prefix_operator('-', operator.neg, 3)
+    registry.add_postfix_operator('!', operations.bounded_factorial)
+
+    for name in ('sqrt', 'exp', 'ln', 'sin', 'cos', 'tan'):
+        registry.add_function(name, getattr(operations, name), 1)
+    registry.add_function('log', operations.log, (1, 2))
+    registry.add_function('pow', operations.pow, 2)
+    registry.add_function('power', operations.power, 2)
+    registry.add_function('mod', operations.modulo, 2)
+    registry.add_function('factorial', operations.bounded_factorial, 1)
+
+    registry.add_constant('pi', operations.PI)
+    registry.add_constant('e', operations.E)
+    return registry.freeze()
+
+
+# The frozen registry of built-ins used by parsers that are not given one.
+# Its cache is the process-wide cache behind calculator.parser.parse().
+default_registry = _default_registry()
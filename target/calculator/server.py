@@ -0,0 +1,417 @@
+"""Calculator server module.
+
+This module serves expression evaluation over TCP or Unix sockets with
+asyncio. Clients send expressions and receive one response per expression,
+in order, and may pipeline any number of requests on a connection. Two
+framings are supported:
+
+- ``line``: each request and response is one UTF-8 line.
+- ``length``: each request and response is UTF-8 text prefixed with its
+  length as a 4-byte big-endian integer.
+
+A response is the result, formatted as the CLI prints it, or ``Error: ...``.
+
+Requests arriving together, from any number of connections, are evaluated
+as one batch in which identical expressions are evaluated once. Small
+batches run on the event loop against the compiled-expression cache; large
+ones, by number of distinct expressions or by their total size, are split
+across a process pool, so the loop keeps serving while they run. Run a server with::
+
+    python -m calculator.server [--host HOST] [--port PORT] [--unix PATH]
+                                [--framing line|length] [--workers N]
+"""
+
+import argparse
+import asyncio
+import os
+import struct
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from calculator.batch import EXPRESSION_ERRORS, _evaluate_chunk, evaluate_stream
+
+FRAMINGS = ('line', 'length')
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 7878
+
+# Largest batch collected before it is evaluated without waiting.
+DEFAULT_BATCH_SIZE = 1024
+
+# Distinct expressions in a batch above which it is sent to the process pool.
+DEFAULT_OFFLOAD_THRESHOLD = 256
+
+# Total bytes of distinct expressions in a batch above which it is sent to
+# the process pool, so a few long requests are not compiled on the loop.
+DEFAULT_OFFLOAD_BYTES = 1 << 14
+
+# Largest request accepted, in bytes; longer requests close the connection.
+DEFAULT_MAX_REQUEST = 1 << 16
+
+# Responses a connection may have outstanding before reading is paused.
+DEFAULT_MAX_PENDING = 1024
+
+_LENGTH = struct.Struct('>I')
+
+
+class Server:
+    """An expression evaluation server.
+
+    Attributes:
+        framing: The framing of requests and responses, one of FRAMINGS.
+        batch_size: Largest batch collected before it is evaluated.
+        batch_delay: Seconds to wait for more requests after the first of a
+            batch arrives. 0 evaluates the requests that arrived in the same
+            event loop iteration together, adding no latency.
+        offload_threshold: Distinct expressions in a batch above which it is
+            evaluated in the process pool.
+        offload_bytes: Total length of the distinct expressions in a batch
+            above which it is evaluated in the process pool.
+        workers: Number of worker processes; 0 uses one per CPU and 1 uses a
+            thread instead of a process pool.
+        requests: Number of requests received.
+        batches: Number of batches evaluated.
+        evaluated: Number of distinct expressions evaluated.
+        offloaded: Number of batches evaluated in the pool.
+    """
+
+    def __init__(
+        self,
+        framing: str = 'line',
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        batch_delay: float = 0.0,
+        offload_threshold: int = DEFAULT_OFFLOAD_THRESHOLD,
+        offload_bytes: int = DEFAULT_OFFLOAD_BYTES,
+        workers: int = 0,
+        max_request: int = DEFAULT_MAX_REQUEST,
+        max_pending: int = DEFAULT_MAX_PENDING,
+    ):
+        """Initialize the server.
+
+        Args:
+            framing: The framing of requests and responses, one of FRAMINGS.
+            batch_size: Largest batch collected before it is evaluated.
+            batch_delay: Seconds to wait for more requests after the first
+                of a batch arrives.
+            offload_threshold: Distinct expressions in a batch above which
+                it is evaluated in the process pool.
+            offload_bytes: Total length of the distinct expressions in a
+                batch above which it is evaluated in the process pool.
+            workers: Number of worker processes; 0 uses one per CPU and 1
+                uses a thread instead of a process pool.
+            max_request: Largest request accepted, in bytes.
+            max_pending: Responses a connection may have outstanding before
+                reading from it is paused.
+
+        Raises:
+            ValueError: If the framing is unknown.
+        """
+        if framing not in FRAMINGS:
+            raise ValueError(
+                f"unknown framing {framing!r}; expected one of {', '.join(FRAMINGS)}"
+            )
+        self.framing = framing
+        self.batch_size = batch_size
+        self.batch_delay = batch_delay
+        self.offload_threshold = offload_threshold
+        self.offload_bytes = offload_bytes
+        self.workers = workers or os.cpu_count() or 1
+        self.max_request = max_request
+        self.max_pending = max_pending
+        self.requests = 0
+        self.batches = 0
+        self.evaluated = 0
+        self.offloaded = 0
+        self._batch = {}
+        self._batch_bytes = 0
+        self._flush_handle = None
+        self._executor = None
+        self._servers = []
+        self._connections = set()
+        self._offloads = {}
+
+    def __repr__(self):
+        return f"<Server {self.framing}: {self.requests} requests>"
+
+    async def start(
+        self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, path=None
+    ) -> asyncio.Server:
+        """Start listening.
+
+        Args:
+            host: The host to listen on.
+            port: The TCP port to listen on; 0 picks a free one.
+            path: A Unix socket path to listen on instead of host and port.
+
+        Returns:
+            The listening asyncio server.
+        """
+        limit = self.max_request + 1
+        if path is not None:
+            server = await asyncio.start_unix_server(
+                self._handle, path, limit=limit, backlog=1024
+            )
+        else:
+            server = await asyncio.start_server(
+                self._handle, host, port, limit=limit, backlog=1024
+            )
+        self._servers.append(server)
+        return server
+
+    async def aclose(self):
+        """Stop listening, close connections and shut the pool down.
+
+        Requests that are still queued or being evaluated in the pool are
+        answered with ``Error: server closed``.
+        """
+        for server in self._servers:
+            server.close()
+        for writer in list(self._connections):
+            writer.close()
+        for server in self._servers:
+            await server.wait_closed()
+        self._servers.clear()
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batches = [self._batch, *self._offloads.values()]
+        self._batch, self._batch_bytes = {}, 0
+        tasks = list(self._offloads)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for batch in batches:
+            _abandon(batch)
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    def stats(self) -> dict:
+        """Return the server counters.
+
+        Returns:
+            A dictionary with the numbers of requests, batches, distinct
+            expressions evaluated and batches offloaded to the pool.
+        """
+        return {
+            'requests': self.requests,
+            'batches': self.batches,
+            'evaluated': self.evaluated,
+            'offloaded': self.offloaded,
+        }
+
+    def evaluate(self, expression: str) -> asyncio.Future:
+        """Queue an expression for evaluation in the next batch.
+
+        Args:
+            expression: The expression to evaluate.
+
+        Returns:
+            A future resolving to the response text, without framing.
+        """
+        self.requests += 1
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        source = ' '.join(expression.split())
+        futures = self._batch.get(source)
+        if futures is None:
+            futures = self._batch[source] = []
+            self._batch_bytes += len(source)
+        futures.append(future)
+        if len(self._batch) >= self.batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            if self.batch_delay > 0:
+                self._flush_handle = loop.call_later(self.batch_delay, self._flush)
+            else:
+                self._flush_handle = loop.call_soon(self._flush)
+        return future
+
+    def _flush(self):
+        """Start evaluating the collected batch."""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._batch = self._batch, {}
+        size, self._batch_bytes = self._batch_bytes, 0
+        if not batch:
+            return
+        self.batches += 1
+        self.evaluated += len(batch)
+        if len(batch) > self.offload_threshold or size > self.offload_bytes:
+            self.offloaded += 1
+            task = asyncio.get_running_loop().create_task(self._offload(batch))
+            self._offloads[task] = batch
+            task.add_done_callback(self._offloads.pop)
+        else:
+            _resolve(batch, evaluate_stream(batch))
+
+    async def _offload(self, batch: dict):
+        """Evaluate a batch in the pool, split into one chunk per worker."""
+        loop = asyncio.get_running_loop()
+        if self._executor is None and self.workers > 1:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        expressions = list(batch)
+        size = -(-len(expressions) // self.workers)
+        try:
+            chunks = await asyncio.gather(
+                *(
+                    loop.run_in_executor(
+                        self._executor, _evaluate_chunk, expressions[i:i + size]
+                    )
+                    for i in range(0, len(expressions), size)
+                )
+            )
+        except Exception as e:
+            _resolve(batch, [e] * len(batch))
+        else:
+            _resolve(batch, (result for chunk in chunks for result in chunk))
+
+    async def _handle(self, reader, writer):
+        """Serve one connection."""
+        self._connections.add(writer)
+        responses = asyncio.Queue(self.max_pending)
+        sender = asyncio.create_task(self._send(responses, writer))
+        try:
+            if self.framing == 'line':
+                await self._read_lines(reader, responses)
+            else:
+                await self._read_frames(reader, responses)
+        except (ConnectionError, ValueError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            await responses.put(None)
+            await sender
+            writer.close()
+            self._connections.discard(writer)
+
+    async def _read_lines(self, reader, responses: asyncio.Queue):
+        """Queue the responses to newline-delimited requests."""
+        while line := await reader.readline():
+            if len(line) > self.max_request:
+                raise ValueError("request too long")
+            await responses.put(self.evaluate(line.decode(errors='replace')))
+
+    async def _read_frames(self, reader, responses: asyncio.Queue):
+        """Queue the responses to length-prefixed requests."""
+        while header := await reader.read(_LENGTH.size):
+            if len(header) < _LENGTH.size:
+                header += await reader.readexactly(_LENGTH.size - len(header))
+            (length,) = _LENGTH.unpack(header)
+            if length > self.max_request:
+                raise ValueError("request too long")
+            request = await reader.readexactly(length)
+            await responses.put(self.evaluate(request.decode(errors='replace')))
+
+    async def _send(self, responses: asyncio.Queue, writer):
+        """Write responses in request order until None is queued.
+
+        If the client goes away, the remaining responses are discarded, so
+        the reader is never blocked on a full queue.
+        """
+        line = self.framing == 'line'
+        connected = True
+        while (future := await responses.get()) is not None:
+            data = (await future).encode()
+            if not connected:
+                continue
+            if line:
+                writer.write(data + b'\n')
+            else:
+                writer.write(_LENGTH.pack(len(data)) + data)
+            try:
+                if responses.empty():
+                    await writer.drain()
+            except ConnectionError:
+                connected = False
+        if connected:
+            try:
+                await writer.drain()
+            except ConnectionError:
+                pass
+
+
+def _resolve(batch: dict, results):
+    """Answer every request of a batch with the result of its expression."""
+    for futures, result in zip(batch.values(), results):
+        if isinstance(result, BaseException):
+            if isinstance(result, EXPRESSION_ERRORS):
+                response = f"Error: {result}"
+            else:
+                response = f"Error: internal error: {result!r}"
+        else:
+            response = f"{result}"
+        for future in futures:
+            if not future.done():
+                future.set_result(response)
+
+
+def _abandon(batch: dict):
+    """Answer the unanswered requests of a batch the server gave up on."""
+    for futures in batch.values():
+        for future in futures:
+            if not future.done():
+                future.set_result("Error: server closed")
+
+
+async def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, path=None, **options):
+    """Run a server until cancelled.
+
+    Args:
+        host: The host to listen on.
+        port: The TCP port to listen on.
+        path: A Unix socket path to listen on instead of host and port.
+        **options: Options for Server.
+    """
+    async with Server(**options) as server:
+        listener = await server.start(host, port, path)
+        await listener.serve_forever()
+
+
+def main(args=None):
+    """Run a server from the command line.
+
+    Args:
+        args: Command-line arguments. If None, uses sys.argv.
+
+    Returns:
+        Exit code (0 when interrupted).
+    """
+    arg_parser = argparse.ArgumentParser(
+        prog='python -m calculator.server', description="Calculator server"
+    )
+    arg_parser.add_argument('--host', default=DEFAULT_HOST)
+    arg_parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    arg_parser.add_argument('--unix', metavar='PATH', help="listen on a Unix socket")
+    arg_parser.add_argument('--framing', choices=FRAMINGS, default='line')
+    arg_parser.add_argument(
+        '--workers',
+        type=int,
+        default=0,
+        metavar='N',
+        help="worker processes for large batches; 0 uses one per CPU",
+    )
+    options = arg_parser.parse_args(args)
+    try:
+        asyncio.run(
+            serve(
+                options.host,
+                options.port,
+                options.unix,
+                framing=options.framing,
+                workers=options.workers,
+            )
+        )
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
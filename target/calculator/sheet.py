@@ -0,0 +1,350 @@
+"""Calculator sheet module.
+
+This module keeps a sheet of named cells, like a spreadsheet: each cell holds
+either an input value or a formula over other cells, such as
+``margin = revenue - cost``. Formulas are compiled once, when they are set,
+and the cells they read form a dependency graph in which cycles are
+rejected. Changing cells recomputes only the formulas that depend on them,
+each once, in topological order, and stops propagating wherever a
+recomputed value is unchanged. Every other cell keeps its cached value.
+
+A formula that fails, or that reads a missing or failed cell, holds the
+exception instead of a value, and its dependents hold the same exception,
+as in ``calculator.batch.evaluate_stream``.
+"""
+
+from calculator.batch import EXPRESSION_ERRORS
+from calculator.parser import Parser
+
+
+class CircularReferenceError(ValueError):
+    """A formula would depend on its own value.
+
+    Attributes:
+        cycle: The cell names around the cycle, starting and ending with the
+            cell whose formula was being set.
+    """
+
+    def __init__(self, cycle: tuple):
+        super().__init__(f"circular reference: {' -> '.join(cycle)}")
+        self.cycle = cycle
+
+
+class Sheet:
+    """A set of named input values and formulas, kept up to date.
+
+    Attributes:
+        parser: The parser formulas are compiled with.
+        evaluations: The number of formula evaluations so far.
+    """
+
+    def __init__(self, parser: Parser | None = None):
+        """Initialize an empty sheet.
+
+        Args:
+            parser: The parser to compile formulas with, which decides the
+                registry and numeric backend. Defaults to a parser with the
+                default registry.
+        """
+        self.parser = Parser() if parser is None else parser
+        self.evaluations = 0
+        # Values, or exceptions, by cell name.
+        self._values = {}
+        # Compiled formulas by cell name; other cells are inputs.
+        self._formulas = {}
+        # The formula cells reading each name, whether or not it is a cell,
+        # as dictionaries with None values so their order is stable.
+        self._dependents = {}
+
+    def __repr__(self):
+        return f"<Sheet: {len(self._formulas)} formulas, {len(self)} cells>"
+
+    def __len__(self):
+        return len(self._values)
+
+    def __iter__(self):
+        return iter(self._values)
+
+    def __contains__(self, name):
+        return name in self._values
+
+    def __getitem__(self, name: str):
+        """Return the value of a cell.
+
+        Raises:
+            KeyError: If there is no such cell.
+            Exception: The error of a cell whose formula failed.
+        """
+        value = self._values[name]
+        if isinstance(value, BaseException):
+            raise value
+        return value
+
+    def __setitem__(self, name: str, value):
+        self.update({name: value})
+
+    def __delitem__(self, name: str):
+        """Remove a cell. Formulas reading it fail with NameError.
+
+        Raises:
+            KeyError: If there is no such cell.
+        """
+        del self._values[name]
+        self._unlink(name)
+        self._recalculate([name])
+
+    def get(self, name: str, default=None):
+        """Return the value of a cell, or the exception its formula raised.
+
+        Args:
+            name: The cell name.
+            default: Returned if there is no such cell.
+
+        Returns:
+            The value, the exception, or default.
+        """
+        return self._values.get(name, default)
+
+    def set(self, name: str, value) -> list:
+        """Set a cell to an input value or a formula.
+
+        Args:
+            name: The cell name, a valid variable name.
+            value: A number, or a string holding a formula.
+
+        Returns:
+            The names of the cells whose values changed, in the order they
+            were recomputed, as returned by update().
+
+        Raises:
+            ValueError: If the name cannot be used in formulas.
+            SyntaxError: If the formula is malformed.
+            CircularReferenceError: If the formula would depend on itself.
+        """
+        return self.update({name: value})
+
+    def update(self, cells: dict) -> list:
+        """Set several cells, then recompute what depends on them once.
+
+        Formulas are compiled and checked for cycles before any cell is
+        changed, so on error the sheet is left as it was.
+
+        Args:
+            cells: Numbers or formula strings by cell name.
+
+        Returns:
+            The names of the cells whose values changed, in the order they
+            were recomputed: the cells set to new input values, then the
+            affected formulas in topological order.
+
+        Raises:
+            ValueError: If a name cannot be used in formulas.
+            SyntaxError: If a formula is malformed.
+            CircularReferenceError: If a formula would depend on itself.
+        """
+        formulas = {}
+        for name, value in cells.items():
+            self._check_name(name)
+            if isinstance(value, str):
+                formulas[name] = self.parser.compile(value)
+        self._check_cycles(formulas, cells)
+
+        changed = []
+        for name, value in cells.items():
+            if name in formulas:
+                self._unlink(name)
+                compiled = self._formulas[name] = formulas[name]
+                for dependency in compiled.variables:
+                    self._dependents.setdefault(dependency, {})[name] = None
+                # New formulas are always computed, replacing the None.
+                self._values.setdefault(name, None)
+            else:
+                if name in self._formulas:
+                    self._unlink(name)
+                elif name in self._values and _same(self._values[name], value):
+                    continue
+                self._values[name] = value
+            changed.append(name)
+        return self._recalculate(changed, formulas)
+
+    def formula(self, name: str) -> str | None:
+        """Return the formula of a cell, or None for input cells.
+
+        Raises:
+            KeyError: If there is no such cell.
+        """
+        if name not in self._values:
+            raise KeyError(name)
+        compiled = self._formulas.get(name)
+        return None if compiled is None else compiled.source
+
+    def dependencies(self, name: str) -> tuple:
+        """Return the names a cell's formula reads, in order of first use."""
+        compiled = self._formulas.get(name)
+        return () if compiled is None else compiled.variables
+
+    def dependents(self, name: str) -> tuple:
+        """Return the names of the formulas reading a name, sorted."""
+        return tuple(sorted(self._dependents.get(name, ())))
+
+    def values(self) -> dict:
+        """Return every cell's value, or the exception its formula raised."""
+        return dict(self._values)
+
+    def _recalculate(self, names: list, formulas=()) -> list:
+        """Recompute the formulas affected by changed names.
+
+        Args:
+            names: Names whose values changed or whose cells were added or
+                removed.
+            formulas: Names of formulas that were just set, which are
+                computed even if nothing they read changed.
+
+        Returns:
+            The names of the cells whose values changed, in order.
+        """
+        values = self._values
+        changed = set(names)
+        updated = [name for name in names if name not in self._formulas]
+        for name in self._topological_order(names):
+            compiled = self._formulas[name]
+            if name not in formulas and not any(
+                dependency in changed for dependency in compiled.variables
+            ):
+                continue
+            value = self._evaluate(compiled)
+            if not _same(values[name], value):
+                values[name] = value
+                changed.add(name)
+                updated.append(name)
+            else:
+                changed.discard(name)
+        return updated
+
+    def _evaluate(self, compiled):
+        """Evaluate a formula on the current values of its dependencies.
+
+        Returns:
+            The value, or the exception the formula or a dependency raised.
+        """
+        values = self._values
+        args = []
+        for dependency in compiled.variables:
+            if dependency not in values:
+                return NameError(f"undefined variable: {dependency}")
+            value = values[dependency]
+            if isinstance(value, BaseException):
+                return value
+            args.append(value)
+        self.evaluations += 1
+        try:
+            return compiled.evaluate(*args)
+        except EXPRESSION_ERRORS as e:
+            return e
+
+    def _topological_order(self, roots) -> list:
+        """Return the formulas depending on roots, dependencies first.
+
+        Includes the roots themselves if they are formulas. The walk uses
+        an explicit stack, so long chains of formulas do not hit the
+        recursion limit.
+        """
+        dependents = self._dependents
+        formulas = self._formulas
+        order = []
+        visited = set()
+        for root in roots:
+            if root in visited:
+                continue
+            visited.add(root)
+            stack = [(root, iter(dependents.get(root, ())))]
+            while stack:
+                name, children = stack[-1]
+                for child in children:
+                    if child not in visited:
+                        visited.add(child)
+                        stack.append((child, iter(dependents.get(child, ()))))
+                        break
+                else:
+                    stack.pop()
+                    if name in formulas:
+                        order.append(name)
+        order.reverse()
+        return order
+
+    def _check_cycles(self, formulas: dict, cells: dict):
+        """Check that setting cells would not create a cycle.
+
+        Args:
+            formulas: The new compiled formulas by cell name.
+            cells: All the cells being set; those that are not in formulas
+                become inputs.
+
+        Raises:
+            CircularReferenceError: If a formula would depend on itself.
+        """
+
+        def dependencies(name):
+            if name in formulas:
+                return formulas[name].variables
+            if name in cells or name not in self._formulas:
+                return ()
+            return self._formulas[name].variables
+
+        # Depth-first search along what formulas read, from each new one.
+        # Names on the current path are in `path`; names fully explored are
+        # in `done`, so each is visited once however many formulas are set.
+        done = set()
+        for start in formulas:
+            if start in done:
+                continue
+            path = [start]
+            on_path = {start}
+            stack = [iter(dependencies(start))]
+            while stack:
+                for name in stack[-1]:
+                    if name in on_path:
+                        cycle = path[path.index(name):]
+                        # The sheet had no cycles, so one of the new
+                        # formulas is on it; report the cycle from there.
+                        first = next(i for i, n in enumerate(cycle) if n in formulas)
+                        cycle = cycle[first:] + cycle[:first]
+                        raise CircularReferenceError(tuple(cycle) + (cycle[0],))
+                    if name not in done:
+                        path.append(name)
+                        on_path.add(name)
+                        stack.append(iter(dependencies(name)))
+                        break
+                else:
+                    stack.pop()
+                    done.add(path[-1])
+                    on_path.discard(path.pop())
+
+    def _unlink(self, name: str):
+        """Remove a cell's formula and its dependency edges, if it has one."""
+        compiled = self._formulas.pop(name, None)
+        if compiled is None:
+            return
+        for dependency in compiled.variables:
+            readers = self._dependents[dependency]
+            readers.pop(name, None)
+            if not readers:
+                del self._dependents[dependency]
+
+    def _check_name(self, name: str):
+        """Check that a name can be read by formulas.
+
+        Raises:
+            ValueError: If the name is not an identifier or is a constant.
+        """
+        if not (isinstance(name, str) and name.isascii() and name.isidentifier()):
+            raise ValueError(f"invalid cell name: {name!r}")
+        if name in self.parser.registry.constants:
+            raise ValueError(f"cell name {name!r} is a constant")
+
+
+def _same(old, new) -> bool:
+    """Return whether a recomputed value is unchanged."""
+    if isinstance(old, BaseException) or isinstance(new, BaseException):
+        return old is new
+    return type(old) is type(new) and old == new
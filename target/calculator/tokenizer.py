@@ -0,0 +1,244 @@
+"""Calculator tokenizer module.
+
+This module splits expressions into typed tokens in a single pass.
+"""
+
+from collections import namedtuple
+from sys import intern as _intern
+
+# Token kinds.
+NUMBER = 'number'
+NAME = 'name'
+FUNCTION = 'function'
+OPERATOR = 'operator'
+NEGATE = 'negate'
+POSTFIX = 'postfix'
+LPAREN = 'lparen'
+RPAREN = 'rparen'
+COMMA = 'comma'
+
+_SENTINEL = '\0'
+# Every character str.split() splits on, so that tokenizing text before and
+# after its whitespace is collapsed gives the same tokens.
+_WHITESPACE = frozenset(
+    ' \t\n\r\f\v\x1c\x1d\x1e\x1f\x85\xa0\u1680\u2000\u2001\u2002\u2003\u2004'
+    '\u2005\u2006\u2007\u2008\u2009\u200a\u2028\u2029\u202f\u205f\u3000'
+)
+_DIGITS = frozenset('0123456789')
+_NUMBER_START = _DIGITS | {'.'}
+_NAME_START = frozenset('abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ_')
+_NAME_CHARS = _NAME_START | _DIGITS
+_SYMBOLS = {
+    '+': OPERATOR,
+    '-': OPERATOR,
+    '*': OPERATOR,
+    '/': OPERATOR,
+    '%': OPERATOR,
+    '^': OPERATOR,
+    '!': POSTFIX,
+    '(': LPAREN,
+    ')': RPAREN,
+    ',': COMMA,
+}
+
+# Symbols emitted as OPERATOR, NEGATE and POSTFIX tokens, which are the only
+# symbols operators can be defined for.
+OPERATOR_SYMBOLS = frozenset(
+    [symbol for symbol, kind in _SYMBOLS.items() if kind == OPERATOR] + ['**']
+)
+PREFIX_SYMBOLS = frozenset('-')
+POSTFIX_SYMBOLS = frozenset(
+    symbol for symbol, kind in _SYMBOLS.items() if kind == POSTFIX
+)
+
+# Kinds after which a minus sign is subtraction rather than negation.
+_OPERAND_END = (NUMBER, NAME, RPAREN, POSTFIX)
+
+# Operators that bind tighter than negation, so '-2^2' is '-(2^2)'.
+_BINDS_TIGHTER = ('^', '**', '!')
+
+
+class ExpressionSyntaxError(SyntaxError):
+    """A malformed expression.
+
+    Raised by tokenize() and by parsers, so that callers can tell what is
+    wrong and where without reading the message.
+
+    Attributes:
+        code: What is wrong, one of the names in
+            ``calculator.batch.ERROR_NAMES``: ``'syntax'``,
+            ``'mismatched_parens'``, ``'invalid_character'``,
+            ``'unknown_function'`` or ``'limit_exceeded'``.
+        position: The position of the error in the text tokenized, or
+            None if it has none.
+    """
+
+    def __init__(self, message: str, code: str = 'syntax', position=None):
+        super().__init__(message)
+        self.code = code
+        self.position = position
+
+
+# Named tuples are built with collections rather than typing, which would
+# add the import of typing and re to every start of the CLI.
+class Token(namedtuple('Token', ('kind', 'value', 'offset'))):
+    """A token of an expression.
+
+    Attributes:
+        kind: The token kind, one of the kind constants of this module.
+        value: The number for NUMBER tokens, otherwise the text.
+        offset: The position of the token in the expression.
+    """
+
+    __slots__ = ()
+
+
+_new_token = tuple.__new__
+
+
+def tokenize(expression: str, number=float):
+    """Split an expression into tokens.
+
+    The expression is scanned once, left to right, and tokens are produced
+    lazily. Numbers are converted as they are read, to floats by default. A minus sign
+    that cannot be subtraction is folded into a following number literal,
+    and is otherwise emitted as a NEGATE token; it is not folded when the
+    number is followed by an exponent or factorial operator, which bind
+    tighter. A name directly followed by an opening parenthesis is a
+    FUNCTION token. Names are interned, so every expression using a
+    variable shares one string for it.
+
+    Args:
+        expression: The expression to tokenize.
+        number: The number type literals are converted to, or any callable
+            taking the literal text, such as ``decimal.Decimal``.
+
+    Yields:
+        The tokens of the expression.
+
+    Raises:
+        ExpressionSyntaxError: If the expression contains an invalid
+            character or a malformed number.
+    """
+    # A trailing sentinel that belongs to no character class lets the inner
+    # loops stop at the end without a bounds check on every character.
+    text = expression + _SENTINEL
+    i = 0
+    end = len(expression)
+    previous = None
+
+    while i < end:
+        c = text[i]
+        if c in _WHITESPACE:
+            i += 1
+            continue
+
+        start = i
+        if c == '-' and previous not in _OPERAND_END:
+            i += 1
+            while text[i] in _WHITESPACE:
+                i += 1
+            if text[i] not in _NUMBER_START:
+                previous = NEGATE
+                yield _new_token(Token, (NEGATE, c, start))
+                continue
+            c = text[i]
+
+        if c in _NUMBER_START:
+            number_start = i
+            i += 1
+            while text[i] in _NUMBER_START:
+                i += 1
+            if text[i] in 'eE':
+                i = _scan_exponent(text, i)
+            previous = NUMBER
+            literal = text[number_start:i]
+            value = _to_number(literal, start, number)
+            if start != number_start:
+                if text[_skip_whitespace(text, i):].startswith(_BINDS_TIGHTER):
+                    yield _new_token(Token, (NEGATE, '-', start))
+                    start = number_start
+                elif number is float:
+                    value = -value
+                else:
+                    # Negating a Decimal rounds it to the current context,
+                    # so other types are converted again, with the sign.
+                    value = number('-' + literal)
+            yield _new_token(Token, (NUMBER, value, start))
+        elif c in _NAME_START:
+            i += 1
+            while text[i] in _NAME_CHARS:
+                i += 1
+            previous = FUNCTION if text[_skip_whitespace(text, i)] == '(' else NAME
+            yield _new_token(Token, (previous, _intern(text[start:i]), start))
+        elif c == '*' and text[i + 1] == '*':
+            i += 2
+            previous = OPERATOR
+            yield _new_token(Token, (OPERATOR, '**', start))
+        elif c in _SYMBOLS:
+            i += 1
+            previous = _SYMBOLS[c]
+            yield _new_token(Token, (previous, c, start))
+        else:
+            raise ExpressionSyntaxError(
+                f"invalid character {c!r} at position {start}",
+                'invalid_character',
+                start,
+            )
+
+
+def _skip_whitespace(text: str, i: int) -> int:
+    """Return the position of the first non-whitespace character from i.
+
+    Args:
+        text: The sentinel-terminated expression being tokenized.
+        i: The position to start from.
+
+    Returns:
+        The position of the next non-whitespace character or the sentinel.
+    """
+    while text[i] in _WHITESPACE:
+        i += 1
+    return i
+
+
+def _scan_exponent(text: str, i: int) -> int:
+    """Consume the exponent part of a number, if there is one.
+
+    Args:
+        text: The sentinel-terminated expression being tokenized.
+        i: The position of the 'e' or 'E'.
+
+    Returns:
+        The position after the exponent, or i if the 'e' does not start one.
+    """
+    j = i + 1
+    if text[j] in '+-':
+        j += 1
+    if text[j] not in _DIGITS:
+        return i
+    while text[j] in _DIGITS:
+        j += 1
+    return j
+
+
+def _to_number(text: str, offset: int, number=float):
+    """Convert a number literal.
+
+    Args:
+        text: The literal.
+        offset: The position of the literal, for error messages.
+        number: The number type to convert to.
+
+    Returns:
+        The value of the literal.
+
+    Raises:
+        ExpressionSyntaxError: If the literal is malformed, such as '1.2.3'.
+    """
+    try:
+        return number(text)
+    except (ValueError, ArithmeticError):
+        raise ExpressionSyntaxError(
+            f"invalid number {text!r} at position {offset}", 'syntax', offset
+        ) from None
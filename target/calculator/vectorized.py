@@ -0,0 +1,366 @@
+"""Calculator vectorized evaluation module.
+
+This module evaluates compiled expressions over whole NumPy arrays, running
+each instruction of the program once per batch instead of once per row. It
+requires NumPy, which is an optional dependency (``calculator[numpy]``).
+"""
+
+import math
+import operator
+
+try:
+    import numpy as np
+except ImportError as e:
+    raise ImportError(
+        "vectorized evaluation requires NumPy; "
+        "install it with: pip install calculator[numpy]"
+    ) from e
+
+from calculator import operations
+from calculator.parser import _BINARY, _CALL, _LOAD, _PUSH, _STORE, _UNARY
+
+# Number of offending row indices shown in error messages.
+_ROWS_SHOWN = 10
+
+
+class _RowsMixin:
+    """Mixin for errors that happen in some rows of a batch.
+
+    Attributes:
+        rows: Indices of the offending rows, or None when every row fails
+            because the error comes from constants only.
+    """
+
+    def __init__(self, message: str, rows=None):
+        if rows is not None:
+            shown = ', '.join(str(row) for row in rows[:_ROWS_SHOWN])
+            if len(rows) > _ROWS_SHOWN:
+                shown += ', ...'
+            message = f"{message} at rows [{shown}]"
+        super().__init__(message)
+        self.rows = rows
+
+
+class BatchZeroDivisionError(_RowsMixin, ZeroDivisionError):
+    """Division or modulo by zero in some rows of a batch."""
+
+
+class BatchValueError(_RowsMixin, ValueError):
+    """A domain error, such as the square root of a negative number."""
+
+
+class BatchOverflowError(_RowsMixin, OverflowError):
+    """A result too large for a float in some rows of a batch."""
+
+
+def _check_overflow(result, *operands, message: str = "math range error"):
+    """Raise BatchOverflowError where finite operands gave an infinite result.
+
+    NumPy returns infinity with a warning where the scalar operations raise
+    OverflowError, so overflow is found after the fact.
+
+    Args:
+        result: The result of the operation.
+        *operands: The operands, arrays or scalars.
+        message: The error message, matching the scalar operation.
+
+    Returns:
+        The result.
+    """
+    overflow = np.isinf(result)
+    for operand in operands:
+        overflow &= np.isfinite(operand)
+    _check(overflow, BatchOverflowError, message)
+    return result
+
+
+def _check(invalid, error: type, message: str):
+    """Raise error if any element of a boolean mask is set.
+
+    Args:
+        invalid: Boolean array or scalar marking the offending rows.
+        error: The exception class to raise.
+        message: The error message, matching the scalar operation.
+    """
+    invalid = np.asarray(invalid)
+    if invalid.any():
+        rows = np.flatnonzero(invalid) if invalid.ndim else None
+        raise error(message, rows)
+
+
+def add(a, b):
+    """Add two arrays element-wise."""
+    return np.add(a, b)
+
+
+def subtract(a, b):
+    """Subtract b from a element-wise."""
+    return np.subtract(a, b)
+
+
+def multiply(a, b):
+    """Multiply two arrays element-wise."""
+    return np.multiply(a, b)
+
+
+def negate(a):
+    """Negate an array element-wise."""
+    return np.negative(a)
+
+
+def divide(a, b):
+    """Divide a by b element-wise.
+
+    Raises:
+        BatchZeroDivisionError: If any element of b is zero.
+    """
+    _check(np.equal(b, 0), BatchZeroDivisionError, "division by zero")
+    return np.true_divide(a, b)
+
+
+def power(base, exponent):
+    """Raise base to the power of exponent element-wise.
+
+    Raises:
+        BatchValueError: If any negative base has a fractional exponent.
+        BatchZeroDivisionError: If zero is raised to a negative power.
+        BatchOverflowError: If any result is too large for a float.
+    """
+    _check(
+        np.less(base, 0) & np.not_equal(np.floor(exponent), exponent),
+        BatchValueError,
+        "cannot raise negative number to a fractional power",
+    )
+    _check(
+        np.equal(base, 0) & np.less(exponent, 0),
+        BatchZeroDivisionError,
+        "0.0 cannot be raised to a negative power",
+    )
+    with np.errstate(over='ignore'):
+        result = np.power(base, exponent)
+    return _check_overflow(
+        result, base, exponent, message="Numerical result out of range"
+    )
+
+
+def sqrt(n):
+    """Calculate the square root element-wise.
+
+    Raises:
+        BatchValueError: If any element of n is negative.
+    """
+    _check(
+        np.less(n, 0),
+        BatchValueError,
+        "cannot calculate square root of negative number",
+    )
+    return np.sqrt(n)
+
+
+def modulo(a, b):
+    """Calculate the modulus of a divided by b element-wise.
+
+    Raises:
+        BatchZeroDivisionError: If any element of b is zero.
+    """
+    _check(np.equal(b, 0), BatchZeroDivisionError, "modulo by zero")
+    return np.mod(a, b)
+
+
+# Element-wise factorial; NumPy has no ufunc for it.
+_factorial = np.vectorize(lambda n: float(math.factorial(int(n))), otypes=[float])
+
+
+def factorial(n):
+    """Calculate the factorial element-wise.
+
+    Raises:
+        BatchValueError: If any element of n is negative or not an integer.
+        BatchOverflowError: If any factorial is too large for a float.
+    """
+    _check(
+        np.not_equal(np.floor(n), n),
+        BatchValueError,
+        "factorial requires an integer input",
+    )
+    _check(
+        np.less(n, 0),
+        BatchValueError,
+        "factorial is not defined for negative numbers",
+    )
+    _check(
+        np.greater(n, operations.MAX_FACTORIAL),
+        BatchOverflowError,
+        "factorial result too large for a float",
+    )
+    return _factorial(n)
+
+
+def cos(x):
+    """Calculate the cosine element-wise."""
+    return np.cos(x)
+
+
+def sin(x):
+    """Calculate the sine element-wise."""
+    return np.sin(x)
+
+
+def tan(x):
+    """Calculate the tangent element-wise."""
+    return np.tan(x)
+
+
+def exp(x):
+    """Calculate e raised to the power of x element-wise.
+
+    Raises:
+        BatchOverflowError: If any result is too large for a float.
+    """
+    with np.errstate(over='ignore'):
+        result = np.exp(x)
+    return _check_overflow(result, x)
+
+
+def ln(x):
+    """Calculate the natural logarithm element-wise.
+
+    Raises:
+        BatchValueError: If any element of x is less than or equal to zero.
+    """
+    _check(
+        np.less_equal(x, 0),
+        BatchValueError,
+        "logarithm is not defined for non-positive numbers",
+    )
+    return np.log(x)
+
+
+def log(x, base=10.0):
+    """Calculate the logarithm with the given base element-wise.
+
+    Raises:
+        BatchValueError: If any element of x is less than or equal to zero,
+            or any base is non-positive or equal to 1.
+    """
+    _check(
+        np.less_equal(x, 0),
+        BatchValueError,
+        "logarithm is not defined for non-positive numbers",
+    )
+    _check(
+        np.less_equal(base, 0) | np.equal(base, 1),
+        BatchValueError,
+        "logarithm base must be positive and not equal to 1",
+    )
+    return np.log(x) / np.log(base)
+
+
+# Vectorized counterparts of the scalar callables found in compiled programs.
+VECTORIZED = {
+    operator.add: add,
+    operator.sub: subtract,
+    operator.mul: multiply,
+    operator.truediv: divide,
+    operator.neg: negate,
+    operations.add: add,
+    operations.subtract: subtract,
+    operations.multiply: multiply,
+    operations.divide: divide,
+    operations.power: power,
+    operations.pow: power,
+    operations.sqrt: sqrt,
+    operations.modulo: modulo,
+    operations.factorial: factorial,
+    operations.bounded_factorial: factorial,
+    operations.cos: cos,
+    operations.sin: sin,
+    operations.tan: tan,
+    operations.exp: exp,
+    operations.ln: ln,
+    operations.log: log,
+}
+
+
+def _vectorize(func):
+    """Return the vectorized counterpart of a scalar callable.
+
+    Callables without a NumPy counterpart, such as functions added to a
+    registry, are applied element by element.
+
+    Args:
+        func: The scalar callable.
+
+    Returns:
+        A callable taking and returning arrays.
+    """
+    vectorized = VECTORIZED.get(func)
+    if vectorized is None:
+        vectorized = np.vectorize(func, otypes=[np.float64])
+    return vectorized
+
+
+def evaluate(compiled, columns: dict):
+    """Evaluate a compiled expression over columns of values.
+
+    Args:
+        compiled: The compiled expression to evaluate.
+        columns: Arrays of values by variable name. Anything NumPy can turn
+            into a one-dimensional array is accepted, including buffer
+            protocol objects such as ``array.array``.
+
+    Returns:
+        A float64 NumPy array with one result per row.
+
+    Raises:
+        NameError: If a variable has no column.
+        ValueError: If the columns differ in length.
+        BatchZeroDivisionError: If division by zero occurs in any row.
+        BatchValueError: If a function's domain is violated in any row.
+        BatchOverflowError: If a result is too large for a float in any
+            row.
+    """
+    arrays = {
+        name: np.asarray(column, dtype=np.float64)
+        for name, column in columns.items()
+    }
+    lengths = {len(array) for array in arrays.values()}
+    if len(lengths) > 1:
+        raise ValueError("columns must all have the same length")
+
+    values = []
+    for name in compiled.variables:
+        try:
+            values.append(arrays[name])
+        except KeyError:
+            raise NameError(f"undefined variable: {name}") from None
+
+    values.extend([None] * compiled._temps)
+    stack = []
+    push = stack.append
+    pop = stack.pop
+
+    for opcode, argument in compiled._program:
+        if opcode == _PUSH:
+            push(argument)
+        elif opcode == _LOAD:
+            push(values[argument])
+        elif opcode == _UNARY:
+            push(_vectorize(argument)(pop()))
+        elif opcode == _BINARY:
+            b = pop()
+            push(_vectorize(argument)(pop(), b))
+        elif opcode == _STORE:
+            values[argument] = stack[-1]
+        elif opcode == _CALL:
+            func, count = argument
+            args = stack[len(stack) - count:]
+            del stack[len(stack) - count:]
+            push(_vectorize(func)(*args) if args else func())
+
+    # A copy, since the result may be one of the caller's columns, as for
+    # "x" or "x * 1".
+    result = np.array(stack[0], dtype=np.float64)
+    if result.ndim == 0 and lengths:
+        result = np.full(lengths.pop(), result)
+    return result
@@ -0,0 +1,282 @@
+"""Tests for calculator batch evaluation module."""
+
+import math
+from array import array
+
+import pytest
+
+from calculator import batch
+from calculator.batch import (
+    ERROR_NAMES,
+    evaluate_codes,
+    evaluate_columns,
+    evaluate_many,
+    evaluate_stream,
+)
+from calculator.parser import Limits, Parser, compile
+from calculator.registry import default_registry
+
+
+class TestEvaluateColumns:
+    """Tests for the evaluate_columns function."""
+
+    def test_matches_scalar_evaluation(self):
+        """Test that column results match row-by-row evaluation."""
+        compiled = compile("price * (1 + tax) - -discount / 2")
+        price = array('d', [10.0, 20.0, 30.0])
+        tax = array('d', [0.1, 0.2, 0.3])
+        discount = array('d', [1.0, 2.0, 3.0])
+        result = evaluate_columns(compiled, price=price, tax=tax, discount=discount)
+        expected = [
+            compiled.evaluate(price=p, tax=t, discount=d)
+            for p, t, d in zip(price, tax, discount)
+        ]
+        assert result.tolist() == pytest.approx(expected)
+
+    def test_shared_subexpressions(self):
+        """Test columns with an expression that reuses a subexpression."""
+        compiled = compile("(x * y + 1) * (x * y + 1)")
+        result = evaluate_columns(
+            compiled, x=array('d', [1.0, 2.0]), y=array('d', [3.0, 4.0])
+        )
+        assert result.tolist() == [16.0, 81.0]
+
+    def test_returns_double_array(self):
+        """Test that the result is an array.array of doubles."""
+        result = evaluate_columns(compile("x + 1"), x=array('d', [1.0]))
+        assert isinstance(result, array)
+        assert result.typecode == 'd'
+
+    def test_other_sequences_are_converted(self):
+        """Test that lists and integer arrays are accepted."""
+        result = evaluate_columns(compile("x * y"), x=[1, 2], y=array('i', [3, 4]))
+        assert result.tolist() == [3.0, 8.0]
+
+    def test_constant_expression_is_broadcast(self):
+        """Test that a constant expression yields one value per row."""
+        result = evaluate_columns(compile("2 * 3"), x=array('d', [0.0] * 3))
+        assert result.tolist() == [6.0, 6.0, 6.0]
+
+    def test_variable_used_as_right_operand_of_constant(self):
+        """Test broadcasting a constant on the left of a column."""
+        result = evaluate_columns(compile("10 - x"), x=array('d', [1.0, 2.0]))
+        assert result.tolist() == [9.0, 8.0]
+
+    @pytest.mark.parametrize("expression", ["x", "x * 1"])
+    def test_result_is_not_the_input_column(self, expression):
+        """Test that changing the result leaves the input column alone."""
+        column = array('d', [1.0, 2.0])
+        result = evaluate_columns(compile(expression), x=column)
+        result[0] = 5.0
+        assert column.tolist() == [1.0, 2.0]
+
+    def test_registered_functions(self):
+        """Test calls of registered functions with several arguments."""
+        registry = default_registry.copy()
+        registry.add_function('clamp', lambda x, low, high: max(low, min(high, x)))
+        compiled = Parser(registry=registry).compile("clamp(x, 0, 10)")
+        result = evaluate_columns(compiled, x=array('d', [-1.0, 5.0, 20.0]))
+        assert result.tolist() == [0.0, 5.0, 10.0]
+
+    def test_division_by_zero_names_row(self):
+        """Test that division by zero reports the first offending row."""
+        with pytest.raises(ZeroDivisionError, match="at row 2"):
+            evaluate_columns(
+                compile("a / b"),
+                a=array('d', [1.0, 1.0, 1.0]),
+                b=array('d', [1.0, 2.0, 0.0]),
+            )
+
+    def test_conversion_to_float_names_row(self):
+        """Test that a result too large for a float reports its own row."""
+        registry = default_registry.copy()
+        registry.add_function('big', lambda x: 10 ** int(x))
+        compiled = Parser(registry=registry).compile("big(x)")
+        with pytest.raises(OverflowError, match="at row 1$"):
+            evaluate_columns(compiled, x=array('d', [1.0, 400.0]))
+
+    def test_factorial_overflow_names_row(self):
+        """Test that a factorial too large for a float reports its row."""
+        with pytest.raises(OverflowError, match="at row 1$"):
+            evaluate_columns(compile("x!"), x=[3, 171])
+
+    def test_row_not_found_again(self):
+        """Test that a failure no single row repeats names no row."""
+        calls = []
+
+        def flaky(x):
+            calls.append(x)
+            if len(calls) == 2:
+                raise ValueError("flaky")
+            return x
+
+        registry = default_registry.copy()
+        registry.add_function('flaky', flaky, pure=False)
+        compiled = Parser(registry=registry).compile("flaky(x)")
+        with pytest.raises(ValueError, match="^flaky$"):
+            evaluate_columns(compiled, x=array('d', [1.0, 2.0]))
+
+    def test_missing_column(self):
+        """Test that a missing column raises NameError."""
+        with pytest.raises(NameError):
+            evaluate_columns(compile("a + b"), a=array('d', [1.0]))
+
+    def test_columns_of_different_lengths(self):
+        """Test that columns of different lengths raise ValueError."""
+        with pytest.raises(ValueError):
+            evaluate_columns(
+                compile("a + b"), a=array('d', [1.0]), b=array('d', [1.0, 2.0])
+            )
+
+
+class TestEvaluateStream:
+    """Tests for the evaluate_stream function."""
+
+    def test_yields_results_in_order(self):
+        """Test that results come out in input order."""
+        assert list(evaluate_stream(["1 + 1", "2 * 3"])) == [2.0, 6.0]
+
+    def test_yields_errors_in_place(self):
+        """Test that failures are yielded rather than raised."""
+        results = list(evaluate_stream(["1 / 0", "2 + * 3", "4"]))
+        assert isinstance(results[0], ZeroDivisionError)
+        assert isinstance(results[1], SyntaxError)
+        assert results[2] == 4.0
+
+    def test_is_lazy(self):
+        """Test that expressions are consumed one at a time."""
+        def expressions():
+            yield "1 + 1"
+            raise AssertionError("read too far")
+
+        assert next(evaluate_stream(expressions())) == 2.0
+
+
+class TestEvaluateCodes:
+    """Tests for the evaluate_codes function."""
+
+    def test_results_and_codes(self):
+        """Test that each expression gets a result or an error code."""
+        results, codes, positions = evaluate_codes(["1 + 1", "1 / 0", "2 * 3"])
+        assert results[0] == 2.0 and results[2] == 6.0
+        assert math.isnan(results[1])
+        assert codes.tolist() == [batch.OK, batch.DIVISION_BY_ZERO, batch.OK]
+        assert positions.tolist() == [-1, -1, -1]
+
+    def test_compact_arrays(self):
+        """Test that the results, codes and positions are typed arrays."""
+        results, codes, positions = evaluate_codes(["1"])
+        assert (results.typecode, codes.typecode, positions.typecode) == (
+            'd',
+            'B',
+            'q',
+        )
+
+    @pytest.mark.parametrize(
+        "expression, code, position",
+        [
+            ("2 + * 3", batch.SYNTAX, 4),
+            ("2 +", batch.SYNTAX, 3),
+            ("", batch.SYNTAX, -1),
+            ("(1 + 2", batch.MISMATCHED_PARENS, 0),
+            ("1 + 2)", batch.MISMATCHED_PARENS, 5),
+            ("2 @ 3", batch.INVALID_CHARACTER, 2),
+            ("2 * foo(1)", batch.UNKNOWN_FUNCTION, 4),
+            ("2 * rate", batch.UNDEFINED_VARIABLE, 4),
+            ("5 % 0", batch.DIVISION_BY_ZERO, -1),
+            ("sqrt(-1)", batch.DOMAIN, -1),
+            ("pow(-8, 1 / 3)", batch.DOMAIN, -1),
+            ("ln(0)", batch.DOMAIN, -1),
+            ("log(8, 1)", batch.DOMAIN, -1),
+            ("10 ^ 400", batch.OVERFLOW, -1),
+        ],
+    )
+    def test_error_codes(self, expression, code, position):
+        """Test the code and position of each kind of failure."""
+        _, codes, positions = evaluate_codes([expression])
+        assert ERROR_NAMES[codes[0]] == ERROR_NAMES[code]
+        assert positions[0] == position
+
+    def test_positions_are_in_the_original_text(self):
+        """Test that positions count whitespace that compiling collapses."""
+        _, _, positions = evaluate_codes(["  2 +\t\t*  3\n"])
+        assert positions[0] == 7
+
+    def test_limits(self):
+        """Test that a parser's limits are reported as an error code."""
+        parser = Parser(limits=Limits(max_depth=2))
+        _, codes, positions = evaluate_codes(["((1))", "(((1)))"], parser)
+        assert codes.tolist() == [batch.OK, batch.LIMIT_EXCEEDED]
+        assert positions[1] == 2
+
+    def test_repeated_errors_are_not_recompiled(self):
+        """Test that a malformed expression is parsed once per batch."""
+        parser = Parser()
+        calls = []
+        compile_expression = parser.compile
+
+        def counting(expression):
+            calls.append(expression)
+            return compile_expression(expression)
+
+        parser.compile = counting
+        _, codes, _ = evaluate_codes(["2 + * 3", "1", "2 + * 3"], parser)
+        assert codes.tolist() == [batch.SYNTAX, batch.OK, batch.SYNTAX]
+        assert calls == ["2 + * 3", "1"]
+
+    def test_repeated_failures_are_not_reevaluated(self):
+        """Test that a line failing in evaluation is evaluated once per batch."""
+        parser = Parser()
+        calls = []
+        compile_expression = parser.compile
+
+        def counting(expression):
+            compiled = compile_expression(expression)
+            calls.append(expression)
+            return compiled
+
+        parser.compile = counting
+        results, codes, _ = evaluate_codes(["1 / 0", "2", "1 / 0", "2"], parser)
+        assert codes.tolist() == [batch.DIVISION_BY_ZERO, batch.OK] * 2
+        assert results[3] == 2.0
+        assert calls == ["1 / 0", "2"]
+
+    def test_non_real_results(self):
+        """Test that a complex result is a domain error, not a failed batch."""
+        registry = default_registry.copy()
+        registry.add_function('root', lambda x: x ** 0.5)
+        parser = Parser(registry=registry)
+        results, codes, _ = evaluate_codes(["root(-4)", "root(4)"], parser)
+        assert codes.tolist() == [batch.DOMAIN, batch.OK]
+        assert results[1] == 2.0
+
+    def test_error_names(self):
+        """Test that every error code has a name."""
+        assert ERROR_NAMES[batch.OK] == 'ok'
+        assert ERROR_NAMES[batch.LIMIT_EXCEEDED] == 'limit_exceeded'
+
+
+class TestEvaluateMany:
+    """Tests for the evaluate_many function."""
+
+    def test_single_worker(self):
+        """Test evaluation in the current process."""
+        assert list(evaluate_many(["1 + 1", "2 * 3"], workers=1)) == [2.0, 6.0]
+
+    def test_multiple_workers_keep_input_order(self):
+        """Test that results from worker processes come back in input order."""
+        expressions = [f"{i} * 2" for i in range(50)]
+        results = list(evaluate_many(expressions, workers=2, chunk_size=7))
+        assert results == [i * 2.0 for i in range(50)]
+
+    def test_multiple_workers_yield_errors_in_place(self):
+        """Test that failures from worker processes are yielded in place."""
+        results = list(evaluate_many(["1 / 0", "2 + 2"], workers=2, chunk_size=1))
+        assert isinstance(results[0], ZeroDivisionError)
+        assert results[1] == 4.0
+
+    def test_accepts_generators(self):
+        """Test that a lazy iterable of expressions is accepted."""
+        expressions = (f"{i} + 1" for i in range(5))
+        results = list(evaluate_many(expressions, workers=2, chunk_size=2))
+        assert results == [1.0, 2.0, 3.0, 4.0, 5.0]
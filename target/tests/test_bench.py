@@ -0,0 +1,175 @@
+"""Tests for calculator bench module."""
+
+import itertools
+import json
+import random
+import threading
+import time
+
+import pytest
+
+from calculator import bench, operations
+from calculator.parser import Parser
+
+
+class TestGenerators:
+    """Tests for the synthetic expression generators."""
+
+    @pytest.mark.parametrize(
+        'generate',
+        [bench.short_expression, bench.long_expression, bench.nested_expression],
+    )
+    def test_generated_expressions_compile(self, generate):
+        """Test that generated expressions are valid."""
+        expression = generate(random.Random(0))
+        compiled = Parser().compile(expression)
+        assert set(compiled.variables) <= set(bench._VARIABLES)
+
+    def test_generators_are_deterministic(self):
+        """Test that the same seed generates the same expression."""
+        assert bench.long_expression(random.Random(1)) == bench.long_expression(
+            random.Random(1)
+        )
+
+    def test_nested_depth(self):
+        """Test that nested expressions have the requested depth."""
+        expression = bench.nested_expression(random.Random(0), depth=7)
+        assert expression.count('(') == 7
+
+
+class TestRegistry:
+    """Tests for the registered benchmarks."""
+
+    def test_every_operation_is_covered(self):
+        """Test that every function in calculator.operations has a benchmark."""
+        functions = {
+            name
+            for name, value in vars(operations).items()
+            if callable(value) and value.__module__ == operations.__name__
+        }
+        covered = {
+            name.split('.', 1)[1]
+            for name in bench.BENCHMARKS
+            if name.startswith('operations.')
+        }
+        assert functions == covered
+
+    def test_thread_benchmark_stops_its_threads(self):
+        """Test that closing a thread benchmark joins its worker threads."""
+        before = threading.active_count()
+        setup, _ = bench.BENCHMARKS['threads.parse.2']
+        run = setup()
+        run()
+        assert threading.active_count() == before + 2
+        run.close()
+        assert threading.active_count() == before
+
+    def test_parser_phases_cover_every_shape(self):
+        """Test that each parser phase is benchmarked for each shape."""
+        for shape in bench._SHAPES:
+            assert f'parser.tokenize.{shape}' in bench.BENCHMARKS
+            assert f'parser.evaluate.{shape}' in bench.BENCHMARKS
+
+
+class TestMeasure:
+    """Tests for the measure function."""
+
+    def test_result_fields(self):
+        """Test that a measurement reports rate, latency and memory."""
+        result = bench.measure(lambda: None, min_time=0.01, samples=5)
+        assert result['ops_per_sec'] > 0
+        assert 0 < result['p50_us'] <= result['p99_us']
+        assert result['peak_memory_bytes'] >= 0
+        assert 'items_per_sec' not in result
+
+    def test_percentiles_are_of_single_calls(self):
+        """Test that one slow call in ten shows in p99 but not in p50."""
+        calls = itertools.count()
+
+        def func():
+            if next(calls) % 10 == 0:
+                time.sleep(0.002)
+
+        result = bench.measure(func, min_time=0.05, samples=5)
+        assert result['p50_us'] < 1000 <= result['p99_us']
+
+    def test_items_per_sec(self):
+        """Test that throughput benchmarks report items per second."""
+        result = bench.measure(lambda: None, items=10, min_time=0.01, samples=3)
+        assert result['items_per_sec'] == pytest.approx(result['ops_per_sec'] * 10)
+
+    def test_peak_memory(self):
+        """Test that allocations show up in the peak memory."""
+        result = bench.measure(lambda: bytearray(1 << 20), min_time=0.01, samples=3)
+        assert result['peak_memory_bytes'] >= 1 << 20
+
+
+class TestCompare:
+    """Tests for the compare function."""
+
+    @staticmethod
+    def report(**rates):
+        return {
+            'results': {name: {'ops_per_sec': rate} for name, rate in rates.items()}
+        }
+
+    def test_flags_regressions(self):
+        """Test that slowdowns beyond the threshold are flagged."""
+        baseline = self.report(a=100.0, b=100.0, c=100.0)
+        current = self.report(a=95.0, b=80.0, c=150.0)
+        assert bench.compare(current, baseline, 0.10) == [('b', 100.0, 80.0)]
+
+    def test_ignores_new_benchmarks(self):
+        """Test that benchmarks missing from the baseline are not flagged."""
+        assert bench.compare(self.report(a=1.0), self.report(), 0.10) == []
+
+    def test_import_time_budget_and_growth(self):
+        """Test that import times are flagged above budget or when grown."""
+
+        def report(**times):
+            return {
+                'results': {
+                    name: {'import_time_us': time, 'budget_us': 1000}
+                    for name, time in times.items()
+                }
+            }
+
+        baseline = report(a=500, b=500, c=500)
+        current = report(a=540, b=600, c=2000, d=1500)
+        assert bench.compare(current, baseline, 0.10) == [
+            ('b', 500, 600),
+            ('c', 1000, 2000),
+            ('d', 1000, 1500),
+        ]
+
+
+class TestMain:
+    """Tests for the command-line entry point."""
+
+    def test_list(self, capsys):
+        """Test that --list prints the benchmark names."""
+        assert bench.main(['--list']) == 0
+        assert 'operations.add' in capsys.readouterr().out.split()
+
+    def test_writes_json_report(self, tmp_path):
+        """Test that --output writes a JSON report of the selected benchmarks."""
+        output = tmp_path / 'report.json'
+        code = bench.main(
+            ['--quick', '--filter', 'operations.add', '--output', str(output)]
+        )
+        assert code == 0
+        report = json.loads(output.read_text())
+        assert list(report['results']) == ['operations.add']
+        assert 'python' in report['meta']
+
+    def test_compare_exit_code(self, tmp_path, capsys):
+        """Test that a regression against the baseline exits with 1."""
+        baseline = tmp_path / 'baseline.json'
+        baseline.write_text(
+            json.dumps({'results': {'operations.add': {'ops_per_sec': 1e15}}})
+        )
+        code = bench.main(
+            ['--quick', '--filter', 'operations.add', '--compare', str(baseline)]
+        )
+        assert code == 1
+        assert 'REGRESSION operations.add' in capsys.readouterr().err
@@ -0,0 +1,180 @@
+"""Tests for calculator cache module."""
+
+import random
+import sys
+import threading
+
+import pytest
+
+from calculator.cache import ConcurrentCache, LRUCache
+
+
+class TestLRUCache:
+    """Tests for the LRUCache class."""
+
+    def test_get_missing_returns_default(self):
+        """Test that a missing key returns the default."""
+        cache = LRUCache(2)
+        assert cache.get('a') is None
+        assert cache.get('a', 0) == 0
+
+    def test_put_and_get(self):
+        """Test that stored values can be retrieved."""
+        cache = LRUCache(2)
+        cache.put('a', 1)
+        assert cache.get('a') == 1
+        assert 'a' in cache
+        assert len(cache) == 1
+
+    def test_evicts_least_recently_used(self):
+        """Test that the least recently used entry is evicted first."""
+        cache = LRUCache(2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        cache.get('a')
+        cache.put('c', 3)
+        assert 'a' in cache
+        assert 'b' not in cache
+        assert 'c' in cache
+
+    def test_counters(self):
+        """Test that hits, misses and evictions are counted."""
+        cache = LRUCache(1)
+        cache.get('a')
+        cache.put('a', 1)
+        cache.get('a')
+        cache.put('b', 2)
+        assert cache.stats() == {
+            'size': 1,
+            'capacity': 1,
+            'hits': 1,
+            'misses': 1,
+            'evictions': 1,
+        }
+
+    def test_clear(self):
+        """Test that clear removes entries and resets counters."""
+        cache = LRUCache(2)
+        cache.put('a', 1)
+        cache.get('a')
+        cache.clear()
+        assert len(cache) == 0
+        assert cache.hits == 0
+        assert cache.misses == 0
+
+    def test_shrinking_capacity_evicts(self):
+        """Test that reducing the capacity evicts the oldest entries."""
+        cache = LRUCache(3)
+        for key in 'abc':
+            cache.put(key, key)
+        cache.capacity = 1
+        assert len(cache) == 1
+        assert 'c' in cache
+        assert cache.evictions == 2
+
+    def test_invalid_capacity(self):
+        """Test that a capacity below 1 raises ValueError."""
+        with pytest.raises(ValueError):
+            LRUCache(0)
+
+
+class TestConcurrentCache:
+    """Tests for the ConcurrentCache class."""
+
+    def test_put_and_get(self):
+        """Test that stored values can be retrieved."""
+        cache = ConcurrentCache(8)
+        assert cache.get('a', 0) == 0
+        cache.put('a', 1)
+        cache.put('a', 2)
+        assert cache.get('a') == 2
+        assert 'a' in cache
+        assert len(cache) == 1
+
+    def test_capacity_is_respected(self):
+        """Test that the cache never holds more than its capacity."""
+        cache = ConcurrentCache(100)
+        for i in range(1000):
+            cache.put(i, i)
+        assert len(cache) == 100
+        assert cache.evictions == 900
+
+    def test_clock_keeps_used_entries(self):
+        """Test that entries used since the hand passed survive eviction."""
+        cache = ConcurrentCache(2, stripes=1)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        cache.get('a')
+        cache.put('c', 3)
+        assert 'a' in cache
+        assert 'b' not in cache
+        assert 'c' in cache
+
+    def test_stripes(self):
+        """Test that stripes are a power of two no larger than capacity."""
+        assert len(ConcurrentCache(1024, stripes=12)._stripes) == 8
+        assert len(ConcurrentCache(3)._stripes) == 2
+        with pytest.raises(ValueError):
+            ConcurrentCache(8, stripes=0)
+
+    def test_counters_and_clear(self):
+        """Test that counters add up over the stripes and clear resets them."""
+        cache = ConcurrentCache(1)
+        cache.get('a')
+        cache.put('a', 1)
+        cache.get('a')
+        cache.put('b', 2)
+        assert cache.stats() == {
+            'size': 1,
+            'capacity': 1,
+            'hits': 1,
+            'misses': 1,
+            'evictions': 1,
+        }
+        cache.clear()
+        assert cache.stats()['size'] == cache.hits == cache.misses == 0
+
+    def test_shrinking_capacity_evicts(self):
+        """Test that reducing the capacity evicts entries."""
+        cache = ConcurrentCache(64)
+        for i in range(64):
+            cache.put(i, i)
+        cache.capacity = 4
+        assert len(cache) == 4
+        cache.capacity = 64
+        for i in range(64):
+            cache.put(i, i)
+        assert len(cache) == 64
+
+    def test_many_threads(self):
+        """Stress test: threads reading and writing never see wrong values."""
+        cache = ConcurrentCache(64)
+        errors = []
+        barrier = threading.Barrier(16)
+
+        def work(seed):
+            rng = random.Random(seed)
+            barrier.wait()
+            try:
+                for _ in range(5000):
+                    key = rng.randrange(256)
+                    value = cache.get(key)
+                    if value is None:
+                        cache.put(key, key * 2)
+                    elif value != key * 2:
+                        errors.append((key, value))
+            except Exception as e:
+                errors.append(e)
+
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        try:
+            threads = [threading.Thread(target=work, args=(i,)) for i in range(16)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            sys.setswitchinterval(interval)
+        assert errors == []
+        assert len(cache) <= 64
@@ -1,10 +1,19 @@
 """Tests for calculator CLI module."""
 
+import os
+import subprocess
+import sys
 from io import StringIO
 from unittest import mock
 
+import pytest
+
+from calculator import bench, cli, metrics, profiling
 from calculator.cli import main, repl
 
+# The directory holding the calculator package.
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
 
 class TestNonInteractiveMode:
     """Tests for non-interactive mode."""
@@ -149,3 +158,199 @@ class TestMainWithNoArgs:
             result = main([])
             assert result == 0
             mock_repl.assert_called_once()
+
+
+class TestBatchMode:
+    """Tests for batch mode."""
+
+    def run_batch(self, args, stdin=''):
+        """Run main with the given args and stdin, capturing output."""
+        with mock.patch('sys.stdin', StringIO(stdin)):
+            with mock.patch('sys.stdout', new_callable=StringIO) as mock_stdout:
+                with mock.patch('sys.stderr', new_callable=StringIO) as mock_stderr:
+                    result = main(args)
+        return result, mock_stdout.getvalue(), mock_stderr.getvalue()
+
+    def test_reads_stdin_by_default(self):
+        """Test that --batch without a file reads stdin."""
+        result, stdout, _ = self.run_batch(['--batch'], "2 + 3\n10 / 4\n")
+        assert result == 0
+        assert stdout == "5.0\n2.5\n"
+
+    def test_reads_stdin_with_dash(self):
+        """Test that --batch - reads stdin."""
+        result, stdout, _ = self.run_batch(['--batch', '-'], "1 + 1\n")
+        assert result == 0
+        assert stdout == "2.0\n"
+
+    def test_reads_file(self, tmp_path):
+        """Test that --batch FILE reads expressions from the file."""
+        path = tmp_path / "expressions.txt"
+        path.write_text("2 * 3\n(1 + 2) * 4\n")
+        result, stdout, _ = self.run_batch(['--batch', str(path)])
+        assert result == 0
+        assert stdout == "6.0\n12.0\n"
+
+    def test_missing_file(self, tmp_path):
+        """Test that a missing file returns exit code 1."""
+        result, _, stderr = self.run_batch(['--batch', str(tmp_path / "none")])
+        assert result == 1
+        assert 'Error:' in stderr
+
+    def test_emit_error_policy(self):
+        """Test that the emit policy writes an error line in place."""
+        result, stdout, _ = self.run_batch(['--batch'], "1 / 0\n2 + 2\n")
+        assert result == 0
+        lines = stdout.splitlines()
+        assert lines[0].startswith('Error:')
+        assert lines[1] == '4.0'
+
+    def test_skip_error_policy(self):
+        """Test that the skip policy drops failing expressions."""
+        result, stdout, _ = self.run_batch(
+            ['--batch', '--on-error', 'skip'], "2 + + 3\n2 + 2\n"
+        )
+        assert result == 0
+        assert stdout == "4.0\n"
+
+    def test_abort_error_policy(self):
+        """Test that the abort policy stops at the first failure."""
+        result, stdout, stderr = self.run_batch(
+            ['--batch', '--on-error', 'abort'], "1 + 1\n1 / 0\n2 + 2\n"
+        )
+        assert result == 1
+        assert stdout == "2.0\n"
+        assert 'line 2' in stderr
+
+    def test_small_chunks(self):
+        """Test that output is complete when written in small chunks."""
+        stdin = "".join(f"{i} + 1\n" for i in range(10))
+        result, stdout, _ = self.run_batch(['--batch', '--chunk-size', '3'], stdin)
+        assert result == 0
+        assert stdout.splitlines() == [f"{i + 1}.0" for i in range(10)]
+
+    def test_parallel_jobs(self):
+        """Test that --jobs evaluates in worker processes in input order."""
+        stdin = "".join(f"{i} * 3\n" for i in range(20))
+        result, stdout, _ = self.run_batch(['--batch', '--jobs', '2'], stdin)
+        assert result == 0
+        assert stdout.splitlines() == [f"{i * 3}.0" for i in range(20)]
+
+    def test_negative_jobs(self):
+        """Test that a negative number of jobs is rejected."""
+        with mock.patch('sys.stderr', new_callable=StringIO) as mock_stderr:
+            with pytest.raises(SystemExit):
+                main(['--batch', '--jobs', '-1'])
+        assert "--jobs must be at least 0" in mock_stderr.getvalue()
+
+    def test_invalid_error_policy(self):
+        """Test that an unknown error policy is rejected."""
+        with pytest.raises(SystemExit):
+            self.run_batch(['--batch', '--on-error', 'ignore'])
+
+    def test_stats(self):
+        """Test that --stats prints phase timings and errors at exit."""
+        metrics.reset()
+        result, stdout, stderr = self.run_batch(
+            ['--stats', '--batch'], "7 * 191\n7 * 191\n1 / 0\n"
+        )
+        assert result == 0
+        assert stdout.splitlines()[:2] == ["1337.0", "1337.0"]
+        assert not metrics.enabled
+        assert stderr.splitlines()[0].split()[:2] == ['phase', 'count']
+        lines = stderr.splitlines()
+        assert any(line.split()[:2] == ['evaluate', '3'] for line in lines)
+        assert "ZeroDivisionError" in stderr
+
+    def test_profile(self, tmp_path):
+        """Test that --profile writes results and reports costs to stderr."""
+        output = tmp_path / 'batch.collapsed'
+        result, stdout, stderr = self.run_batch(
+            [
+                '--batch',
+                '--profile',
+                '--profile-output',
+                str(output),
+                '--profile-format',
+                'collapsed',
+            ],
+            "2 * (3 + 4)\n1 / 0\n",
+        )
+        assert result == 0
+        assert stdout.splitlines()[0] == "14.0"
+        assert stderr.startswith("Profiled 2 expressions")
+        assert output.read_text()
+
+    def test_profile_requires_batch(self):
+        """Test that --profile is only accepted for batch runs."""
+        with pytest.raises(SystemExit):
+            self.run_batch(['--profile', '1 + 1'])
+
+
+class TestStartup:
+    """Tests for the cost of starting the CLI."""
+
+    def test_one_shot_imports_no_heavy_modules(self):
+        """Test that evaluating one expression imports only what it needs."""
+        path = os.environ.get('PYTHONPATH')
+        env = dict(
+            os.environ,
+            PYTHONPATH=PROJECT_ROOT if not path else PROJECT_ROOT + os.pathsep + path,
+        )
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-m', 'calculator', '1 + 1'],
+            check=True,
+            capture_output=True,
+            text=True,
+            cwd=PROJECT_ROOT,
+            env=env,
+        )
+        assert result.stdout == "2.0\n"
+        modules = {line.split('|')[-1].strip() for line in result.stderr.splitlines()}
+        heavy = {
+            'argparse',
+            'concurrent.futures',
+            'inspect',
+            'multiprocessing',
+            'numpy',
+            're',
+            'threading',
+            'typing',
+        }
+        assert 'calculator.parser' in modules
+        assert modules.isdisjoint(heavy)
+
+    def test_options_do_not_import_profiling(self):
+        """Test that parsing options without --profile skips the profiler."""
+        path = os.environ.get('PYTHONPATH')
+        env = dict(
+            os.environ,
+            PYTHONPATH=PROJECT_ROOT if not path else PROJECT_ROOT + os.pathsep + path,
+        )
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-m', 'calculator', '--batch', '-'],
+            check=True,
+            capture_output=True,
+            input="1 + 1\n",
+            text=True,
+            cwd=PROJECT_ROOT,
+            env=env,
+        )
+        assert result.stdout == "2.0\n"
+        modules = {line.split('|')[-1].strip() for line in result.stderr.splitlines()}
+        assert modules.isdisjoint({'cProfile', 'calculator.profiling', 'typing'})
+
+    def test_profile_defaults_match_profiling(self):
+        """Test that the CLI's copies of the profiling defaults are current."""
+        assert cli.PROFILE_FORMATS == profiling.PROFILE_FORMATS
+        assert cli.DEFAULT_PROFILE_TOP == profiling.DEFAULT_TOP
+
+    # Wall-clock time depends on the machine and its load, so this is opt-in;
+    # the budget is always checked by `python -m calculator.bench --compare`.
+    @pytest.mark.skipif(
+        not os.environ.get('CALCULATOR_TIMING_TESTS'),
+        reason="set CALCULATOR_TIMING_TESTS=1 to check timing budgets",
+    )
+    def test_import_time_budget(self):
+        """Test that imports stay within the startup budget."""
+        assert bench.import_time()['import_time_us'] < bench.IMPORT_BUDGET_US
@@ -0,0 +1,139 @@
+"""Tests for calculator codegen module."""
+
+import random
+
+import pytest
+
+from calculator.bench import long_expression, nested_expression
+from calculator.codegen import compile_fn, generate, to_function
+from calculator.parser import Parser, compile
+from calculator.registry import default_registry
+
+
+class TestCompileFn:
+    """Tests for the compile_fn function."""
+
+    def test_positional_and_keyword_arguments(self):
+        """Test calling with variables in order of first use or by name."""
+        function = compile_fn("a * b + c")
+        assert function(2, 3, 4) == 10.0
+        assert function(c=4, b=3, a=2) == 10.0
+
+    def test_returns_float(self):
+        """Test that results are floats, as from evaluate()."""
+        assert type(compile_fn("a + 1")(1)) is float
+
+    def test_constant_expression(self):
+        """Test an expression without variables."""
+        assert compile_fn("2 ^ 10 - 3!")() == 1018.0
+
+    def test_docstring_is_source(self):
+        """Test that the function documents the expression it computes."""
+        assert compile_fn("a  *  b").__doc__ == "a * b"
+
+    @pytest.mark.parametrize(
+        'expression',
+        [
+            "-x * (y - 3) / 4",
+            "(x * y + 1) * (x * y + 1) - x * y",
+            "sqrt(x) + log(y, 2) - sin(x) * cos(y) + x % 3 + y ^ 2",
+            "2 * pi * x + e",
+            "- -x",
+        ],
+    )
+    def test_matches_evaluate(self, expression):
+        """Test that generated functions agree with the interpreter."""
+        compiled = compile(expression)
+        function = to_function(compiled)
+        for x, y in [(1.5, 2.5), (4.0, 0.5), (9.0, 3.0)]:
+            values = {'x': x, 'y': y}
+            values = {name: values[name] for name in compiled.variables}
+            assert function(**values) == pytest.approx(compiled.evaluate(**values))
+
+    def test_long_and_deeply_nested_expressions(self):
+        """Test expressions beyond the nesting limits of Python's compiler."""
+        for expression in [
+            long_expression(random.Random(0), terms=2000),
+            nested_expression(random.Random(0), depth=1000),
+        ]:
+            compiled = compile(expression)
+            values = {name: 1.5 for name in compiled.variables}
+            function = to_function(compiled)
+            assert function(**values) == pytest.approx(compiled.evaluate(**values))
+
+
+class TestErrors:
+    """Tests for errors raised by generated functions."""
+
+    def test_division_by_zero(self):
+        """Test that division by zero raises ZeroDivisionError."""
+        with pytest.raises(ZeroDivisionError):
+            compile_fn("a / b")(1, 0)
+
+    def test_modulo_by_zero(self):
+        """Test that modulo keeps the message of operations.modulo."""
+        with pytest.raises(ZeroDivisionError, match="modulo by zero"):
+            compile_fn("a % b")(1, 0)
+
+    def test_domain_error(self):
+        """Test that function domain errors propagate."""
+        with pytest.raises(ValueError, match="square root of negative"):
+            compile_fn("sqrt(x)")(-1)
+
+    def test_missing_argument(self):
+        """Test that a missing variable is a TypeError."""
+        with pytest.raises(TypeError):
+            compile_fn("a + b")(1)
+
+
+class TestGenerate:
+    """Tests for the generated source."""
+
+    def test_native_operators(self):
+        """Test that arithmetic compiles to Python operators."""
+        source, _ = generate(compile("a * b + c"))
+        assert source == (
+            "def _expression(a, b, c):\n"
+            "    return _float(((a * b) + c))\n"
+        )
+
+    def test_shared_subexpression_is_assigned_once(self):
+        """Test that shared subexpressions are computed once."""
+        source, _ = generate(compile("(a * b + 1) * (a * b + 1)"))
+        assert "    _s0 = ((a * b) + (1.0))\n" in source
+        assert "(_s0 * _s0)" in source
+
+    def test_functions_and_constants_come_from_globals(self):
+        """Test that callables are bound through the function's globals."""
+        source, namespace = generate(compile("sqrt(x) * 2"))
+        assert namespace['__builtins__'] == {}
+        assert "_f0(x)" in source
+        assert namespace['_f0'] is default_registry.functions['sqrt'].func
+
+    def test_unsafe_variable_names(self):
+        """Test that keywords and reserved names are not used as parameters."""
+        compiled = Parser().compile("lambda + _t0 * x")
+        source, _ = generate(compiled)
+        assert source.startswith("def _expression(_p0, _p1, x):")
+        assert to_function(compiled)(1, 2, x=3) == 7.0
+
+    def test_variables_named_like_generated_globals(self):
+        """Test that variables cannot shadow the function's own names."""
+        compiled = Parser().compile("_float + _expression")
+        source, _ = generate(compiled)
+        assert source.startswith("def _expression(_p0, _p1):")
+        assert to_function(compiled)(2, 3) == 5.0
+
+    def test_registered_functions(self):
+        """Test calls of functions with several arguments."""
+        registry = default_registry.copy()
+        registry.add_function('clamp', lambda x, low, high: max(low, min(high, x)))
+        function = Parser(registry=registry).compile("clamp(x, 0, 10)").to_function()
+        assert [function(x) for x in (-1, 5, 20)] == [0.0, 5.0, 10.0]
+
+    def test_non_finite_constants(self):
+        """Test that constants without a literal form are bound as globals."""
+        registry = default_registry.copy()
+        registry.add_constant('inf', float('inf'))
+        compiled = Parser(registry=registry).compile("x + inf")
+        assert to_function(compiled)(1) == float('inf')
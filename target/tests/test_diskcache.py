@@ -0,0 +1,199 @@
+"""Tests for calculator diskcache module."""
+
+import random
+import struct
+
+import pytest
+
+from calculator import diskcache
+from calculator.bench import long_expression, short_expression
+from calculator.diskcache import DiskCache, save
+from calculator.parser import _PUSH, CompiledExpression, Parser
+from calculator.registry import default_registry
+
+EXPRESSIONS = [
+    "2 + 3 * 4",
+    "price * (1 + tax)",
+    "(a * b + 1) * (a * b + 1)",
+    "sqrt(x) + log(y, 2) - x % 3 + y ^ 2 + 3!",
+    "-x * pi",
+]
+
+
+@pytest.fixture
+def path(tmp_path):
+    """A disk cache file holding EXPRESSIONS."""
+    path = tmp_path / 'expressions.calc'
+    save(path, EXPRESSIONS)
+    return path
+
+
+def clamp(x, low, high):
+    """Limit x to the range [low, high]."""
+    return max(low, min(high, x))
+
+
+class TestRoundTrip:
+    """Tests for saving and loading compiled expressions."""
+
+    def test_programs_match(self, path):
+        """Test that loaded expressions are the ones that were saved."""
+        parser = Parser()
+        with DiskCache(path) as cache:
+            assert len(cache) == len(EXPRESSIONS)
+            for expression in EXPRESSIONS:
+                loaded = cache.get(expression)
+                compiled = parser.compile(expression)
+                assert loaded.source == compiled.source
+                assert loaded.variables == compiled.variables
+                assert loaded.disassemble() == compiled.disassemble()
+
+    def test_evaluate(self, path):
+        """Test that loaded expressions evaluate like freshly compiled ones."""
+        with DiskCache(path) as cache:
+            assert cache.get("2 + 3 * 4").evaluate() == 14.0
+            assert cache.get("price * (1 + tax)").evaluate(10, 0.5) == 15.0
+
+    def test_generated_expressions(self, tmp_path):
+        """Test a larger catalog of long expressions."""
+        rng = random.Random(0)
+        expressions = [short_expression(rng) for _ in range(200)]
+        expressions += [long_expression(rng, terms=50) for _ in range(20)]
+        path = tmp_path / 'catalog.calc'
+        count = save(path, expressions)
+        parser = Parser()
+        with DiskCache(path) as cache:
+            assert len(cache) == count
+            for expression in expressions:
+                source = ' '.join(expression.split())
+                assert cache.get(source).disassemble() == (
+                    parser.compile(expression).disassemble()
+                )
+
+    def test_compiled_expressions_and_duplicates(self, tmp_path):
+        """Test that compiled expressions are accepted and stored once."""
+        path = tmp_path / 'expressions.calc'
+        assert save(path, ["1 + x", "1  +  x", Parser().compile("1 + x")]) == 1
+
+    def test_integer_constants(self, tmp_path):
+        """Test that integer constants keep their type."""
+        path = tmp_path / 'expressions.calc'
+        save(path, [CompiledExpression("?", ((_PUSH, 7),))])
+        with DiskCache(path) as cache:
+            assert cache.get("?").evaluate() == 7
+
+    def test_large_integer_constants(self, tmp_path):
+        """Test that folded ints beyond 64 bits are stored exactly."""
+        path = tmp_path / 'expressions.calc'
+        big = CompiledExpression("?", ((_PUSH, -(3**100)),))
+        save(path, ["x + 21!", big])
+        with DiskCache(path) as cache:
+            assert cache.get("x + 21!").evaluate(x=1) == 51090942171709440001.0
+            assert cache.get("?")._program == ((_PUSH, -(3**100)),)
+
+    def test_registered_functions(self, tmp_path):
+        """Test that functions of a custom registry are resolved by name."""
+        registry = default_registry.copy()
+        registry.add_function('clamp', clamp)
+        path = tmp_path / 'expressions.calc'
+        save(path, ["clamp(x, 0, 10) * 2"], Parser(registry=registry))
+        with DiskCache(path, registry=registry) as cache:
+            assert cache.get("clamp(x, 0, 10) * 2").evaluate(x=12) == 20.0
+
+
+class TestLookups:
+    """Tests for looking expressions up."""
+
+    def test_decoded_once(self, path):
+        """Test that expressions are decoded on first use, then kept."""
+        with DiskCache(path) as cache:
+            assert cache.stats()['memory'] == 0
+            first = cache.get("-x * pi")
+            assert cache.get("-x * pi") is first
+            assert cache.get("x") is None
+            assert cache.stats() == {
+                'size': len(EXPRESSIONS),
+                'memory': 1,
+                'hits': 1,
+                'loads': 1,
+                'misses': 1,
+            }
+
+    def test_as_parser_cache(self, path):
+        """Test that a parser compiles only what the file lacks."""
+        with DiskCache(path) as cache:
+            parser = Parser(cache=cache)
+            assert parser.parse("2  +  3 * 4") == 14.0
+            assert parser.compile("x + 1") is parser.compile("x + 1")
+            assert "x + 1" in cache
+            assert cache.loads == 1
+
+    def test_hash_collisions(self, tmp_path, monkeypatch):
+        """Test that sources sharing a hash are told apart."""
+        monkeypatch.setattr(diskcache, '_hash', lambda source: 42)
+        path = tmp_path / 'expressions.calc'
+        save(path, EXPRESSIONS)
+        with DiskCache(path) as cache:
+            for expression in EXPRESSIONS:
+                assert cache.get(expression).source == expression
+            assert cache.get("1 + 1") is None
+
+    def test_expressions_outlive_the_file(self, path):
+        """Test that decoded expressions remain valid after closing."""
+        cache = DiskCache(path)
+        compiled = cache.get("2 + 3 * 4")
+        cache.close()
+        assert compiled.evaluate() == 14.0
+
+
+class TestErrors:
+    """Tests for invalid files and unstorable programs."""
+
+    def test_not_a_cache_file(self, tmp_path):
+        """Test that other files are rejected."""
+        path = tmp_path / 'other.calc'
+        path.write_bytes(b'2 + 3\n')
+        with pytest.raises(ValueError, match="not a compiled-expression file"):
+            DiskCache(path)
+
+    def test_unsupported_version(self, path):
+        """Test that files of another version are rejected."""
+        data = bytearray(path.read_bytes())
+        struct.pack_into('<H', data, 8, diskcache.VERSION + 1)
+        path.write_bytes(data)
+        with pytest.raises(ValueError, match="has version 2, expected 1"):
+            DiskCache(path)
+
+    def test_truncated_file(self, path):
+        """Test that a file cut short is rejected."""
+        path.write_bytes(path.read_bytes()[:-8])
+        with pytest.raises(ValueError, match="truncated"):
+            DiskCache(path)
+
+    def test_different_registry(self, path):
+        """Test that a file cannot be read with another registry."""
+        registry = default_registry.copy()
+        registry.add_constant('pi', 3.0)
+        with pytest.raises(ValueError, match="written for a different registry"):
+            DiskCache(path, registry=registry)
+
+    def test_callable_not_in_registry(self, tmp_path):
+        """Test that programs calling unregistered callables are rejected."""
+        registry = default_registry.copy()
+        registry.add_function('clamp', clamp)
+        compiled = Parser(registry=registry).compile("clamp(x, 0, 1)")
+        with pytest.raises(ValueError, match="is not in the registry"):
+            save(tmp_path / 'expressions.calc', [compiled])
+
+    def test_unstorable_constant(self, tmp_path):
+        """Test that constants other than floats and ints are rejected."""
+        compiled = CompiledExpression("?", ((_PUSH, 'text'),))
+        with pytest.raises(ValueError, match="cannot store constant 'text'"):
+            save(tmp_path / 'expressions.calc', [compiled])
+        assert not list(tmp_path.iterdir())
+
+    def test_exact_expressions(self, tmp_path):
+        """Test that expressions of exact numeric backends are rejected."""
+        parser = Parser(numeric='fraction')
+        with pytest.raises(ValueError, match="only float expressions"):
+            save(tmp_path / 'expressions.calc', ["x + y"], parser)
@@ -0,0 +1,103 @@
+"""Tests for calculator metrics module."""
+
+import pytest
+
+from calculator import metrics
+from calculator.cache import LRUCache
+from calculator.parser import Parser
+
+
+@pytest.fixture
+def recording():
+    """Record metrics from a clean slate for the duration of a test."""
+    metrics.reset()
+    metrics.enable()
+    yield
+    metrics.disable()
+    metrics.reset()
+
+
+class TestRecording:
+    """Tests for metrics recorded by the parser."""
+
+    def test_disabled_by_default(self):
+        """Test that nothing is recorded unless enabled."""
+        metrics.reset()
+        Parser().parse("1 + 2")
+        assert metrics.snapshot() == {'phases': {}, 'errors': {}}
+
+    def test_parse_phases(self, recording):
+        """Test that parse records every phase once."""
+        assert Parser(cache=LRUCache()).parse("2 * (3 + 1 ^ 0)") == 8.0
+        phases = metrics.snapshot()['phases']
+        assert list(phases) == list(metrics.PHASES)
+        assert all(stats['count'] == 1 for stats in phases.values())
+
+    def test_cache_hits_skip_compilation(self, recording):
+        """Test that a cached expression only records the lookup."""
+        parser = Parser(cache=LRUCache())
+        parser.compile("a + b")
+        parser.compile("a  +  b")
+        phases = metrics.snapshot()['phases']
+        assert phases['cache']['count'] == 2
+        assert phases['tokenize']['count'] == 1
+
+    def test_errors_by_type(self, recording):
+        """Test that errors are counted by their original type."""
+        parser = Parser()
+        for expression in ("1 / 0", "sqrt(-1)", "2 +", "   "):
+            with pytest.raises((SyntaxError, ZeroDivisionError)):
+                parser.parse(expression)
+        with pytest.raises(SyntaxError):
+            parser.compile("(1")
+        assert metrics.snapshot()['errors'] == {
+            'ZeroDivisionError': 1,
+            'ValueError': 1,
+            'ExpressionSyntaxError': 2,
+            'SyntaxError': 1,
+        }
+
+    def test_behaviour_unchanged(self, recording):
+        """Test that instrumented parsing raises the usual exceptions."""
+        parser = Parser()
+        with pytest.raises(SyntaxError, match="^empty expression$"):
+            parser.parse("")
+        with pytest.raises(SyntaxError, match="invalid expression: .*square root"):
+            parser.parse("sqrt(-1)")
+        assert parser.parse("10 % 4") == 2.0
+
+
+class TestSnapshot:
+    """Tests for snapshots and summaries."""
+
+    def test_statistics(self):
+        """Test the statistics computed from recorded latencies."""
+        metrics.reset()
+        for nanoseconds in (1000, 2000, 3000, 100_000):
+            metrics.record('tokenize', nanoseconds)
+        stats = metrics.snapshot()['phases']['tokenize']
+        metrics.reset()
+        assert stats['count'] == 4
+        assert stats['total_us'] == 106.0
+        assert stats['mean_us'] == 26.5
+        assert stats['min_us'] == 1.0
+        assert stats['max_us'] == 100.0
+        assert stats['p50_us'] == 2.048
+        assert stats['p99_us'] == 100.0
+        assert sum(stats['histogram'].values()) == 4
+
+    def test_snapshot_is_a_copy(self, recording):
+        """Test that later recordings do not change a snapshot."""
+        metrics.record('evaluate', 10)
+        before = metrics.snapshot()
+        metrics.record('evaluate', 10)
+        assert before['phases']['evaluate']['count'] == 1
+
+    def test_summary(self, recording):
+        """Test that the summary has a line per phase and per error type."""
+        metrics.record('evaluate', 1500)
+        metrics.record_error(ZeroDivisionError())
+        lines = metrics.summary().splitlines()
+        assert lines[0].split()[:2] == ['phase', 'count']
+        assert lines[1].split()[:2] == ['evaluate', '1']
+        assert lines[2:] == ["errors:", f"  {'ZeroDivisionError':<22}{1:>10}"]
@@ -0,0 +1,196 @@
+"""Tests for calculator numeric module."""
+
+import decimal
+import threading
+from decimal import Decimal
+from fractions import Fraction
+
+import pytest
+
+from calculator.numeric import DECIMAL, FRACTION, NumericBackend, backend
+from calculator.parser import ExactExpression, Parser
+from calculator.registry import default_registry
+
+
+class TestBackends:
+    """Tests for looking up and configuring backends."""
+
+    def test_names(self):
+        """Test that backends are looked up by name."""
+        assert backend('float') is None
+        assert backend('decimal') is DECIMAL
+        assert backend('fraction') is FRACTION
+        assert backend(FRACTION) is FRACTION
+
+    def test_unknown_name(self):
+        """Test that unknown names are rejected."""
+        with pytest.raises(ValueError, match="unknown numeric backend 'complex'"):
+            Parser(numeric='complex')
+
+    def test_unsupported_type(self):
+        """Test that only Decimal and Fraction backends exist."""
+        with pytest.raises(TypeError, match="no exact numeric backend"):
+            NumericBackend(int)
+
+    def test_context_is_copied(self):
+        """Test that changing a context afterwards has no effect."""
+        context = decimal.Context(prec=5)
+        parser = Parser(numeric=context)
+        context.prec = 50
+        assert parser.parse("1 / 3") == Decimal('0.33333')
+
+    def test_coerce(self):
+        """Test that floats are converted from their shortest form."""
+        assert DECIMAL.coerce(0.1) == Decimal('0.1')
+        assert FRACTION.coerce(0.1) == Fraction(1, 10)
+        assert FRACTION.coerce(3) == Fraction(3)
+        assert FRACTION.coerce('1/3') == Fraction(1, 3)
+
+
+class TestDecimal:
+    """Tests for expressions compiled for decimals."""
+
+    def test_exact_literals(self):
+        """Test that decimal literals are not rounded to binary."""
+        parser = Parser(numeric='decimal')
+        assert parser.parse("0.1 + 0.2") == Decimal('0.3')
+        assert parser.parse("1.1 * 3") == Decimal('3.3')
+        assert parser.parse("-0.5 - -0.25") == Decimal('-0.25')
+
+    def test_rounds_to_context(self):
+        """Test that arithmetic rounds to the parser's context."""
+        assert Parser(numeric='decimal').parse("2 / 3") == Decimal(
+            '0.6666666666666666666666666667'
+        )
+        parser = Parser(numeric=decimal.Context(prec=6))
+        assert parser.parse("2 / 3") == Decimal('0.666667')
+        assert parser.parse("sqrt(2)") == Decimal('1.41421')
+
+    def test_context_of_thread_is_ignored(self):
+        """Test that results do not depend on the evaluating thread."""
+        compiled = Parser(numeric=decimal.Context(prec=6)).compile("x / 3")
+        results = []
+
+        def evaluate():
+            decimal.getcontext().prec = 2
+            results.append(compiled.evaluate(x=1))
+
+        thread = threading.Thread(target=evaluate)
+        thread.start()
+        thread.join()
+        assert results == [Decimal('0.333333')]
+
+    def test_functions(self):
+        """Test functions with and without decimal versions."""
+        parser = Parser(numeric='decimal')
+        assert parser.parse("log(1000)") == Decimal(3)
+        assert parser.parse("log(8, 2)") == Decimal(3)
+        assert parser.parse("5!") == Decimal(120)
+        assert parser.parse("sin(0.5)") == Decimal('0.479425538604203')
+        assert parser.parse("pi") == Decimal('3.141592653589793')
+
+    def test_modulo_takes_sign_of_divisor(self):
+        """Test that modulo agrees with the float backend."""
+        parser = Parser(numeric='decimal')
+        for expression in ("-7 % 3", "7 % -3", "7.5 % 2"):
+            assert parser.parse(expression) == Decimal(repr(Parser().parse(expression)))
+
+    def test_errors(self):
+        """Test that errors match those of the float backend."""
+        parser = Parser(numeric='decimal')
+        with pytest.raises(ZeroDivisionError, match="division by zero"):
+            parser.parse("1 / (2 - 2)")
+        with pytest.raises(SyntaxError, match="square root of negative"):
+            parser.parse("sqrt(-1)")
+        with pytest.raises(SyntaxError, match="fractional power"):
+            parser.parse("(-8) ^ 0.5")
+        with pytest.raises(SyntaxError, match="fractional power"):
+            parser.parse("pow(-8, 0.5)")
+        with pytest.raises(SyntaxError, match="invalid number '1.2.3'"):
+            parser.parse("1.2.3")
+
+
+class TestFraction:
+    """Tests for expressions compiled for fractions."""
+
+    def test_exact_arithmetic(self):
+        """Test that fractions never round."""
+        parser = Parser(numeric='fraction')
+        assert parser.parse("1/3 + 1/6") == Fraction(1, 2)
+        assert parser.parse("0.1 * 3 - 0.3") == 0
+        assert parser.parse("2 ^ -2") == Fraction(1, 4)
+
+    def test_inexact_functions(self):
+        """Test that float results are converted as written."""
+        parser = Parser(numeric='fraction')
+        assert parser.parse("sqrt(2)") == Fraction('1.4142135623730951')
+        assert parser.parse("4 ^ 0.5") == 2
+        assert parser.parse("factorial(4)") == 24
+
+    def test_large_results_are_refused(self):
+        """Test that huge exact powers and factorials are not computed."""
+        parser = Parser(numeric='fraction')
+        assert parser.parse("2 ^ 1000") == 2**1000
+        assert parser.parse("1 ^ (10 ^ 9)") == 1
+        assert parser.parse("1000!") > 0
+        for expression in ("2 ^ (10 ^ 7)", "pow(2, 10 ^ 7)", "60000!"):
+            with pytest.raises(OverflowError, match="too large"):
+                parser.compile(expression).evaluate()
+
+    def test_registered_functions(self):
+        """Test that results of custom functions are converted."""
+        registry = default_registry.copy()
+        registry.add_function('half', lambda x: float(x) / 2)
+        parser = Parser(registry=registry, numeric='fraction')
+        assert parser.parse("half(3) + 1/4") == Fraction(7, 4)
+
+
+class TestExactExpression:
+    """Tests for compiled exact expressions."""
+
+    def test_variables_are_converted(self):
+        """Test that variable values are converted to the exact type."""
+        compiled = Parser(numeric='decimal').compile("price * (1 + tax)")
+        assert isinstance(compiled, ExactExpression)
+        assert compiled.evaluate(price=19.99, tax=0.1) == Decimal('21.989')
+        assert compiled.evaluate('19.99', '0.1') == Decimal('21.989')
+
+    def test_literals_converted_once(self):
+        """Test that programs hold exact constants."""
+        compiled = Parser(numeric='fraction').compile("x + 0.5")
+        assert compiled.disassemble() == [
+            'LOAD x',
+            'PUSH Fraction(1, 2)',
+            'BINARY add',
+        ]
+
+    def test_bind(self):
+        """Test that bound values are converted."""
+        compiled = Parser(numeric='fraction').compile("x * y")
+        bound = compiled.bind(y=0.1)
+        assert isinstance(bound, ExactExpression)
+        assert bound.evaluate(3) == Fraction(3, 10)
+
+    def test_unsupported(self):
+        """Test that float-only evaluation paths are refused."""
+        compiled = Parser(numeric='decimal').compile("x + 1")
+        with pytest.raises(TypeError, match="cannot be turned into functions"):
+            compiled.to_function()
+        with pytest.raises(TypeError, match="cannot be evaluated over columns"):
+            compiled.evaluate_batch(x=[1.0])
+
+    def test_shared_cache(self):
+        """Test that parsers for different backends can share a cache."""
+        registry = default_registry.copy()
+        floats = Parser(cache=registry.cache, registry=registry)
+        fractions = Parser(cache=registry.cache, registry=registry, numeric='fraction')
+        assert floats.parse("1 / 4") == 0.25
+        assert fractions.parse("1 / 4") == Fraction(1, 4)
+        assert floats.parse("1 / 4") == 0.25
+        assert fractions.compile("1 / 4") is fractions.compile("1  /  4")
+
+    def test_float_path_unchanged(self):
+        """Test that the default parser still compiles float expressions."""
+        compiled = Parser().compile("0.1 + x")
+        assert type(compiled).__name__ == 'CompiledExpression'
+        assert compiled.evaluate(x=0.2) == 0.1 + 0.2
@@ -1,11 +1,15 @@
 """Tests for calculator operations module."""
 
+import math
+
 import pytest
 
 from calculator.operations import (
     E,
+    MAX_FACTORIAL,
     PI,
     add,
+    bounded_factorial,
     cos,
     divide,
     exp,
@@ -154,6 +158,11 @@ class TestPower:
         """Test raising a base to a fractional exponent."""
         assert power(4.0, 0.5) == 2.0
 
+    def test_power_negative_base_fractional_exponent_raises_error(self):
+        """Test that a negative base with a fractional exponent raises ValueError."""
+        with pytest.raises(ValueError, match="fractional power"):
+            power(-8.0, 1 / 3)
+
     def test_power_large_numbers(self):
         """Test raising a base to a large exponent."""
         assert power(10.0, 10.0) == 1e10
@@ -258,10 +267,28 @@ class TestFactorial:
         with pytest.raises(ValueError, match="factorial requires an integer input"):
             factorial(5.5)
 
+    def test_factorial_integral_float(self):
+        """Test that floats with an integral value are accepted."""
+        assert factorial(5.0) == 120
+
     def test_factorial_large_number(self):
         """Test factorial of a larger number."""
         assert factorial(12) == 479001600
 
+    def test_factorial_stays_exact(self):
+        """Test that factorials beyond the float range are computed exactly."""
+        assert factorial(MAX_FACTORIAL + 1) == math.factorial(MAX_FACTORIAL + 1)
+
+    def test_bounded_factorial_too_large_for_float(self):
+        """Test that factorials beyond the float range are refused early."""
+        assert bounded_factorial(MAX_FACTORIAL) == factorial(MAX_FACTORIAL)
+        with pytest.raises(OverflowError, match="too large"):
+            bounded_factorial(MAX_FACTORIAL + 1)
+        with pytest.raises(OverflowError, match="too large"):
+            bounded_factorial(10**9)
+        with pytest.raises(ValueError):
+            bounded_factorial(-1)
+
 
 class TestCos:
     """Tests for the cos function."""
@@ -386,6 +413,11 @@ class TestPow:
         """Test raising a base to a large exponent."""
         assert pow(10.0, 10.0) == 1e10
 
+    def test_pow_negative_base_fractional_exponent_raises_error(self):
+        """Test that pow rejects fractional powers of negatives like power."""
+        with pytest.raises(ValueError, match="fractional power"):
+            pow(-8.0, 1 / 3)
+
 
 class TestLn:
     """Tests for the ln function."""
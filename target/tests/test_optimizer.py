@@ -0,0 +1,148 @@
+"""Tests for calculator optimizer module."""
+
+import operator
+
+import pytest
+
+from calculator.optimizer import BinaryOp, Constant, GraphBuilder, Variable
+from calculator.parser import Parser
+from calculator.registry import default_registry
+
+
+def compile(expression, optimize=True):
+    """Compile an expression with a fresh, uncached parser."""
+    return Parser(optimize=optimize).compile(expression)
+
+
+class TestConstantFolding:
+    """Tests for constant folding."""
+
+    def test_constant_subtree_is_folded(self):
+        """Test that a constant subtree becomes a single constant."""
+        assert compile("(2 + 3) * x").disassemble() == [
+            'PUSH 5.0',
+            'LOAD x',
+            'BINARY mul',
+        ]
+
+    def test_constant_expression_is_folded(self):
+        """Test that an all-constant expression becomes one instruction."""
+        assert compile("2 * 3 - 4 / 8").disassemble() == ['PUSH 5.5']
+
+    def test_negated_constant_group_is_folded(self):
+        """Test that negating a constant group is folded."""
+        assert compile("-(2 + 3)").disassemble() == ['PUSH -5.0']
+
+    def test_division_by_zero_is_not_folded(self):
+        """Test that division by zero is left for evaluation time."""
+        compiled = compile("x + 1 / 0")
+        with pytest.raises(ZeroDivisionError):
+            compiled.evaluate(x=1)
+
+    def test_non_real_operands_are_not_folded(self):
+        """Test that folding never fails a compile that would succeed without."""
+        registry = default_registry.copy()
+        registry.add_function('root', lambda x: x ** 0.5)
+        for optimize in (True, False):
+            parser = Parser(optimize=optimize, registry=registry)
+            compiled = parser.compile("(-1) ^ root(-1)")
+            with pytest.raises(TypeError):
+                compiled.evaluate()
+
+    def test_unoptimized_program_keeps_constants(self):
+        """Test that optimization can be turned off."""
+        assert compile("2 + 3", optimize=False).disassemble() == [
+            'PUSH 2.0',
+            'PUSH 3.0',
+            'BINARY add',
+        ]
+
+
+class TestIdentities:
+    """Tests for identity removal."""
+
+    @pytest.mark.parametrize(
+        "expression",
+        ["x * 1", "1 * x", "x / 1", "x + 0", "0 + x", "x - 0", "- -x", "x * (2 - 1)"],
+    )
+    def test_identity_is_removed(self, expression):
+        """Test that identity operations reduce to the operand."""
+        assert compile(expression).disassemble() == ['LOAD x']
+
+    @pytest.mark.parametrize("expression", ["0 - x", "1 / x", "x * 0"])
+    def test_non_identity_is_kept(self, expression):
+        """Test that operations that are not identities are kept."""
+        assert len(compile(expression).disassemble()) == 3
+
+    def test_multiplying_by_zero_keeps_nan(self):
+        """Test that x * 0 is not simplified, since nan * 0 is nan."""
+        assert compile("x * 0").evaluate(x=float('nan')) != 0.0
+
+
+class TestCommonSubexpressions:
+    """Tests for shared subexpressions."""
+
+    def test_repeated_subexpression_is_computed_once(self):
+        """Test that a repeated subexpression is stored and reloaded."""
+        program = compile("(a * b) + (a * b)").disassemble()
+        assert program.count('BINARY mul') == 1
+        assert 'STORE $0' in program
+        assert 'LOAD $0' in program
+
+    def test_nested_repeats_store_only_the_outer_subexpression(self):
+        """Test that a repeat inside a shared subexpression is not stored."""
+        program = compile("(a * b + c) * (a * b + c)").disassemble()
+        assert program.count('BINARY mul') == 2
+        assert program.count('STORE $0') == 1
+        assert 'STORE $1' not in program
+
+    def test_shared_results_match_unoptimized(self):
+        """Test that shared subexpressions evaluate like the plain program."""
+        expression = "(a * b + c) * (a * b + c) + a * b - -(c - a)"
+        values = {'a': 2.5, 'b': -3.0, 'c': 7.0}
+        optimized = compile(expression).evaluate(**values)
+        assert optimized == compile(expression, optimize=False).evaluate(**values)
+
+    def test_bind_keeps_temporaries(self):
+        """Test that binding variables keeps temporary slots consistent."""
+        compiled = compile("(a * b + c) * (a * b + c) + a * b").bind(b=3)
+        assert compiled.variables == ('a', 'c')
+        assert compiled.evaluate(a=2, c=4) == 106.0
+
+
+class TestGraphBuilder:
+    """Tests for the GraphBuilder class."""
+
+    def test_identical_nodes_are_shared(self):
+        """Test that building the same operation twice returns one node."""
+        builder = GraphBuilder()
+        x = builder.variable('x')
+        first = builder.binary(operator.mul, x, builder.variable('y'))
+        second = builder.binary(operator.mul, x, builder.variable('y'))
+        assert first is second
+        assert isinstance(first, BinaryOp)
+
+    def test_uses_are_counted(self):
+        """Test that uses of a shared node are counted per parent."""
+        builder = GraphBuilder()
+        product = builder.binary(
+            operator.mul, builder.variable('x'), builder.variable('y')
+        )
+        builder.binary(operator.add, product, product)
+        assert builder.uses[id(product)] == 2
+
+    def test_folding_returns_constant(self):
+        """Test that folding returns a Constant node."""
+        builder = GraphBuilder()
+        two = builder.constant(2.0)
+        node = builder.binary(operator.add, two, builder.constant(3.0))
+        assert isinstance(node, Constant)
+        assert node.value == 5.0
+
+    def test_variables_are_numbered_in_order(self):
+        """Test that variables get slots in order of first use."""
+        builder = GraphBuilder()
+        assert isinstance(builder.variable('b'), Variable)
+        builder.variable('a')
+        builder.variable('b')
+        assert builder.variables == {'b': 0, 'a': 1}
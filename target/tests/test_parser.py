@@ -1,8 +1,31 @@
 """Tests for calculator parser module."""
 
+import operator
+import pickle
+import random
+import sys
+import threading
+import tracemalloc
+
 import pytest
 
-from calculator.parser import parse, parse_and_evaluate
+from calculator.cache import ConcurrentCache
+from calculator.parser import (
+    _BINARY,
+    _CALL,
+    _LOAD,
+    _PUSH,
+    _UNARY,
+    CompiledExpression,
+    LimitExceededError,
+    Limits,
+    Parser,
+    compile,
+    expression_cache,
+    parse,
+    parse_and_evaluate,
+)
+from calculator.tokenizer import ExpressionSyntaxError
 
 
 class TestSimpleExpressions:
@@ -96,6 +119,10 @@ class TestDecimalNumbers:
         """Test division with decimal numbers."""
         assert parse("7.5 / 2.5") == 3.0
 
+    def test_scientific_notation(self):
+        """Test numbers written with an exponent."""
+        assert parse("1.5e3 + 2E-1") == 1500.2
+
 
 class TestComplexExpressions:
     """Tests for complex expressions."""
@@ -113,6 +140,110 @@ class TestComplexExpressions:
         assert parse("10 / 2 + 3 * 2") == 11.0
 
 
+class TestScientificSyntax:
+    """Tests for exponents, modulo, factorial, functions and constants."""
+
+    @pytest.mark.parametrize(
+        'expression, expected',
+        [
+            ("2 ^ 10", 1024.0),
+            ("2 ** 0.5 ** 2", 2.0 ** 0.25),
+            ("2 ^ 3 ^ 2", 512.0),
+            ("-2 ^ 2", -4.0),
+            ("2 ^ -1", 0.5),
+            ("2 * 3 ^ 2", 18.0),
+            ("10 % 4", 2.0),
+            ("1 + 7 % 4 * 2", 7.0),
+            ("5!", 120.0),
+            ("-3!", -6.0),
+            ("(1 + 2)! / 2", 3.0),
+            ("2 ^ 3!", 64.0),
+        ],
+    )
+    def test_operators(self, expression, expected):
+        """Test precedence and associativity of the scientific operators."""
+        assert parse(expression) == pytest.approx(expected)
+
+    @pytest.mark.parametrize(
+        'expression, expected',
+        [
+            ("sqrt(16)", 4.0),
+            ("log(1000)", 3.0),
+            ("log(8, 2)", 3.0),
+            ("ln(e)", 1.0),
+            ("exp(0) + cos(0)", 2.0),
+            ("sin(pi / 2)", 1.0),
+            ("tan(0)", 0.0),
+            ("pow(2, 3) + power(2, 2)", 12.0),
+            ("mod(7, 4)", 3.0),
+            ("factorial(4)", 24.0),
+            ("sqrt(sqrt(16) * 4) + log(10 ^ 2, 10)", 6.0),
+            ("2 * pi", 6.283185307179586),
+        ],
+    )
+    def test_functions_and_constants(self, expression, expected):
+        """Test function calls and named constants."""
+        assert parse(expression) == pytest.approx(expected)
+
+    def test_functions_are_resolved_at_compile_time(self):
+        """Test that calls compile to direct calls of the operations."""
+        assert compile("log(x, 2) + sqrt(y)").disassemble() == [
+            'LOAD x',
+            'PUSH 2.0',
+            'BINARY log',
+            'LOAD y',
+            'UNARY sqrt',
+            'BINARY add',
+        ]
+
+    def test_function_calls_are_folded(self):
+        """Test that calls on constants are computed at compile time."""
+        assert compile("sqrt(16) * x").disassemble() == [
+            'PUSH 4.0',
+            'LOAD x',
+            'BINARY mul',
+        ]
+
+    def test_function_names_can_be_variables(self):
+        """Test that a function name without parentheses is a variable."""
+        assert compile("sqrt * 2").evaluate(sqrt=3) == 6.0
+
+    @pytest.mark.parametrize(
+        'expression, message',
+        [
+            ("foo(1)", "unknown function 'foo' at position 0"),
+            ("1 + sqrt(1, 2)", r"sqrt\(\) takes 1 argument, got 2 at position 4"),
+            ("log(1, 2, 3)", r"log\(\) takes 1 to 2 arguments, got 3"),
+            ("pow(2)", r"pow\(\) takes 2 arguments, got 1"),
+            ("sqrt()", r"sqrt\(\) takes 1 argument, got 0 at position 0"),
+            ("(1, 2)", "unexpected ',' at position 2"),
+            ("1, 2", "unexpected ',' at position 1"),
+            ("!3", "unexpected '!' at position 0"),
+            ("2 ^ ^ 3", "unexpected '\\^' at position 4"),
+        ],
+    )
+    def test_syntax_errors(self, expression, message):
+        """Test that malformed calls and operators are rejected at compile time."""
+        with pytest.raises(SyntaxError, match=message):
+            compile(expression)
+
+    def test_domain_errors(self):
+        """Test that domain errors are raised by evaluation."""
+        with pytest.raises(ValueError, match="square root of negative"):
+            compile("sqrt(x)").evaluate(x=-1)
+        with pytest.raises(ValueError, match="fractional power"):
+            compile("x ^ 0.5").evaluate(x=-4)
+        with pytest.raises(ValueError, match="fractional power"):
+            compile("pow(x, 1 / 3)").evaluate(x=-8)
+        with pytest.raises(SyntaxError, match="factorial requires an integer"):
+            parse("2.5!")
+
+    def test_modulo_by_zero(self):
+        """Test that modulo by zero raises ZeroDivisionError."""
+        with pytest.raises(ZeroDivisionError, match="modulo by zero"):
+            parse("5 % 0")
+
+
 class TestErrorHandling:
     """Tests for error handling."""
 
@@ -151,6 +282,39 @@ class TestErrorHandling:
         with pytest.raises(SyntaxError):
             parse("2 + * 3")
 
+    def test_unknown_characters_are_rejected(self):
+        """Test that characters outside the grammar are not ignored."""
+        with pytest.raises(SyntaxError, match="invalid character"):
+            parse("2 $ 3")
+
+    def test_error_reports_position(self):
+        """Test that errors name the position of the offending token."""
+        with pytest.raises(SyntaxError, match="at position 4"):
+            parse("2 + * 3")
+
+    def test_adjacent_operands(self):
+        """Test that two operands without an operator raise SyntaxError."""
+        with pytest.raises(SyntaxError):
+            parse("2 3")
+
+    @pytest.mark.parametrize(
+        "expression, code, position",
+        [
+            ("2 + * 3", 'syntax', 4),
+            ("2 **", 'syntax', 4),
+            ("(1 + 2", 'mismatched_parens', 0),
+            ("1 + 2)", 'mismatched_parens', 5),
+            ("foo(1)", 'unknown_function', 0),
+            ("1 + sqrt(1, 2)", 'syntax', 4),
+            ("2 ! 3", 'syntax', 4),
+        ],
+    )
+    def test_errors_carry_code_and_position(self, expression, code, position):
+        """Test that compile errors name what is wrong and where."""
+        with pytest.raises(ExpressionSyntaxError) as info:
+            Parser().compile(expression)
+        assert (info.value.code, info.value.position) == (code, position)
+
 
 class TestParseAndEvaluate:
     """Tests for parse_and_evaluate function."""
@@ -188,3 +352,375 @@ class TestParseAndEvaluate:
         """Test that parse_and_evaluate raises ZeroDivisionError."""
         with pytest.raises(ZeroDivisionError):
             parse_and_evaluate("5 / 0")
+
+
+class TestCompile:
+    """Tests for compiling expressions once and evaluating them repeatedly."""
+
+    def test_compile_returns_compiled_expression(self):
+        """Test that compile returns a CompiledExpression."""
+        assert isinstance(compile("2 + 3"), CompiledExpression)
+
+    def test_evaluate(self):
+        """Test that a compiled expression evaluates correctly."""
+        assert compile("(2 + 3) * 4 - 6 / 2").evaluate() == 17.0
+
+    def test_evaluate_repeatedly(self):
+        """Test that a compiled expression can be evaluated many times."""
+        compiled = compile("-5 + 3 * 2")
+        assert [compiled.evaluate() for _ in range(3)] == [1.0, 1.0, 1.0]
+
+    def test_source_is_stripped(self):
+        """Test that the compiled expression keeps its stripped source."""
+        assert compile("  2 + 3  ").source == "2 + 3"
+
+    def test_compiled_expression_is_immutable(self):
+        """Test that a compiled expression cannot be modified."""
+        compiled = compile("2 + 3")
+        with pytest.raises(AttributeError):
+            compiled.source = "4"
+
+    def test_stack_size(self):
+        """Test that the maximum stack depth is computed at compile time."""
+        assert compile("x").evaluate(x=1) == 1.0
+        assert compile("x")._stack_size == 1
+        assert compile("a + b * (c - d)")._stack_size == 4
+        assert compile("((a - b) - c) - d")._stack_size == 2
+
+    @pytest.mark.parametrize(
+        'program, variables, message',
+        [
+            (((_PUSH, 1.0), (_BINARY, operator.add)), (), "underflow at instruction 1"),
+            (((_PUSH, 1.0), (_PUSH, 2.0)), (), "leaves 2 values"),
+            ((), (), "leaves 0 values"),
+            (((_LOAD, 1),), ('x',), "slot 1 out of range at instruction 0"),
+            (((_CALL, (max, 3)),), (), "underflow at instruction 0"),
+            (((9, None),), (), "unknown opcode 9"),
+        ],
+    )
+    def test_invalid_programs_are_rejected(self, program, variables, message):
+        """Test that programs are checked once, when they are created."""
+        with pytest.raises(ValueError, match=message):
+            CompiledExpression("?", program, variables)
+
+    def test_malformed_expression_fails_at_compile_time(self):
+        """Test that malformed expressions raise SyntaxError from compile."""
+        with pytest.raises(SyntaxError):
+            compile("2 + * 3")
+
+    def test_mismatched_parentheses_fail_at_compile_time(self):
+        """Test that mismatched parentheses raise SyntaxError from compile."""
+        with pytest.raises(SyntaxError):
+            compile("(2 + 3")
+
+    def test_empty_expression(self):
+        """Test that compiling an empty expression raises SyntaxError."""
+        with pytest.raises(SyntaxError):
+            compile("   ")
+
+    def test_division_by_zero_raised_on_evaluate(self):
+        """Test that division by zero is raised when evaluating."""
+        compiled = compile("5 / (2 - 2)")
+        with pytest.raises(ZeroDivisionError):
+            compiled.evaluate()
+
+
+class TestCompactRepresentation:
+    """Tests for sharing between compiled expressions."""
+
+    def test_instructions_are_shared(self):
+        """Test that identical instructions are stored once."""
+        first = Parser().compile("price * 2 + 1")
+        second = Parser().compile("2 * price - 1")
+        assert first._program[0] is second._program[1]
+        assert first._program[1] is second._program[0]
+        assert first.variables is second.variables
+
+    def test_distinguishable_constants_are_not_shared(self):
+        """Test that constants equal to each other stay distinct if they differ."""
+        assert compile("x * 0").disassemble()[-2] == 'PUSH 0.0'
+        assert compile("x * -0").disassemble()[-2] == 'PUSH -0.0'
+
+    def test_unhashable_callables(self):
+        """Test that instructions that cannot be hashed are kept unshared."""
+
+        class Negate:
+            __hash__ = None
+
+            def __call__(self, value):
+                return -value
+
+        program = ((_PUSH, 2.0), (_UNARY, Negate()))
+        compiled = CompiledExpression("?", program, ())
+        assert compiled.evaluate() == -2.0
+        assert compiled.sizeof()['program'] > sys.getsizeof(compiled._program)
+
+    def test_sizeof(self):
+        """Test that sizeof reports owned and shared memory."""
+        report = Parser().compile("price * quantity + 1").sizeof()
+        assert set(report) == {
+            'object', 'source', 'variables', 'program', 'constants', 'total',
+            'shared',
+        }
+        assert report['total'] == sum(
+            report[key]
+            for key in ('object', 'source', 'variables', 'program', 'constants')
+        )
+        assert report['shared'] > 0
+
+
+class TestExpressionCache:
+    """Tests for the compiled-expression cache behind parse()."""
+
+    def setup_method(self):
+        """Start each test with an empty cache."""
+        expression_cache.clear()
+
+    def test_repeated_parse_hits_cache(self):
+        """Test that parsing the same expression twice is a cache hit."""
+        parse("2 + 3")
+        parse("2 + 3")
+        assert expression_cache.misses == 1
+        assert expression_cache.hits == 1
+
+    def test_whitespace_is_normalized(self):
+        """Test that expressions differing only in whitespace share an entry."""
+        assert compile("2+3") is not compile("2 + 3")
+        assert compile(" 2  +   3 ") is compile("2 + 3")
+
+    def test_failed_compilation_is_not_cached(self):
+        """Test that malformed expressions are not stored in the cache."""
+        with pytest.raises(SyntaxError):
+            parse("2 + * 3")
+        assert len(expression_cache) == 0
+
+    def test_clear(self):
+        """Test that clearing the cache forces recompilation."""
+        compiled = compile("2 + 3")
+        expression_cache.clear()
+        assert compile("2 + 3") is not compiled
+
+    def test_parser_without_cache(self):
+        """Test that a parser without a cache compiles every time."""
+        parser = Parser()
+        assert parser.compile("2 + 3") is not parser.compile("2 + 3")
+
+
+    def test_shared_between_threads(self):
+        """Stress test: threads sharing a parser and cache get correct results."""
+        expressions = [f"{i} * x + sqrt({i}) - {i} % 7" for i in range(200)]
+        expected = [Parser().compile(e).evaluate(x=2) for e in expressions]
+        # A small cache, so that threads also evict each other's entries.
+        parser = Parser(cache=ConcurrentCache(32))
+        errors = []
+        barrier = threading.Barrier(16)
+
+        def work(seed):
+            rng = random.Random(seed)
+            barrier.wait()
+            try:
+                for _ in range(1000):
+                    i = rng.randrange(len(expressions))
+                    result = parser.compile(expressions[i]).evaluate(x=2)
+                    if result != expected[i]:
+                        errors.append((expressions[i], result))
+            except Exception as e:
+                errors.append(e)
+
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        try:
+            threads = [threading.Thread(target=work, args=(i,)) for i in range(16)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            sys.setswitchinterval(interval)
+        assert errors == []
+        assert len(parser.cache) <= 32
+
+class TestVariables:
+    """Tests for variables in compiled expressions."""
+
+    def test_evaluate_with_keyword_values(self):
+        """Test evaluating with variables passed by name."""
+        compiled = compile("price * (1 + tax)")
+        assert compiled.evaluate(price=10, tax=0.2) == pytest.approx(12.0)
+
+    def test_evaluate_with_positional_values(self):
+        """Test evaluating with variables passed in slot order."""
+        compiled = compile("price * (1 + tax)")
+        assert compiled.variables == ("price", "tax")
+        assert compiled.evaluate(10, 0.2) == pytest.approx(12.0)
+
+    def test_repeated_variable_uses_one_slot(self):
+        """Test that a variable used twice gets a single slot."""
+        compiled = compile("x * x + y")
+        assert compiled.variables == ("x", "y")
+        assert compiled.evaluate(x=3, y=1) == 10.0
+
+    def test_extra_keyword_values_are_ignored(self):
+        """Test that unused keyword values are ignored."""
+        assert compile("a + 1").evaluate(a=1, b=2) == 2.0
+
+    def test_missing_variable_raises_name_error(self):
+        """Test that a missing variable raises NameError."""
+        with pytest.raises(NameError, match="undefined variable: b"):
+            compile("a + b").evaluate(a=1)
+
+    def test_too_many_positional_values(self):
+        """Test that too many positional values raise TypeError."""
+        with pytest.raises(TypeError):
+            compile("a + 1").evaluate(1, 2)
+
+    def test_negated_variable(self):
+        """Test unary minus applied to a variable."""
+        assert compile("-x * 2").evaluate(x=3) == -6.0
+        assert compile("x - -y").evaluate(x=1, y=2) == 3.0
+
+    def test_negated_parentheses(self):
+        """Test unary minus applied to a parenthesized group."""
+        assert parse("-(2 + 3)") == -5.0
+        assert parse("2 * -(1 + 1)") == -4.0
+
+    def test_bind(self):
+        """Test fixing some variables to constants."""
+        bound = compile("price * (1 + tax)").bind(tax=0.5)
+        assert bound.variables == ("price",)
+        assert bound.evaluate(2) == 3.0
+
+    def test_parse_with_unbound_variable(self):
+        """Test that parse reports unbound variables as SyntaxError."""
+        with pytest.raises(SyntaxError, match="undefined variable"):
+            parse("2 + a")
+
+
+class TestLimits:
+    """Tests for the resource limits of a parser."""
+
+    def test_no_limits_by_default(self):
+        """Test that a parser accepts deeply nested expressions by default."""
+        expression = "(" * 5000 + "1" + ")" * 5000
+        assert Parser().parse(expression) == 1.0
+
+    def test_error_is_syntax_error(self):
+        """Test that exceeding a limit raises a distinct SyntaxError."""
+        parser = Parser(limits=Limits(max_tokens=3))
+        with pytest.raises(LimitExceededError) as info:
+            parser.compile("1 + 2 + 3")
+        assert isinstance(info.value, SyntaxError)
+        assert info.value.limit == 'max_tokens'
+        assert info.value.maximum == 3
+        assert (info.value.code, info.value.position) == ('limit_exceeded', 6)
+
+    def test_error_pickles(self):
+        """Test that the error survives the trip back from a worker process."""
+        parser = Parser(limits=Limits(max_depth=1))
+        with pytest.raises(LimitExceededError) as info:
+            parser.compile("((1))")
+        error = pickle.loads(pickle.dumps(info.value))
+        assert str(error) == str(info.value)
+        assert (error.limit, error.maximum, error.position) == ('max_depth', 1, 1)
+
+    def test_max_length(self):
+        """Test that the length is checked before the text is tokenized."""
+        parser = Parser(limits=Limits(max_length=10))
+        assert parser.parse("1 + 2 + 3") == 6.0
+        with pytest.raises(LimitExceededError, match="too long"):
+            parser.compile("@" * 1_000_000)
+
+    def test_max_tokens_stops_tokenizing(self):
+        """Test that tokenizing stops at the first token over the limit."""
+        parser = Parser(limits=Limits(max_tokens=5))
+        assert parser.parse("1 + 2 + 3") == 6.0
+        # The invalid character after the limit is never reached.
+        with pytest.raises(LimitExceededError, match="position 10"):
+            parser.compile("1 + 2 + 3 + 4 @")
+
+    def test_max_depth(self):
+        """Test that nesting deeper than the limit is rejected."""
+        parser = Parser(limits=Limits(max_depth=3))
+        assert parser.parse("((pow(2, 2))) * 2") == 8.0
+        with pytest.raises(LimitExceededError, match="nesting too deep"):
+            parser.compile("(" * 100_000 + "1" + ")" * 100_000)
+
+    @pytest.mark.parametrize(
+        "limits, expression",
+        [
+            (Limits(max_tokens=100), "\t" + "10 +  " * 400_000 + "1"),
+            (Limits(max_depth=5), "((1 " * 500_000),
+        ],
+    )
+    def test_limits_checked_before_normalizing(self, limits, expression):
+        """Test that text over a limit is rejected before it is split."""
+        parser = Parser(limits=limits)
+        tracemalloc.start()
+        try:
+            with pytest.raises(LimitExceededError):
+                parser.compile(expression)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        # Splitting into pieces would take over ten times the text.
+        assert peak < 5 * len(expression)
+
+    @pytest.mark.parametrize(
+        "expression, message",
+        [
+            ("  1 +\t\t2 +   3 + 4", "too many tokens: limit 5 reached at position 10"),
+            ("1\xa0+ 2 +\n@", "invalid character '@' at position 8"),
+            ("((\n\n((1))))", "nesting too deep: limit 3 reached at position 4"),
+        ],
+    )
+    def test_positions_in_normalized_text(self, expression, message):
+        """Test that errors found before normalizing give normalized positions."""
+        parser = Parser(limits=Limits(max_tokens=5, max_depth=3))
+        with pytest.raises(SyntaxError, match=message):
+            parser.compile(expression)
+
+    def test_max_stack(self):
+        """Test that expressions needing a deep evaluation stack are rejected."""
+        parser = Parser(limits=Limits(max_stack=3))
+        assert parser.compile("a + (b + c)").evaluate(1, 2, 3) == 6.0
+        with pytest.raises(LimitExceededError, match="stack of 4 values"):
+            parser.compile("a + (b + (c + d))")
+
+    def test_max_steps(self):
+        """Test that expressions with too many instructions are rejected."""
+        parser = Parser(limits=Limits(max_steps=5))
+        assert parser.parse("1 + 2 * 3") == 7.0
+        with pytest.raises(LimitExceededError, match="7 steps"):
+            parser.compile("a + b + c + d")
+
+    def test_parse_does_not_wrap(self):
+        """Test that parse() raises the limit error itself."""
+        parser = Parser(limits=Limits(max_tokens=2))
+        with pytest.raises(LimitExceededError, match="^too many tokens"):
+            parser.parse("1 + 2")
+
+    def test_cached_expressions_are_checked(self):
+        """Test that expressions compiled by another parser are checked."""
+        cache = ConcurrentCache()
+        Parser(cache=cache).compile("a + b + c + d")
+        limited = Parser(cache=cache, limits=Limits(max_steps=5))
+        with pytest.raises(LimitExceededError, match="7 steps"):
+            limited.compile("a + b + c + d")
+
+    def test_exact_backend(self):
+        """Test that limits apply to exact numeric backends."""
+        parser = Parser(numeric='fraction', limits=Limits(max_depth=1))
+        assert parser.parse("(1 + 2) / 3") == 1
+        with pytest.raises(LimitExceededError):
+            parser.compile("((1))")
+
+    def test_invalid_limit(self):
+        """Test that limits must be positive."""
+        with pytest.raises(ValueError, match="max_depth must be at least 1"):
+            Limits(max_depth=0)
+
+    def test_repr(self):
+        """Test that the repr shows the bounds that are set."""
+        assert repr(Limits(max_tokens=10, max_steps=20)) == (
+            "Limits(max_tokens=10, max_steps=20)"
+        )
@@ -0,0 +1,133 @@
+"""Tests for calculator profiling module."""
+
+import pstats
+
+import pytest
+
+from calculator.batch import evaluate_stream
+from calculator.parser import Parser
+from calculator.profiling import Profiler, write_profile
+
+EXPRESSIONS = [
+    "1 + 2",
+    "((((1))))",
+    "1 / 0",
+    "sqrt(2) * (3 + 4) - 5 ^ 2",
+    "2 +",
+]
+
+
+@pytest.fixture
+def profiler():
+    """A profiler that has evaluated EXPRESSIONS."""
+    profiler = Profiler(top=2)
+    list(profiler.evaluate(EXPRESSIONS))
+    return profiler
+
+
+class TestProfiler:
+    """Tests for the Profiler class."""
+
+    def test_results_match_batch_evaluation(self):
+        """Test that results and error messages are those of batch mode."""
+        results = list(Profiler().evaluate(EXPRESSIONS))
+        assert results[:2] == [3.0, 1.0]
+        assert isinstance(results[2], ZeroDivisionError)
+        assert str(results[4]).startswith("invalid expression:")
+
+    def test_errors_worded_as_parse(self):
+        """Test that every kind of failure is worded as parse() words it."""
+        expressions = ["", "  ", "2 +", "1 / 0", "sqrt(-1)", "x + 1", "foo(1)"]
+        expected = [f"{type(e).__name__}: {e}" for e in evaluate_stream(expressions)]
+        results = Profiler().evaluate(expressions)
+        assert [f"{type(e).__name__}: {e}" for e in results] == expected
+
+    def test_each_expression_compiled_once(self):
+        """Test that failing expressions are not compiled a second time."""
+        parser = Parser()
+        calls = []
+        compile_expression = parser.compile
+
+        def counting(expression):
+            calls.append(expression)
+            return compile_expression(expression)
+
+        parser.compile = counting
+        list(Profiler(parser).evaluate(EXPRESSIONS))
+        assert calls == EXPRESSIONS
+
+    def test_totals(self, profiler):
+        """Test that every expression is accounted for."""
+        report = profiler.report()
+        assert report['count'] == 5
+        assert report['errors'] == 2
+        assert report['parse_ns'] > 0
+
+    def test_rankings(self, profiler):
+        """Test the expressions with the most tokens and deepest nesting."""
+        report = profiler.report()
+        assert [cost.line for cost in report['most_tokens']] == [4, 2]
+        assert [cost.tokens for cost in report['most_tokens']] == [14, 9]
+        assert [(cost.line, cost.depth) for cost in report['deepest']] == [
+            (2, 4),
+            (4, 1),
+        ]
+        slowest = report['slowest']
+        assert len(slowest) == 2
+        assert slowest[0].total_ns >= slowest[1].total_ns
+
+    def test_failed_compilation_has_no_evaluation_time(self, profiler):
+        """Test that expressions that do not compile are not evaluated."""
+        list(profiler.evaluate(["(" * 100]))
+        cost = profiler.report()['deepest'][0]
+        assert cost.depth == 100
+        assert cost.evaluate_ns == 0
+        assert isinstance(cost.error, SyntaxError)
+
+    def test_summary(self, profiler):
+        """Test that the summary lists each ranking."""
+        summary = profiler.summary()
+        assert summary.startswith("Profiled 5 expressions in ")
+        assert "2 errors" in summary
+        for title in ("Slowest expressions:", "Most tokens:", "Deepest nesting:"):
+            assert title in summary
+        assert "sqrt(2) * (3 + 4) - 5 ^ 2" in summary
+
+    def test_long_expressions_are_shortened(self):
+        """Test that long expressions are cut in the summary."""
+        profiler = Profiler(top=1)
+        list(profiler.evaluate([" + ".join(["1"] * 100)]))
+        assert "1 + 1 + 1..." in profiler.summary()
+
+
+class TestWriteProfile:
+    """Tests for function-level profiles."""
+
+    def run(self):
+        """Evaluate the expressions through a profiler."""
+        return list(Profiler().evaluate(EXPRESSIONS))
+
+    def test_pstats(self, tmp_path):
+        """Test that a pstats file is written."""
+        path = tmp_path / 'batch.pstats'
+        assert write_profile(self.run, str(path))[0] == 3.0
+        functions = {name for _, _, name in pstats.Stats(str(path)).stats}
+        assert '_to_rpn' in functions
+
+    def test_collapsed_stacks(self, tmp_path):
+        """Test that collapsed stacks name the callers of each function."""
+        path = tmp_path / 'batch.collapsed'
+        write_profile(self.run, str(path), 'collapsed')
+        lines = path.read_text().splitlines()
+        stacks = [line.rsplit(' ', 1)[0] for line in lines]
+        assert all(int(line.rsplit(' ', 1)[1]) >= 0 for line in lines)
+        assert any(
+            stack.endswith('calculator.parser.Parser._to_rpn')
+            and 'calculator.parser.Parser.compile' in stack
+            for stack in stacks
+        )
+
+    def test_unknown_format(self, tmp_path):
+        """Test that unknown formats are rejected."""
+        with pytest.raises(ValueError, match="unknown profile format 'svg'"):
+            write_profile(self.run, str(tmp_path / 'batch.svg'), 'svg')
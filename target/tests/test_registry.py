@@ -0,0 +1,210 @@
+"""Tests for calculator registry module."""
+
+import itertools
+import operator
+
+import pytest
+
+from calculator import operations
+from calculator.cache import LRUCache
+from calculator.parser import Parser, expression_cache
+from calculator.registry import Function, Registry, default_registry
+
+
+def clamp(x, low, high):
+    """Limit x to the range [low, high]."""
+    return max(low, min(high, x))
+
+
+def bps(x):
+    """Convert basis points to a fraction."""
+    return x / 10000
+
+
+@pytest.fixture
+def registry():
+    """A copy of the default registry with some domain functions."""
+    registry = default_registry.copy()
+    registry.add_function('clamp', clamp)
+    registry.add_function('bps', bps)
+    return registry
+
+
+def compile(registry, expression):
+    """Compile an expression with a parser caching in the registry."""
+    return Parser(cache=registry.cache, registry=registry).compile(expression)
+
+
+class TestDefaultRegistry:
+    """Tests for the default registry."""
+
+    def test_is_frozen(self):
+        """Test that the default registry cannot be changed."""
+        assert default_registry.frozen
+        with pytest.raises(RuntimeError, match="registry is frozen"):
+            default_registry.add_function('clamp', clamp)
+
+    def test_builtins(self):
+        """Test that the default registry holds the built-in definitions."""
+        assert default_registry.operators['^'].right_associative
+        assert default_registry.functions['log'] == Function(
+            operations.log, 1, 2, True
+        )
+        assert default_registry.constants['pi'] == operations.PI
+
+    def test_cache_is_the_expression_cache(self):
+        """Test that parse() caches in the default registry."""
+        assert default_registry.cache is expression_cache
+
+
+class TestFunctions:
+    """Tests for registering functions."""
+
+    def test_domain_functions(self, registry):
+        """Test that registered functions can be called."""
+        compiled = compile(registry, "clamp(x, 0, 10) + bps(250)")
+        assert compiled.evaluate(x=12) == pytest.approx(10.025)
+        assert compiled.evaluate(x=-3) == pytest.approx(0.025)
+
+    def test_three_argument_call_disassembly(self, registry):
+        """Test that calls with more than two arguments use CALL."""
+        assert compile(registry, "clamp(x, 0, 1)").disassemble() == [
+            'LOAD x',
+            'PUSH 0.0',
+            'PUSH 1.0',
+            'CALL clamp/3',
+        ]
+
+    def test_arity_from_signature(self, registry):
+        """Test that the arity defaults to the signature's parameters."""
+        registry.add_function('total', lambda *values: sum(values))
+        assert registry.functions['clamp'][1:3] == (3, 3)
+        assert registry.functions['total'][1:3] == (0, None)
+        assert compile(registry, "total() + total(1, 2, 3, 4)").evaluate() == 10.0
+
+    def test_explicit_arity(self, registry):
+        """Test that an explicit arity is enforced."""
+        registry.add_function('hypot', lambda *xs: sum(x * x for x in xs), (2, 3))
+        assert compile(registry, "hypot(3, 4)").evaluate() == 25.0
+        with pytest.raises(SyntaxError, match=r"takes 2 to 3 arguments, got 1"):
+            compile(registry, "hypot(3)")
+
+    def test_arity_of_builtin_without_signature(self, registry):
+        """Test that a callable without a signature needs an explicit arity."""
+        with pytest.raises(ValueError, match="pass arity explicitly"):
+            registry.add_function('maximum', max)
+        registry.add_function('maximum', max, arity=(1, None))
+        with pytest.raises(SyntaxError, match="takes at least 1 argument, got 0"):
+            compile(registry, "maximum()")
+
+    def test_pure_functions_are_folded(self, registry):
+        """Test that pure calls on constants are computed at compile time."""
+        assert compile(registry, "clamp(12, 0, 10) * x").disassemble() == [
+            'PUSH 10.0',
+            'LOAD x',
+            'BINARY mul',
+        ]
+
+    def test_impure_functions_are_called_every_time(self, registry):
+        """Test that impure calls are neither folded nor shared."""
+        counter = itertools.count()
+        registry.add_function('tick', lambda: next(counter), pure=False)
+        compiled = compile(registry, "tick() - tick()")
+        assert compiled.disassemble() == [
+            'CALL <lambda>/0',
+            'CALL <lambda>/0',
+            'BINARY sub',
+        ]
+        assert compiled.evaluate() == -1.0
+        assert compiled.evaluate() == -1.0
+
+    def test_invalid_name(self, registry):
+        """Test that names must be identifiers."""
+        with pytest.raises(ValueError, match="invalid name"):
+            registry.add_function('2x', bps)
+
+
+class TestOperatorsAndConstants:
+    """Tests for registering operators and constants."""
+
+    def test_redefine_operator(self, registry):
+        """Test that an operator can be given another function and precedence."""
+        registry.add_operator('^', operations.power, 0)
+        assert compile(registry, "1 + 2 ^ 2").evaluate() == 9.0
+        registry.add_operator('%', lambda a, b: a * b / 100, 2)
+        assert compile(registry, "200 % 5").evaluate() == 10.0
+
+    def test_left_associative_exponent(self, registry):
+        """Test that associativity comes from the registry."""
+        registry.add_operator('^', operations.power, 4, right_associative=False)
+        assert compile(registry, "2 ^ 3 ^ 2").evaluate() == 64.0
+
+    def test_unsupported_symbol(self, registry):
+        """Test that operators can only use symbols the tokenizer knows."""
+        with pytest.raises(ValueError, match="unsupported operator symbol '&'"):
+            registry.add_operator('&', operator.and_, 1)
+
+    def test_operator_missing_from_registry(self):
+        """Test that operators a registry lacks are syntax errors."""
+        registry = Registry()
+        registry.add_operator('+', operator.add, 1)
+        with pytest.raises(SyntaxError, match=r"operator '\*' at position 2"):
+            compile(registry, "2 * 3")
+        with pytest.raises(SyntaxError, match="unsupported operator '-' at position 0"):
+            compile(registry, "-x")
+
+    def test_constants(self, registry):
+        """Test that registered constants replace variables of that name."""
+        registry.add_constant('tick_size', 0.25)
+        assert compile(registry, "4 * tick_size").disassemble() == ['PUSH 1.0']
+
+
+class TestRegistryCaches:
+    """Tests for the per-registry caches."""
+
+    def test_changes_clear_only_own_cache(self, registry):
+        """Test that registering clears the registry's cache only."""
+        other = default_registry.copy()
+        compile(registry, "x + 1")
+        compile(other, "x + 1")
+        registry.add_constant('x', 1.0)
+        assert len(registry.cache) == 0
+        assert len(other.cache) == 1
+        assert compile(registry, "x + 1").disassemble() == ['PUSH 2.0']
+
+    def test_shared_by_parsers(self, registry):
+        """Test that parsers sharing a registry share its compiled expressions."""
+        first = Parser(cache=registry.cache, registry=registry)
+        second = Parser(cache=registry.cache, registry=registry)
+        assert first.compile("bps(x)") is second.compile("bps(x)")
+
+    def test_rejects_other_registrys_cache(self, registry):
+        """Test that a parser cannot use the cache of another registry."""
+        with pytest.raises(ValueError, match="another registry"):
+            Parser(cache=default_registry.cache, registry=registry)
+
+    def test_unowned_cache_keys_by_registry(self, registry):
+        """Test that a cache no registry owns keeps registries apart."""
+        cache = LRUCache()
+        plus = default_registry.copy()
+        plus.add_operator('+', operator.mul, 1)
+        assert Parser(cache=cache).parse("3 + 4") == 7.0
+        assert Parser(cache=cache, registry=plus).parse("3 + 4") == 12.0
+
+    def test_unowned_cache_is_not_stale(self, registry):
+        """Test that changing a registry hides its entries in other caches."""
+        cache = LRUCache()
+        parser = Parser(cache=cache, registry=registry)
+        assert parser.compile("x + 1").variables == ('x',)
+        registry.add_constant('x', 1.0)
+        assert parser.compile("x + 1").disassemble() == ['PUSH 2.0']
+
+    def test_copy_is_independent(self, registry):
+        """Test that a copy is unfrozen and has its own tables and cache."""
+        frozen = registry.freeze()
+        copy = frozen.copy(cache_size=8)
+        copy.add_constant('k', 1.0)
+        assert 'k' not in frozen.constants
+        assert not copy.frozen
+        assert copy.cache is not frozen.cache
+        assert copy.cache.capacity == 8
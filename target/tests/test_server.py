@@ -0,0 +1,219 @@
+"""Tests for calculator server module."""
+
+import asyncio
+import socket
+import struct
+
+import pytest
+
+from calculator.server import Server
+
+
+def run(coroutine):
+    """Run a coroutine with a timeout, so a hanging server fails the test."""
+
+    async def with_timeout():
+        async with asyncio.timeout(30):
+            return await coroutine
+
+    return asyncio.run(with_timeout())
+
+
+async def request_lines(port, lines):
+    """Send newline-delimited requests on one connection; return the responses."""
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(''.join(f"{line}\n" for line in lines).encode())
+    writer.write_eof()
+    responses = (await reader.read()).decode().splitlines()
+    writer.close()
+    return responses
+
+
+async def request_frames(reader, writer, requests):
+    """Send length-prefixed requests; return the responses."""
+    for request in requests:
+        data = request.encode()
+        writer.write(struct.pack('>I', len(data)) + data)
+    responses = []
+    for _ in requests:
+        (length,) = struct.unpack('>I', await reader.readexactly(4))
+        responses.append((await reader.readexactly(length)).decode())
+    return responses
+
+
+class TestLineFraming:
+    """Tests for newline-delimited requests."""
+
+    def test_pipelined_requests_answered_in_order(self):
+        """Test that responses follow the order of the requests."""
+
+        async def scenario():
+            async with Server(workers=1) as server:
+                listener = await server.start(port=0)
+                port = listener.sockets[0].getsockname()[1]
+                return await request_lines(
+                    port, ["2 + 3", "sqrt(16) * 2", "1 / 0", "2 +", "10 % 4"]
+                )
+
+        assert run(scenario()) == [
+            "5.0",
+            "8.0",
+            "Error: float division by zero",
+            "Error: invalid expression: unexpected end of expression",
+            "2.0",
+        ]
+
+    def test_requests_are_deduplicated(self):
+        """Test that identical expressions in a batch are evaluated once."""
+
+        async def scenario():
+            async with Server(workers=1) as server:
+                listener = await server.start(port=0)
+                port = listener.sockets[0].getsockname()[1]
+                responses = await request_lines(port, ["1 + 1", "1  +  1"] * 50)
+                return responses, server.stats()
+
+        responses, stats = run(scenario())
+        assert responses == ["2.0"] * 100
+        assert stats['requests'] == 100
+        assert stats['evaluated'] < 100
+
+    def test_request_too_long_closes_connection(self):
+        """Test that oversized requests end the connection."""
+
+        async def scenario():
+            async with Server(workers=1, max_request=16) as server:
+                listener = await server.start(port=0)
+                port = listener.sockets[0].getsockname()[1]
+                return await request_lines(port, ["1 + 1", "1 + " * 20 + "1"])
+
+        assert run(scenario()) == ["2.0"]
+
+    @pytest.mark.skipif(not hasattr(socket, 'AF_UNIX'), reason="no Unix sockets")
+    def test_unix_socket(self, tmp_path):
+        """Test serving on a Unix socket."""
+        path = str(tmp_path / 'calculator.sock')
+
+        async def scenario():
+            async with Server(workers=1) as server:
+                await server.start(path=path)
+                reader, writer = await asyncio.open_unix_connection(path)
+                writer.write(b"2 ^ 10\n")
+                response = await reader.readline()
+                writer.close()
+                return response
+
+        assert run(scenario()) == b"1024.0\n"
+
+
+class TestLengthFraming:
+    """Tests for length-prefixed requests."""
+
+    def test_requests_and_responses(self):
+        """Test that frames may hold any text, including newlines."""
+
+        async def scenario():
+            async with Server(framing='length', workers=1) as server:
+                listener = await server.start(port=0)
+                port = listener.sockets[0].getsockname()[1]
+                reader, writer = await asyncio.open_connection('127.0.0.1', port)
+                responses = await request_frames(
+                    reader, writer, ["2 *\n3", "pi - pi", "x"]
+                )
+                writer.close()
+                return responses
+
+        assert run(scenario()) == [
+            "6.0",
+            "0.0",
+            "Error: invalid expression: undefined variable: x",
+        ]
+
+    def test_unknown_framing(self):
+        """Test that only known framings are accepted."""
+        with pytest.raises(ValueError, match="unknown framing 'json'"):
+            Server(framing='json')
+
+
+class TestBatching:
+    """Tests for batching across connections."""
+
+    def test_many_concurrent_clients(self):
+        """Test that concurrent clients are batched together."""
+
+        async def scenario():
+            async with Server(workers=1) as server:
+                listener = await server.start(port=0)
+                port = listener.sockets[0].getsockname()[1]
+                responses = await asyncio.gather(
+                    *(request_lines(port, [f"{i} * 2", "1 + 1"]) for i in range(500))
+                )
+                return responses, server.stats()
+
+        responses, stats = run(scenario())
+        assert responses == [[f"{i * 2}.0", "2.0"] for i in range(500)]
+        assert stats['requests'] == 1000
+        assert stats['batches'] < 1000
+
+    def test_large_batches_are_offloaded(self):
+        """Test that batches above the threshold run in worker processes."""
+
+        async def scenario():
+            async with Server(workers=2, offload_threshold=10) as server:
+                futures = [server.evaluate(f"{i} + 0.5") for i in range(100)]
+                responses = await asyncio.gather(*futures)
+                return responses, server.stats()
+
+        responses, stats = run(scenario())
+        assert responses == [f"{i + 0.5}" for i in range(100)]
+        assert stats['offloaded'] == 1
+
+    def test_long_expressions_are_offloaded(self):
+        """Test that a few long expressions are evaluated in the pool."""
+        expression = " + ".join(["1"] * 1000)
+
+        async def scenario():
+            async with Server(workers=1, offload_bytes=1000) as server:
+                futures = [server.evaluate(expression), server.evaluate("1 + 1")]
+                return await asyncio.gather(*futures), server.stats()
+
+        responses, stats = run(scenario())
+        assert responses == ["1000.0", "2.0"]
+        assert stats['offloaded'] == 1
+
+    def test_close_answers_offloaded_requests(self):
+        """Test that closing the server answers requests still in the pool."""
+
+        async def scenario():
+            server = Server(workers=1, offload_threshold=0)
+            futures = [server.evaluate(f"{i} + 1") for i in range(10)]
+            await asyncio.sleep(0)
+            await server.aclose()
+            return await asyncio.gather(*futures), server.stats()
+
+        responses, stats = run(scenario())
+        assert responses == ["Error: server closed"] * 10
+        assert stats['offloaded'] == 1
+
+    def test_close_answers_queued_requests(self):
+        """Test that closing the server answers requests not yet evaluated."""
+
+        async def scenario():
+            server = Server(workers=1, batch_delay=60)
+            future = server.evaluate("1 + 1")
+            await server.aclose()
+            return await future
+
+        assert run(scenario()) == "Error: server closed"
+
+    def test_batch_size_flushes_early(self):
+        """Test that a full batch is evaluated without waiting."""
+
+        async def scenario():
+            async with Server(workers=1, batch_size=4, batch_delay=60) as server:
+                futures = [server.evaluate(f"{i}") for i in range(8)]
+                return await asyncio.gather(*futures), server.stats()
+
+        responses, stats = run(scenario())
+        assert responses == [f"{float(i)}" for i in range(8)]
+        assert stats['batches'] == 2
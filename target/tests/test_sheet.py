@@ -0,0 +1,165 @@
+"""Tests for calculator sheet module."""
+
+from fractions import Fraction
+
+import pytest
+
+from calculator.parser import Parser
+from calculator.sheet import CircularReferenceError, Sheet
+
+
+@pytest.fixture
+def sheet():
+    """A sheet of a few dependent formulas."""
+    sheet = Sheet()
+    sheet.update(
+        {
+            'revenue': 200,
+            'cost': 150,
+            'margin': "revenue - cost",
+            'pct': "margin / revenue",
+            'bonus': "max_bonus * 0 + 10",
+            'max_bonus': 100,
+        }
+    )
+    return sheet
+
+
+class TestFormulas:
+    """Tests for setting and reading cells."""
+
+    def test_values(self, sheet):
+        """Test that formulas are computed when set."""
+        assert sheet['margin'] == 50.0
+        assert sheet['pct'] == 0.25
+        assert sheet.formula('pct') == "margin / revenue"
+        assert sheet.formula('revenue') is None
+        assert len(sheet) == 6
+
+    def test_dependencies(self, sheet):
+        """Test that the dependency graph is exposed both ways."""
+        assert sheet.dependencies('pct') == ('margin', 'revenue')
+        assert sheet.dependents('revenue') == ('margin', 'pct')
+        assert sheet.dependencies('revenue') == ()
+
+    def test_formula_set_before_its_inputs(self):
+        """Test that formulas may read cells defined later."""
+        sheet = Sheet()
+        sheet['total'] = "price * quantity"
+        assert isinstance(sheet.get('total'), NameError)
+        sheet.update({'price': 2.5, 'quantity': 4})
+        assert sheet['total'] == 10.0
+
+    def test_replace_formula_with_value(self, sheet):
+        """Test that a formula cell can become an input."""
+        sheet['margin'] = 20
+        assert sheet['pct'] == 0.1
+        assert sheet.dependents('cost') == ()
+
+    def test_errors_propagate(self, sheet):
+        """Test that a failing cell fails its dependents."""
+        sheet['revenue'] = 0
+        error = sheet.get('pct')
+        assert isinstance(error, ZeroDivisionError)
+        with pytest.raises(ZeroDivisionError):
+            sheet['pct']
+        del sheet['cost']
+        assert str(sheet.get('pct')) == "undefined variable: cost"
+
+    def test_invalid_formula_leaves_sheet_unchanged(self, sheet):
+        """Test that malformed formulas are rejected before any change."""
+        with pytest.raises(SyntaxError):
+            sheet.update({'revenue': 1, 'margin': "revenue -"})
+        assert sheet['revenue'] == 200
+
+    def test_invalid_names(self, sheet):
+        """Test that cells must be nameable in formulas."""
+        with pytest.raises(ValueError, match="invalid cell name"):
+            sheet['gross margin'] = 1
+        with pytest.raises(ValueError, match="is a constant"):
+            sheet['pi'] = 3
+
+    def test_numeric_backend(self):
+        """Test that the parser's numeric backend is used."""
+        sheet = Sheet(Parser(numeric='fraction'))
+        sheet.update({'a': 1, 'third': "a / 3"})
+        assert sheet['third'] == Fraction(1, 3)
+
+
+class TestRecalculation:
+    """Tests for incremental recomputation."""
+
+    def test_only_affected_cells_recomputed(self, sheet):
+        """Test that an update recomputes its dependents only."""
+        evaluations = sheet.evaluations
+        assert sheet.set('cost', 100) == ['cost', 'margin', 'pct']
+        assert sheet.evaluations == evaluations + 2
+        assert sheet['pct'] == 0.5
+        assert sheet['bonus'] == 10.0
+
+    def test_unchanged_values_stop_propagation(self, sheet):
+        """Test that dependents of an unchanged value are not recomputed."""
+        sheet['doubled'] = "bonus * 2"
+        evaluations = sheet.evaluations
+        assert sheet.set('max_bonus', 200) == ['max_bonus']
+        assert sheet.evaluations == evaluations + 1
+
+    def test_same_value_recomputes_nothing(self, sheet):
+        """Test that setting an input to its value is a no-op."""
+        evaluations = sheet.evaluations
+        assert sheet.set('revenue', 200) == []
+        assert sheet.evaluations == evaluations
+
+    def test_topological_order(self):
+        """Test that each formula is computed once, after what it reads."""
+        sheet = Sheet()
+        sheet.update(
+            {
+                'd': "b + c",
+                'c': "a * 3",
+                'b': "a * 2",
+                'a': 1,
+            }
+        )
+        assert sheet['d'] == 5.0
+        evaluations = sheet.evaluations
+        assert sheet.set('a', 2) == ['a', 'b', 'c', 'd']
+        assert sheet.evaluations == evaluations + 3
+        assert sheet['d'] == 10.0
+
+    def test_long_chain(self):
+        """Test that long chains do not hit the recursion limit."""
+        cells = {'c0': 0}
+        cells.update({f'c{i}': f"c{i - 1} + 1" for i in range(1, 5000)})
+        sheet = Sheet()
+        sheet.update(cells)
+        assert sheet['c4999'] == 4999.0
+        assert len(sheet.set('c0', 1)) == 5000
+        assert sheet['c4999'] == 5000.0
+
+
+class TestCycles:
+    """Tests for cycle detection."""
+
+    def test_self_reference(self):
+        """Test that a formula cannot read itself."""
+        with pytest.raises(CircularReferenceError, match="x -> x"):
+            Sheet().set('x', "x + 1")
+
+    def test_cycle_through_existing_formulas(self, sheet):
+        """Test that cycles through the existing graph are found."""
+        with pytest.raises(CircularReferenceError) as info:
+            sheet['revenue'] = "pct * 2"
+        assert info.value.cycle == ('revenue', 'pct', 'margin', 'revenue')
+        assert sheet['revenue'] == 200
+
+    def test_cycle_among_new_formulas(self):
+        """Test that cycles within one update are found."""
+        with pytest.raises(CircularReferenceError, match="a -> b -> c -> a"):
+            Sheet().update({'a': "b", 'b': "c", 'c': "a"})
+
+    def test_cycle_broken_in_same_update(self, sheet):
+        """Test that an update may replace the formula closing a cycle."""
+        sheet.update({'revenue': "margin * 2", 'margin': 10})
+        assert sheet['revenue'] == 20.0
+        assert sheet['pct'] == 0.5
@@ -0,0 +1,175 @@
+"""Tests for calculator tokenizer module."""
+
+from decimal import Decimal
+
+import pytest
+
+from calculator.tokenizer import (
+    COMMA,
+    FUNCTION,
+    LPAREN,
+    NAME,
+    NEGATE,
+    NUMBER,
+    OPERATOR,
+    POSTFIX,
+    RPAREN,
+    ExpressionSyntaxError,
+    Token,
+    tokenize,
+)
+
+
+def kinds_and_values(expression):
+    """Return (kind, value) pairs for the tokens of an expression."""
+    return [(token.kind, token.value) for token in tokenize(expression)]
+
+
+class TestTokenize:
+    """Tests for the tokenize function."""
+
+    def test_simple_expression(self):
+        """Test tokens of a simple expression."""
+        assert list(tokenize("2 + x")) == [
+            Token(NUMBER, 2.0, 0),
+            Token(OPERATOR, '+', 2),
+            Token(NAME, 'x', 4),
+        ]
+
+    def test_numbers_are_floats(self):
+        """Test that number tokens carry float values."""
+        assert kinds_and_values("3.25 * 10") == [
+            (NUMBER, 3.25),
+            (OPERATOR, '*'),
+            (NUMBER, 10.0),
+        ]
+
+    def test_number_forms(self):
+        """Test leading-dot, trailing-dot and exponent numbers."""
+        assert [token.value for token in tokenize(".5 2. 1e3 2.5E-2")] == [
+            0.5,
+            2.0,
+            1000.0,
+            0.025,
+        ]
+
+    def test_number_type(self):
+        """Test that literals can be converted to another number type."""
+        assert [
+            token.value for token in tokenize("0.1 + -2.5e1", number=Decimal)
+        ] == [Decimal('0.1'), '+', Decimal('-2.5e1')]
+
+    def test_e_without_digits_is_a_name(self):
+        """Test that an 'e' not followed by digits is not an exponent."""
+        assert kinds_and_values("2e") == [(NUMBER, 2.0), (NAME, 'e')]
+
+    def test_parentheses(self):
+        """Test parenthesis tokens."""
+        assert [token.kind for token in tokenize("(1)")] == [LPAREN, NUMBER, RPAREN]
+
+    def test_leading_minus_folds_into_number(self):
+        """Test that a leading minus is folded into the number."""
+        assert list(tokenize("-5")) == [Token(NUMBER, -5.0, 0)]
+
+    def test_minus_after_operator_folds_into_number(self):
+        """Test that a minus after an operator is folded into the number."""
+        assert kinds_and_values("2 * - 3") == [
+            (NUMBER, 2.0),
+            (OPERATOR, '*'),
+            (NUMBER, -3.0),
+        ]
+
+    def test_minus_after_operand_is_subtraction(self):
+        """Test that a minus after an operand is an operator."""
+        assert kinds_and_values("x -3") == [
+            (NAME, 'x'),
+            (OPERATOR, '-'),
+            (NUMBER, 3.0),
+        ]
+
+    def test_negation_of_name(self):
+        """Test that a minus before a name is a negation token."""
+        assert kinds_and_values("-x") == [(NEGATE, '-'), (NAME, 'x')]
+
+    def test_negation_of_group(self):
+        """Test that a minus before a parenthesis is a negation token."""
+        assert [token.kind for token in tokenize("-(1)")][:2] == [NEGATE, LPAREN]
+
+    def test_scientific_symbols(self):
+        """Test exponent, modulo, factorial and comma tokens."""
+        assert kinds_and_values("2 ** 3 ^ 4 % 5 ! ,") == [
+            (NUMBER, 2.0),
+            (OPERATOR, '**'),
+            (NUMBER, 3.0),
+            (OPERATOR, '^'),
+            (NUMBER, 4.0),
+            (OPERATOR, '%'),
+            (NUMBER, 5.0),
+            (POSTFIX, '!'),
+            (COMMA, ','),
+        ]
+
+    def test_name_before_parenthesis_is_a_function(self):
+        """Test that a name followed by '(' is a function token."""
+        assert kinds_and_values("log (x, 2)") == [
+            (FUNCTION, 'log'),
+            (LPAREN, '('),
+            (NAME, 'x'),
+            (COMMA, ','),
+            (NUMBER, 2.0),
+            (RPAREN, ')'),
+        ]
+
+    def test_minus_after_factorial_is_subtraction(self):
+        """Test that a minus sign after '!' is a binary operator."""
+        assert kinds_and_values("3! -1") == [
+            (NUMBER, 3.0),
+            (POSTFIX, '!'),
+            (OPERATOR, '-'),
+            (NUMBER, 1.0),
+        ]
+
+    @pytest.mark.parametrize('expression', ["-2 ^ 2", "-2**2", "-3!"])
+    def test_minus_is_not_folded_before_tighter_operators(self, expression):
+        """Test that '-2^2' negates the power rather than the base."""
+        tokens = list(tokenize(expression))
+        assert tokens[:2] == [Token(NEGATE, '-', 0), Token(NUMBER, tokens[1].value, 1)]
+        assert tokens[1].value > 0
+
+    def test_tokens_are_lazy(self):
+        """Test that tokens are produced before invalid input is reached."""
+        tokens = tokenize("1 + $")
+        assert next(tokens) == Token(NUMBER, 1.0, 0)
+
+    def test_invalid_character(self):
+        """Test that an invalid character raises SyntaxError."""
+        with pytest.raises(SyntaxError, match=r"invalid character '\$' at position 4"):
+            list(tokenize("1 + $"))
+
+    def test_malformed_number(self):
+        """Test that a malformed number raises SyntaxError."""
+        with pytest.raises(SyntaxError, match="invalid number '1.2.3'"):
+            list(tokenize("1.2.3"))
+
+    def test_unicode_whitespace_is_skipped(self):
+        """Test that any whitespace str.split() splits on separates tokens."""
+        assert kinds_and_values("1\xa0+\u3000x") == [
+            (NUMBER, 1.0),
+            (OPERATOR, '+'),
+            (NAME, 'x'),
+        ]
+
+    def test_errors_carry_code_and_position(self):
+        """Test that tokenizing errors name what is wrong and where."""
+        with pytest.raises(ExpressionSyntaxError) as info:
+            list(tokenize("1 + $"))
+        assert (info.value.code, info.value.position) == ('invalid_character', 4)
+        with pytest.raises(ExpressionSyntaxError) as info:
+            list(tokenize("2 * 1.2.3"))
+        assert (info.value.code, info.value.position) == ('syntax', 4)
+
+    def test_names_are_interned(self):
+        """Test that every occurrence of a name shares one string."""
+        first = list(tokenize("quantity * 2"))[0].value
+        second = list(tokenize("1 + quantity"))[2].value
+        assert first is second
@@ -0,0 +1,170 @@
+"""Tests for calculator vectorized evaluation module."""
+
+import array
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from calculator import vectorized  # noqa: E402
+from calculator.parser import Parser, compile  # noqa: E402
+from calculator.registry import default_registry  # noqa: E402
+
+
+class TestEvaluateBatch:
+    """Tests for CompiledExpression.evaluate_batch."""
+
+    def test_matches_scalar_evaluation(self):
+        """Test that batch results match row-by-row evaluation."""
+        compiled = compile("price * (1 + tax) - -discount / 2")
+        price = np.array([10.0, 20.0, 30.0])
+        tax = np.array([0.1, 0.2, 0.3])
+        discount = np.array([1.0, 2.0, 3.0])
+        result = compiled.evaluate_batch(price=price, tax=tax, discount=discount)
+        expected = [
+            compiled.evaluate(price=p, tax=t, discount=d)
+            for p, t, d in zip(price, tax, discount)
+        ]
+        assert result.tolist() == pytest.approx(expected)
+
+    def test_shared_subexpressions(self):
+        """Test arrays with an expression that reuses a subexpression."""
+        compiled = compile("(x * y + 1) * (x * y + 1)")
+        result = compiled.evaluate_batch(x=np.array([1.0, 2.0]), y=np.array([3.0, 4.0]))
+        assert result.tolist() == [16.0, 81.0]
+
+    def test_accepts_buffer_protocol_sequences(self):
+        """Test that array.array columns are accepted."""
+        result = compile("x * 2").evaluate_batch(x=array.array('d', [1, 2, 3]))
+        assert result.tolist() == [2.0, 4.0, 6.0]
+
+    def test_constant_expression_is_broadcast(self):
+        """Test that a constant expression yields one value per row."""
+        result = compile("2 + 3").evaluate_batch(x=np.zeros(4))
+        assert result.tolist() == [5.0] * 4
+
+    def test_registered_functions_without_counterpart(self):
+        """Test that registered functions are applied element by element."""
+        registry = default_registry.copy()
+        registry.add_function('clamp', lambda x, low, high: max(low, min(high, x)))
+        compiled = Parser(registry=registry).compile("clamp(x, 0, 10) * 2")
+        result = compiled.evaluate_batch(x=np.array([-1.0, 5.0, 20.0]))
+        assert result.tolist() == [0.0, 10.0, 20.0]
+
+    def test_division_by_zero_reports_rows(self):
+        """Test that division by zero reports the offending rows."""
+        compiled = compile("a / b")
+        with pytest.raises(ZeroDivisionError, match=r"at rows \[1, 3\]") as info:
+            compiled.evaluate_batch(a=np.ones(4), b=np.array([1.0, 0.0, 2.0, 0.0]))
+        assert info.value.rows.tolist() == [1, 3]
+
+    def test_result_is_a_copy(self):
+        """Test that writing to the result leaves the input column alone."""
+        x = np.array([1.0, 2.0])
+        for expression in ("x", "x * 1"):
+            compile(expression).evaluate_batch(x=x)[0] = 9.0
+        assert x.tolist() == [1.0, 2.0]
+
+    def test_overflow_reports_rows(self):
+        """Test that overflow raises like scalar evaluation, naming rows."""
+        x = np.array([1.0, 1000.0, 2.0])
+        with pytest.raises(OverflowError, match=r"at rows \[1\]") as info:
+            compile("exp(x)").evaluate_batch(x=x)
+        assert info.value.rows.tolist() == [1]
+        with pytest.raises(OverflowError, match=r"at rows \[1\]"):
+            compile("x ^ 400").evaluate_batch(x=np.array([1.0, 10.0]))
+
+    def test_missing_column(self):
+        """Test that a missing column raises NameError."""
+        with pytest.raises(NameError):
+            compile("a + b").evaluate_batch(a=np.ones(2))
+
+    def test_columns_of_different_lengths(self):
+        """Test that columns of different lengths raise ValueError."""
+        with pytest.raises(ValueError):
+            compile("a + b").evaluate_batch(a=np.ones(2), b=np.ones(3))
+
+
+class TestVectorizedOperations:
+    """Tests for the vectorized counterparts of calculator operations."""
+
+    def test_sqrt(self):
+        """Test vectorized square root."""
+        assert vectorized.sqrt(np.array([4.0, 9.0])).tolist() == [2.0, 3.0]
+
+    def test_sqrt_negative_reports_rows(self):
+        """Test that negative square root inputs report their rows."""
+        with pytest.raises(ValueError, match="square root") as info:
+            vectorized.sqrt(np.array([4.0, -1.0]))
+        assert info.value.rows.tolist() == [1]
+
+    def test_modulo(self):
+        """Test vectorized modulo follows Python's sign rules."""
+        result = vectorized.modulo(np.array([-10.0, 10.0]), np.array([3.0, -3.0]))
+        assert result.tolist() == [-10.0 % 3.0, 10.0 % -3.0]
+
+    def test_modulo_by_zero(self):
+        """Test that modulo by zero raises ZeroDivisionError."""
+        with pytest.raises(ZeroDivisionError, match="modulo by zero"):
+            vectorized.modulo(np.ones(2), np.array([1.0, 0.0]))
+
+    def test_ln_non_positive(self):
+        """Test that ln of non-positive values raises ValueError."""
+        with pytest.raises(ValueError, match="logarithm"):
+            vectorized.ln(np.array([1.0, 0.0]))
+
+    def test_log_with_base(self):
+        """Test vectorized logarithm with a base."""
+        result = vectorized.log(np.array([8.0, 100.0]), np.array([2.0, 10.0]))
+        assert result.tolist() == pytest.approx([3.0, 2.0])
+
+    def test_log_invalid_base(self):
+        """Test that an invalid logarithm base raises ValueError."""
+        with pytest.raises(ValueError, match="base"):
+            vectorized.log(np.array([8.0]), 1.0)
+
+    def test_scalar_error_has_no_rows(self):
+        """Test that errors from constants carry no row indices."""
+        with pytest.raises(ZeroDivisionError) as info:
+            vectorized.divide(np.ones(2), 0.0)
+        assert info.value.rows is None
+
+    def test_factorial(self):
+        """Test the vectorized factorial."""
+        assert vectorized.factorial(np.array([0.0, 5.0])).tolist() == [1.0, 120.0]
+
+    def test_factorial_invalid_reports_rows(self):
+        """Test that non-integer or negative inputs name the rows."""
+        with pytest.raises(ValueError, match="integer input at rows \\[1\\]"):
+            vectorized.factorial(np.array([1.0, 1.5]))
+        with pytest.raises(ValueError, match="negative numbers at rows \\[0\\]"):
+            vectorized.factorial(np.array([-1.0, 2.0]))
+
+    def test_factorial_overflow_reports_rows(self):
+        """Test that factorials too large for a float name the rows."""
+        with pytest.raises(OverflowError, match="too large") as info:
+            vectorized.factorial(np.array([3.0, 171.0]))
+        assert info.value.rows.tolist() == [1]
+
+    def test_power_zero_to_negative(self):
+        """Test that zero to a negative power is a division by zero."""
+        with pytest.raises(ZeroDivisionError, match="rows \\[1\\]"):
+            vectorized.power(np.array([1.0, 0.0]), -1.0)
+
+    def test_infinite_inputs_do_not_overflow(self):
+        """Test that infinite operands give infinity rather than an error."""
+        assert vectorized.exp(np.array([np.inf])).tolist() == [np.inf]
+
+    def test_power_negative_base_fractional_exponent(self):
+        """Test that fractional powers of negative numbers name the rows."""
+        with pytest.raises(ValueError, match="fractional power at rows \\[1\\]"):
+            vectorized.power(np.array([4.0, -4.0]), 0.5)
+
+    def test_trigonometry_and_exp(self):
+        """Test vectorized trigonometric and exponential functions."""
+        x = np.array([0.0, 1.0])
+        assert vectorized.sin(x).tolist() == pytest.approx([0.0, np.sin(1.0)])
+        assert vectorized.cos(x).tolist() == pytest.approx([1.0, np.cos(1.0)])
+        assert vectorized.tan(x).tolist() == pytest.approx([0.0, np.tan(1.0)])
+        assert vectorized.exp(x).tolist() == pytest.approx([1.0, np.e])
+        assert vectorized.power(x, 2.0).tolist() == [0.0, 1.0]